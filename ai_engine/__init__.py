@@ -1,3 +1,4 @@
 from .pipeline import PrescriptionParser
+from .medicine_index import MedicineIndex
 
-__all__ = ["PrescriptionParser"]
+__all__ = ["PrescriptionParser", "MedicineIndex"]
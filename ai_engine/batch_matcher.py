@@ -0,0 +1,94 @@
+"""
+Batch Matcher Module
+====================
+Whole-document medicine matching: instead of calling `extractOne` once per line
+(re-preprocessing the full catalog every time), all lines of a document are scored
+against the catalog in one `rapidfuzz.process.cdist` call, and each line's best
+medicine is the argmax of its row.
+
+Preprocessing and scoring mirror `thefuzz.process.extractOne` with its default
+processor and the WRatio scorer, so the results are identical to the per-line path:
+same name, same (rounded) score, same tie-breaking (first catalog entry wins).
+"""
+
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from thefuzz import utils
+
+from .medicine_index import MedicineIndex
+
+
+def _process_choice(choice: str) -> str:
+    return utils.full_process(choice, force_ascii=True)
+
+
+def _process_query(query: str) -> str:
+    # thefuzz runs its default processor on the query, then rapidfuzz runs the
+    # scorer's (ASCII-forcing) processor on top of it
+    return utils.full_process(utils.full_process(query), force_ascii=True)
+
+
+class BatchMatcher:
+    """
+    Scores many lines against a catalog at once with a NumPy similarity matrix.
+    """
+
+    def __init__(self, medicine_db: Union[Sequence[str], MedicineIndex],
+                 max_matrix_bytes: int = 64 * 1024 * 1024, workers: int = 1):
+        """
+        Args:
+            medicine_db (Sequence[str] | MedicineIndex): The catalog. A MedicineIndex
+                        supplies its already-normalized names, so nothing is reprocessed.
+            max_matrix_bytes (int): Upper bound on the size of one similarity matrix. Long
+                                    documents are scored in row chunks that fit the budget.
+            workers (int): Threads used by cdist (-1 for all cores).
+        """
+        if isinstance(medicine_db, MedicineIndex):
+            self.names = medicine_db.names
+            self.processed = medicine_db.processed
+        else:
+            self.names = list(medicine_db)
+            self.processed = [_process_choice(name) for name in self.names]
+        self.max_matrix_bytes = max_matrix_bytes
+        self.workers = workers
+
+    def similarity_matrix(self, lines: Sequence[str]) -> np.ndarray:
+        """
+        Returns the (len(lines) x len(catalog)) WRatio score matrix as float64.
+        """
+        queries = [_process_query(line) for line in lines]
+        return process.cdist(
+            queries, self.processed, scorer=fuzz.WRatio, dtype=np.float64, workers=self.workers
+        )
+
+    def best_matches(self, lines: Sequence[str], score_cutoff: float = 80) -> List[Optional[Tuple[str, int]]]:
+        """
+        Finds the best catalog match for every line.
+
+        Args:
+            lines (Sequence[str]): The lines to match.
+            score_cutoff (float): Minimum score for a match, as in `extractOne`.
+
+        Returns:
+            List[Optional[Tuple[str, int]]]: (name, score) per line, or None where no
+                                             entry reaches the cutoff.
+        """
+        if not lines or not self.names:
+            return [None] * len(lines)
+
+        rows_per_chunk = max(1, self.max_matrix_bytes // (8 * len(self.names)))
+        results: List[Optional[Tuple[str, int]]] = []
+
+        for start in range(0, len(lines), rows_per_chunk):
+            scores = self.similarity_matrix(lines[start:start + rows_per_chunk])
+            best = scores.argmax(axis=1)
+            best_scores = scores[np.arange(len(best)), best]
+            for idx, score in zip(best.tolist(), best_scores.tolist()):
+                if score >= score_cutoff:
+                    results.append((self.names[idx], int(round(score))))
+                else:
+                    results.append(None)
+
+        return results
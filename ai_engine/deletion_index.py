@@ -0,0 +1,170 @@
+"""
+Deletion Index Module
+=====================
+A SymSpell-style deletion-neighbourhood index for single-word typo lookup.
+
+Every catalog term is expanded once into all strings reachable by deleting up to
+`max_distance` characters (from its first `prefix_length` characters). At query
+time the word is expanded the same way, and any shared deletion points at a
+candidate term. Candidates are then verified with a real edit distance, so a typo
+such as "Amoxcilin" resolves to "Amoxicillin" through a handful of hash lookups
+instead of a fuzzy scan over the whole catalog.
+
+Index size grows roughly with C(prefix_length, max_distance) per term, which is
+why `report()` exposes build time and memory: use it to pick `max_distance` for a
+given catalog size.
+"""
+
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Set
+
+from rapidfuzz.distance import OSA
+from thefuzz import utils
+
+
+def deletes(term: str, max_distance: int) -> Set[str]:
+    """
+    Returns every string obtainable by deleting up to `max_distance` characters,
+    including the term itself.
+    """
+    variants = {term}
+    frontier = {term}
+    for _ in range(max_distance):
+        expanded = set()
+        for word in frontier:
+            for i in range(len(word)):
+                expanded.add(word[:i] + word[i + 1:])
+        expanded -= variants
+        variants |= expanded
+        frontier = expanded
+    return variants
+
+
+class DeletionIndex:
+    """
+    Maps deletion variants of catalog terms to the names they came from.
+    """
+
+    def __init__(self, names: Iterable[str] = (), max_distance: int = 2,
+                 prefix_length: int = 7, min_token_length: int = 4):
+        """
+        Args:
+            names (Iterable[str]): Catalog of medicine names.
+            max_distance (int): Maximum edit distance (OSA: insert/delete/substitute/transpose).
+            prefix_length (int): Only the first N characters of a term are expanded. Longer
+                                 terms are still verified against their full spelling.
+            min_token_length (int): Individual words of multi-word names ("Vitamin" in
+                                    "Vitamin D3") at least this long are indexed too.
+        """
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.min_token_length = min_token_length
+        self.names: List[str] = []
+        self._terms: Dict[str, List[int]] = {}
+        self._deletes: Dict[str, List[str]] = {}
+        self._build_seconds = 0.0
+
+        self.add_all(names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add_all(self, names: Iterable[str]) -> None:
+        """Adds several names, accumulating the build time reported by `report()`."""
+        start = time.perf_counter()
+        for name in names:
+            self._add(name)
+        self._build_seconds += time.perf_counter() - start
+
+    def add(self, name: str) -> None:
+        """Adds a single name to the index."""
+        self.add_all([name])
+
+    def _add(self, name: str) -> None:
+        processed = utils.full_process(name, force_ascii=True)
+        if not processed:
+            return
+
+        idx = len(self.names)
+        self.names.append(name)
+
+        terms = {processed}
+        if " " in processed:
+            terms.update(t for t in processed.split() if len(t) >= self.min_token_length)
+
+        for term in terms:
+            owners = self._terms.get(term)
+            if owners is None:
+                self._terms[term] = [idx]
+                for variant in deletes(term[:self.prefix_length], self.max_distance):
+                    self._deletes.setdefault(variant, []).append(term)
+            elif idx not in owners:
+                owners.append(idx)
+
+    def lookup(self, word: str) -> List[str]:
+        """
+        Finds the catalog names closest to a single word.
+
+        Args:
+            word (str): The (possibly misspelled) word.
+
+        Returns:
+            List[str]: Names whose term is at the minimal edit distance from the word, in
+                       catalog order. Empty if nothing is within `max_distance`. More than
+                       one entry means the lookup is ambiguous.
+        """
+        processed = utils.full_process(word, force_ascii=True)
+        if not processed:
+            return []
+
+        exact = self._terms.get(processed)
+        if exact is not None:
+            return [self.names[i] for i in exact]
+
+        candidates: Set[str] = set()
+        for variant in deletes(processed[:self.prefix_length], self.max_distance):
+            terms = self._deletes.get(variant)
+            if terms:
+                candidates.update(terms)
+
+        best_distance = self.max_distance + 1
+        owners: Set[int] = set()
+        for term in candidates:
+            if abs(len(term) - len(processed)) > self.max_distance:
+                continue
+            distance = OSA.distance(processed, term, score_cutoff=self.max_distance)
+            if distance < best_distance:
+                best_distance = distance
+                owners = set(self._terms[term])
+            elif distance == best_distance:
+                owners.update(self._terms[term])
+
+        return [self.names[i] for i in sorted(owners)]
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Summarizes the index size and cost of building it.
+
+        Returns:
+            Dict[str, Any]: Counts of names, terms, deletion keys and postings, the
+                            cumulative build time, and an approximate memory footprint
+                            in bytes (dict tables, keys and posting lists).
+        """
+        postings = sum(len(v) for v in self._deletes.values())
+        approx_bytes = (
+            sys.getsizeof(self._deletes)
+            + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self._deletes.items())
+            + sys.getsizeof(self._terms)
+            + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self._terms.items())
+        )
+        return {
+            "names": len(self.names),
+            "terms": len(self._terms),
+            "delete_keys": len(self._deletes),
+            "postings": postings,
+            "max_distance": self.max_distance,
+            "prefix_length": self.prefix_length,
+            "build_seconds": round(self._build_seconds, 3),
+            "approx_bytes": approx_bytes,
+        }
@@ -0,0 +1,227 @@
+"""
+Exact Matcher Module
+====================
+An Aho-Corasick automaton over the case-folded catalog that finds exact,
+word-boundary-aligned medicine names in a single linear pass over a line.
+
+Most production lines spell the medicine correctly ("Pan 40", "Dolo 650"), so a hit
+here lets the caller skip fuzzy scoring entirely. Names can be added at any time: on
+the next refresh they are inserted into the existing trie, and links are computed only
+for the new nodes and for the existing nodes that gain one of them as a suffix.
+"""
+
+import heapq
+import threading
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from thefuzz import utils
+
+
+class ExactMatcher:
+    """
+    Aho-Corasick automaton with hit/lookup counters.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        # Trie, one entry per node: edges, parent, incoming character, depth and name id (-1 if none)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._parent: List[int] = [0]
+        self._char: List[str] = [""]
+        self._depth: List[int] = [0]
+        self._out: List[int] = [-1]
+        # Failure and dictionary-suffix links, and the failure tree inverted. A node whose
+        # failure link moves is appended under its new target and skipped under the old one.
+        self._fail: List[int] = [0]
+        self._dict_link: List[int] = [0]
+        self._fail_children: Dict[int, List[int]] = {}
+        # (name id, normalized name) of names not yet in the trie
+        self._pending: List[Tuple[int, str]] = []
+        self._lock = threading.Lock()
+        # Odd while a refresh is rewriting the automaton; lookups that overlap one are repeated
+        self._generation = 0
+
+        self.lookups = 0
+        self.hits = 0
+
+    def add(self, name: str) -> None:
+        """Queues a name for the trie. It is inserted and linked on the next refresh."""
+        key = utils.full_process(name, force_ascii=True)
+        if not key:
+            return
+        with self._lock:
+            self._pending.append((len(self.names), key))
+            self.names.append(name)
+
+    def refresh(self) -> None:
+        """
+        Inserts the names added since the last refresh and links the new nodes. Called
+        lazily by `find`, but writers can call it eagerly so lookups never pay for it.
+        """
+        if not self._pending:
+            return
+        with self._lock:
+            if not self._pending:
+                return
+            self._generation += 1
+            try:
+                self._update_locked()
+            finally:
+                self._generation += 1
+
+    def _update_locked(self) -> None:
+        old_size = len(self._goto)
+        pending, self._pending = self._pending, []
+        # Edges added to nodes that already existed, and existing nodes that now end a name
+        grafts: List[Tuple[int, str]] = []
+        new_terminals: List[int] = []
+        for name_id, key in pending:
+            node = 0
+            for ch in key:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    # The node is complete before the edge to it makes it reachable
+                    nxt = len(self._goto)
+                    self._goto.append({})
+                    self._parent.append(node)
+                    self._char.append(ch)
+                    self._depth.append(self._depth[node] + 1)
+                    self._out.append(-1)
+                    self._fail.append(0)
+                    self._dict_link.append(0)
+                    if node < old_size:
+                        grafts.append((node, ch))
+                    self._goto[node][ch] = nxt
+                node = nxt
+            # The first catalog entry with a given normalized form wins
+            if self._out[node] == -1:
+                self._out[node] = name_id
+                if node < old_size:
+                    new_terminals.append(node)
+
+        # An existing node's failure link can only change if a new node is now one of its
+        # proper suffixes. Those nodes extend a graft's suffix-descendants, or a node
+        # already found, by the new node's character.
+        touched: Dict[int, Set[int]] = {}
+        for node, ch in grafts:
+            new_node = self._goto[node][ch]
+            for suffixed in self._fail_descendants(node):
+                child = self._goto[suffixed].get(ch)
+                if child is not None and child < old_size:
+                    touched.setdefault(child, set()).add(new_node)
+        queue = [(self._depth[node], node) for node in touched]
+        heapq.heapify(queue)
+        while queue:
+            _, node = heapq.heappop(queue)
+            suffixes = touched[node]
+            for ch, child in self._goto[node].items():
+                if child >= old_size:
+                    continue
+                extended = {self._goto[s][ch] for s in suffixes if ch in self._goto[s]}
+                if extended:
+                    if child not in touched:
+                        touched[child] = set()
+                        heapq.heappush(queue, (self._depth[child], child))
+                    touched[child] |= extended
+
+        # Failure links, shallowest first so each parent's link is final
+        relink = sorted(chain(range(old_size, len(self._goto)), touched), key=self._depth.__getitem__)
+        for node in relink:
+            ch = self._char[node]
+            f = self._fail[self._parent[node]]
+            while f and ch not in self._goto[f]:
+                f = self._fail[f]
+            target = self._goto[f].get(ch, 0)
+            if target == node:
+                target = 0
+            if node >= old_size or target != self._fail[node]:
+                self._fail[node] = target
+                self._fail_children.setdefault(target, []).append(node)
+
+        # Dictionary links change with the failure chain, or when a node on it starts ending a name
+        redict = set(relink)
+        for node in new_terminals:
+            redict.update(self._fail_descendants(node))
+        for node in sorted(redict, key=self._depth.__getitem__):
+            f = self._fail[node]
+            self._dict_link[node] = f if self._out[f] != -1 else self._dict_link[f]
+
+    def _fail_descendants(self, node: int) -> Iterator[int]:
+        """Yields the nodes whose failure chain passes through `node`."""
+        stack = [node]
+        while stack:
+            parent = stack.pop()
+            for child in self._fail_children.get(parent, ()):
+                if self._fail[child] == parent:
+                    yield child
+                    stack.append(child)
+
+    def find(self, text: str) -> Optional[str]:
+        """
+        Finds the longest exact catalog hit in the text.
+
+        Matching is case-insensitive on the same normalized form the fuzzy scorers use,
+        and a hit must start and end on word boundaries. When several names occur, the
+        longest wins, then the earliest in the line, then the earliest in the catalog.
+
+        Returns:
+            Optional[str]: The matched catalog name, or None.
+        """
+        hits = self._hits(text)
+        return self.names[-max(hits)[2]] if hits else None
+
+    def find_all(self, text: str) -> List[str]:
+        """
+        Finds every catalog name occurring exactly (as in `find`) in the text.
+
+        Returns:
+            List[str]: The matched names in catalog order, each once.
+        """
+        return [self.names[name_id] for name_id in sorted({-hit[2] for hit in self._hits(text)})]
+
+    def _hits(self, text: str) -> List[Tuple[int, int, int]]:
+        self.refresh()
+
+        self.lookups += 1
+        line = utils.full_process(text, force_ascii=True)
+        generation = self._generation
+        hits = self._scan(line)
+        if generation % 2 or generation != self._generation:
+            # A refresh ran during the scan: repeat it once the automaton is consistent
+            with self._lock:
+                hits = self._scan(line)
+        if hits:
+            self.hits += 1
+        return hits
+
+    def _scan(self, line: str) -> List[Tuple[int, int, int]]:
+        """Returns (length, -start, -name_id) of each word-aligned hit in the line."""
+        goto, fail, dict_link, out, depth = self._goto, self._fail, self._dict_link, self._out, self._depth
+        end = len(line)
+
+        hits = []
+        state = 0
+        for i, ch in enumerate(line):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+
+            if i + 1 < end and line[i + 1] != " ":
+                continue
+            node = state if out[state] != -1 else dict_link[state]
+            while node:
+                length = depth[node]
+                start = i - length + 1
+                if start == 0 or line[start - 1] == " ":
+                    hits.append((length, -start, -out[node]))
+                node = dict_link[node]
+        return hits
+
+    def stats(self) -> Dict[str, float]:
+        """Returns lookup and hit counts and the hit rate."""
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+        }
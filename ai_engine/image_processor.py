@@ -1,62 +1,440 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 import numpy as np
 from PIL import Image
-from typing import Tuple
+from typing import BinaryIO, List, Optional, Tuple, Union
+from .deskew import deskew, DEFAULT_DESKEW_METHOD, SkewEstimator
 
-def preprocess_image(image_path: str) -> Image.Image:
+# A path, the encoded image bytes, or a binary file-like object positioned at them
+ImageSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+# Median glyph height (in pixels) that text is normalized to before binarization, about
+# what a 300 DPI scan of 10-12pt print gives. Larger text is downsampled; smaller text is
+# left alone.
+TARGET_TEXT_HEIGHT = 24
+
+# OpenCV decode flags for grayscale at 1/1, 1/2, 1/4 and 1/8 of the stored resolution.
+# For JPEG these scale inside the decoder (DCT scaling), so the full-size image is never built.
+_REDUCED_GRAYSCALE = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+_PROBE_FACTOR = 4
+
+# Denoise and binarization filters (see `binarize_and_deskew`)
+MEDIAN_KSIZE = 3
+THRESHOLD_BLOCK_SIZE = 11
+THRESHOLD_C = 2
+
+# Tiled denoise/binarization: images with at least TILE_MIN_PIXELS pixels are split into
+# TILE_SIZE x TILE_SIZE tiles when more than one tile worker is requested
+TILE_SIZE = 1024
+TILE_MIN_PIXELS = 2_000_000
+
+# Text height the cheap first pass of the OCR cascade works at (see `quick_preprocess_image`)
+QUICK_TEXT_HEIGHT = 20
+
+# Text-region detection (see `crop_text_regions`)
+# Ink components taller than this many text heights are logos, stamps or signatures
+MAX_TEXT_HEIGHT_RATIO = 3.0
+# A horizontal rule at least this wide (as a fraction of the page) in the top part of
+# the page is taken as the bottom of the letterhead
+HEADER_RULE_MIN_WIDTH = 0.5
+HEADER_MAX_FRACTION = 0.35
+
+# A region as (x, y, width, height) in pixels
+TextBox = Tuple[int, int, int, int]
+
+def as_decodable(source: ImageSource) -> Union[str, np.ndarray]:
+    """Returns a path, or the encoded bytes as a uint8 array (no copy where possible)."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if hasattr(source, "getbuffer"):
+        data = source.getbuffer()[source.tell():]
+    elif hasattr(source, "read"):
+        data = source.read()
+    else:
+        data = source
+    return np.frombuffer(data, dtype=np.uint8)
+
+def _is_jpeg(source: Union[str, np.ndarray]) -> bool:
+    if isinstance(source, str):
+        try:
+            with open(source, "rb") as f:
+                head = f.read(3)
+        except OSError:
+            return False
+    else:
+        head = source[:3].tobytes()
+    return head == b"\xff\xd8\xff"
+
+def decode_image(source: ImageSource, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+    """
+    Decodes an image from a path or from encoded bytes held in memory.
+
+    In-memory input is wrapped with `np.frombuffer` (no copy) and decoded by
+    `cv2.imdecode`, so uploads never have to touch the filesystem. For `io.BytesIO`
+    the underlying buffer is used directly; other file-like objects are read once.
+
+    Args:
+        source (ImageSource): Path, bytes/bytearray/memoryview, or binary file-like object.
+        flags (int): OpenCV imread/imdecode flags.
+
+    Returns:
+        np.ndarray: The decoded image.
+
+    Raises:
+        ValueError: If the image cannot be loaded or decoded.
+    """
+    source = as_decodable(source)
+    if isinstance(source, str):
+        img = cv2.imread(source, flags)
+        if img is None:
+            raise ValueError(f"Could not load image at {source}")
+        return img
+
+    img = cv2.imdecode(source, flags) if source.size else None
+    if img is None:
+        raise ValueError("Could not decode image data")
+    return img
+
+def estimate_text_height(gray: np.ndarray) -> Optional[float]:
     """
-    Loads an image from the specified path and applies a series of preprocessing steps
-    to optimize it for OCR (Optical Character Recognition).
+    Estimates the typical glyph height as the median height of character-sized
+    connected components in a locally thresholded copy of the image.
+
+    Returns:
+        Optional[float]: Median glyph height in pixels, or None if too few glyphs were found.
+    """
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, 31, 15)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    rows, cols = gray.shape[:2]
+    # Drop specks, rules and large blobs (stamps, photos, page borders)
+    glyphs = heights[(heights >= 3) & (heights < rows / 8) & (widths < cols / 4) & (areas >= 4)]
+    if len(glyphs) < 10:
+        return None
+    return float(np.median(glyphs))
+
+def load_normalized_gray(source: ImageSource, target_text_height: Optional[int] = TARGET_TEXT_HEIGHT) -> Tuple[np.ndarray, float]:
+    """
+    Decodes an image as grayscale, downsampled so its text is about `target_text_height`
+    pixels tall.
+
+    The text height is estimated on a 1/4-scale probe. JPEGs are then decoded directly at
+    the largest reduced scale (1/2, 1/4 or 1/8) that does not undershoot the target, and
+    only the remaining factor is applied with an INTER_AREA resize; the full-resolution
+    color image is never materialized. Other formats are decoded at full size in grayscale.
+
+    Args:
+        source (ImageSource): Path or in-memory encoded image.
+        target_text_height (int, optional): Desired median glyph height. None disables
+                                            normalization.
+
+    Returns:
+        Tuple[np.ndarray, float]: The grayscale image and its scale relative to the original.
+
+    Raises:
+        ValueError: If the image cannot be loaded or decoded.
+    """
+    source = as_decodable(source)
+    if not target_text_height:
+        return decode_image(source, cv2.IMREAD_GRAYSCALE), 1.0
+
+    if not _is_jpeg(source):
+        return normalize_gray(decode_image(source, cv2.IMREAD_GRAYSCALE), target_text_height)
+
+    probe = decode_image(source, _REDUCED_GRAYSCALE[_PROBE_FACTOR])
+    scale = _normalization_scale(probe, target_text_height)
+    if scale == 1.0:
+        return decode_image(source, cv2.IMREAD_GRAYSCALE), 1.0
+
+    factor = max(f for f in _REDUCED_GRAYSCALE if f <= 1 / scale)
+    gray = probe if factor == _PROBE_FACTOR else decode_image(source, _REDUCED_GRAYSCALE[factor])
+    return _resize_remaining(gray, scale / (1 / factor)), scale
+
+def _normalization_scale(probe: np.ndarray, target_text_height: int) -> float:
+    """Returns the downsampling scale for the full image, given its 1/4-scale probe."""
+    probe_height = estimate_text_height(probe)
+    text_height = probe_height * _PROBE_FACTOR if probe_height else None
+    if text_height is None or text_height <= target_text_height * 1.1:
+        # Unknown or already small enough: never upsample
+        return 1.0
+    return target_text_height / text_height
+
+def _resize_remaining(gray: np.ndarray, remaining: float) -> np.ndarray:
+    if remaining < 0.95:
+        gray = cv2.resize(gray, None, fx=remaining, fy=remaining, interpolation=cv2.INTER_AREA)
+    return gray
+
+def normalize_gray(gray: np.ndarray, target_text_height: Optional[int] = TARGET_TEXT_HEIGHT) -> Tuple[np.ndarray, float]:
+    """
+    Same as `load_normalized_gray`, for an image that is already decoded (e.g. a
+    rasterized PDF or TIFF page).
+    """
+    if not target_text_height:
+        return gray, 1.0
+    probe = cv2.resize(gray, None, fx=1 / _PROBE_FACTOR, fy=1 / _PROBE_FACTOR, interpolation=cv2.INTER_AREA)
+    scale = _normalization_scale(probe, target_text_height)
+    return _resize_remaining(gray, scale), scale
+
+def preprocess_image(image_path: ImageSource, target_text_height: Optional[int] = TARGET_TEXT_HEIGHT,
+                     deskew_method: Union[str, SkewEstimator] = DEFAULT_DESKEW_METHOD, tile_workers: int = 1) -> Image.Image:
+    """
+    Loads an image from the specified path (or from in-memory encoded bytes) and applies
+    a series of preprocessing steps to optimize it for OCR (Optical Character Recognition).
 
     Steps:
-    1.  **Load Image**: Reads the image using OpenCV.
-    2.  **Grayscale**: Converts the image to grayscale to reduce complexity.
+    1.  **Load Image**: Reads or decodes the image in grayscale using OpenCV.
+    2.  **Resolution Normalization**: Downsamples high-resolution photos so text is about
+        `target_text_height` pixels tall (see `load_normalized_gray`), which keeps the
+        stages below fast and memory-light without hurting OCR.
     3.  **Denoise**: Applies a median blur to remove salt-and-pepper noise while preserving edges.
     4.  **Adaptive Thresholding**: Binarizes the image (black and white) using adaptive thresholding,
         which handles varying lighting conditions better than global thresholding.
-    5.  **Deskewing**: Detects the orientation of the text and rotates the image to align it horizontally.
+    5.  **Deskewing**: Detects the orientation of the text and rotates the image to align it horizontally
+        (see `ai_engine.deskew` for the available estimators).
 
     Args:
-        image_path (str): The absolute or relative path to the image file.
+        image_path (ImageSource): The absolute or relative path to the image file, or the
+                                  encoded image as bytes, a memoryview or a file-like object.
+        target_text_height (int, optional): Median glyph height to normalize to. None keeps
+                                            the original resolution.
+        deskew_method (str | Callable): Skew estimator name from `DESKEW_METHODS`, or a callable.
+        tile_workers (int): Threads for steps 3-4 on large images, which are then processed
+                            in overlapping tiles with identical output. 1 runs untiled.
 
     Returns:
         Image.Image: A PIL Image object containing the preprocessed, binary, deskewed image.
 
     Raises:
-        ValueError: If the image cannot be loaded from the given path.
+        ValueError: If the image cannot be loaded from the given path or decoded, or the
+                    deskew method is unknown.
     """
-    # 1. Load Image
-    img = cv2.imread(image_path)
-    if img is None:
-        raise ValueError(f"Could not load image at {image_path}")
+    # 1-2. Load Image as grayscale, normalized to the target text height
+    gray, _ = load_normalized_gray(image_path, target_text_height)
+    return binarize_and_deskew(gray, deskew_method, tile_workers)
 
-    # 2. Grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+def quick_preprocess_image(image_path: ImageSource, target_text_height: Optional[int] = QUICK_TEXT_HEIGHT) -> Image.Image:
+    """
+    Cheap alternative to `preprocess_image` for clean scans: a grayscale decode at
+    reduced resolution and one global (Otsu) threshold. No denoising, no adaptive
+    threshold, no deskew.
 
+    Args:
+        image_path (ImageSource): Path or in-memory encoded image.
+        target_text_height (int, optional): Median glyph height to normalize to.
+
+    Returns:
+        Image.Image: The binary image, ready for OCR.
+
+    Raises:
+        ValueError: If the image cannot be loaded or decoded.
+    """
+    gray, _ = load_normalized_gray(image_path, target_text_height)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return Image.fromarray(binary)
+
+def denoise_and_threshold(gray: np.ndarray) -> np.ndarray:
+    """
+    Steps 3 and 4 of `preprocess_image` on a grayscale image.
+
+    Returns:
+        np.ndarray: Binary image (white background, black ink).
+    """
     # 3. Noise Removal (Median Blur)
     # Removes salt-and-pepper noise while preserving edges
-    denoised = cv2.medianBlur(gray, 3)
+    denoised = cv2.medianBlur(gray, MEDIAN_KSIZE)
 
     # 4. Adaptive Thresholding (Binarization)
     # Good for varying lighting conditions
-    thresh = cv2.adaptiveThreshold(
-        denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+    return cv2.adaptiveThreshold(
+        denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, THRESHOLD_BLOCK_SIZE, THRESHOLD_C
     )
 
-    # 5. Deskewing
-    coords = np.column_stack(np.where(thresh > 0))
-    angle = cv2.minAreaRect(coords)[-1]
-    
-    # Correct the angle
-    if angle < -45:
-        angle = -(90 + angle)
+def denoise_and_threshold_tiled(gray: np.ndarray, tile_size: int = TILE_SIZE, workers: int = 4) -> np.ndarray:
+    """
+    Same output as `denoise_and_threshold`, pixel for pixel, computed in tiles on a
+    thread pool (OpenCV releases the GIL, so tiles run in parallel).
+
+    Each tile is filtered together with a halo as wide as the radius of both filters
+    (median, then the threshold's Gaussian block), so every pixel of the tile core sees
+    exactly the neighbourhood it has in the full image. Halos are clipped at the image
+    edge, where both filters replicate the border as they do on the full frame.
+
+    Args:
+        gray (np.ndarray): Grayscale image.
+        tile_size (int): Side of the tile cores, in pixels.
+        workers (int): Threads.
+
+    Returns:
+        np.ndarray: Binary image (white background, black ink).
+    """
+    halo = MEDIAN_KSIZE // 2 + THRESHOLD_BLOCK_SIZE // 2
+    rows, cols = gray.shape[:2]
+    out = np.empty_like(gray)
+
+    def run(tile):
+        y0, x0 = tile
+        y1, x1 = min(rows, y0 + tile_size), min(cols, x0 + tile_size)
+        top, left = max(0, y0 - halo), max(0, x0 - halo)
+        binary = denoise_and_threshold(gray[top:min(rows, y1 + halo), left:min(cols, x1 + halo)])
+        out[y0:y1, x0:x1] = binary[y0 - top:y1 - top, x0 - left:x1 - left]
+
+    tiles = [(y, x) for y in range(0, rows, tile_size) for x in range(0, cols, tile_size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # list() re-raises the first exception from a tile, if any
+        list(pool.map(run, tiles))
+    return out
+
+def binarize_and_deskew(gray: np.ndarray, deskew_method: Union[str, SkewEstimator] = DEFAULT_DESKEW_METHOD,
+                        tile_workers: int = 1) -> Image.Image:
+    """
+    Runs the denoise, adaptive threshold and deskew steps of `preprocess_image` on a
+    grayscale image that is already loaded (and normalized).
+
+    Args:
+        gray (np.ndarray): Grayscale image.
+        deskew_method (str | Callable): Skew estimator name from `DESKEW_METHODS`, or a callable.
+        tile_workers (int): Threads for tiled denoise/thresholding of large images
+                            (see `denoise_and_threshold_tiled`). 1 runs untiled.
+
+    Returns:
+        Image.Image: The binary, deskewed image, ready for OCR.
+    """
+    # 3-4. Noise Removal and Adaptive Thresholding, in tiles on large images
+    if tile_workers > 1 and gray.size >= TILE_MIN_PIXELS:
+        thresh = denoise_and_threshold_tiled(gray, workers=tile_workers)
     else:
-        angle = -angle
-        
-    (h, w) = img.shape[:2]
-    center = (w // 2, h // 2)
-    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-    rotated = cv2.warpAffine(thresh, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+        thresh = denoise_and_threshold(gray)
+
+    # 5. Deskewing
+    rotated, _ = deskew(thresh, deskew_method)
 
     # Convert back to PIL Image for Tesseract
     return Image.fromarray(rotated)
+
+def _segment_text(binary: np.ndarray) -> Optional[Tuple[List[TextBox], np.ndarray, np.ndarray]]:
+    """
+    Splits a binary page into text bands.
+
+    Returns:
+        The band boxes in reading order, the connected-component label image, and a
+        per-label flag of the non-text components; None if too few glyphs were found
+        to tell text from the rest.
+    """
+    ink = (binary < 128).astype(np.uint8)
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    lefts, tops, widths, heights, areas = (stats[:, i] for i in range(5))
+    rows, cols = binary.shape[:2]
+
+    glyphs = (heights >= 3) & (heights < rows / 8) & (widths < cols / 4) & (areas >= 4)
+    glyphs[0] = False
+    if np.count_nonzero(glyphs) < 10:
+        return None
+    text_height = float(np.median(heights[glyphs]))
+
+    # Long thin rules, and anything much taller than a line of text
+    rules = (widths >= cols * HEADER_RULE_MIN_WIDTH) & (heights <= max(2.0, text_height / 2))
+    non_text = rules | (heights > text_height * MAX_TEXT_HEIGHT_RATIO)
+    non_text[0] = False
+
+    # Everything above a full-width rule near the top belongs to the letterhead
+    header_rules = rules & (tops + heights <= rows * HEADER_MAX_FRACTION)
+    header_rules[0] = False
+    header_end = int((tops + heights)[header_rules].max()) if header_rules.any() else 0
+
+    # Letter-sized components outside the header; punctuation and dashes are too small to
+    # seed a band but are kept inside the bands they sit in
+    seeds = (heights >= text_height * 0.4) & ~non_text & (tops >= header_end)
+    seeds[0] = False
+    if not seeds.any():
+        return [], labels, non_text
+
+    # Join letters into words and lines, then lines that share rows into bands
+    mask = seeds.astype(np.uint8)[labels] * 255
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, int(text_height)), max(1, int(text_height * 0.3))))
+    _, _, lines, _ = cv2.connectedComponentsWithStats(cv2.dilate(mask, kernel), connectivity=8)
+
+    bands: List[List[int]] = []
+    for x, y, w, h, _ in sorted(lines[1:].tolist(), key=lambda box: box[1]):
+        if bands and y < bands[-1][3]:
+            band = bands[-1]
+            band[0], band[2], band[3] = min(band[0], x), max(band[2], x + w), max(band[3], y + h)
+        else:
+            bands.append([x, y, x + w, y + h])
+
+    pad = max(2, int(text_height / 3))
+    boxes = []
+    for x0, y0, x1, y1 in bands:
+        if x1 - x0 < text_height:
+            # A lone glyph-sized speck
+            continue
+        x0, y0 = max(0, x0 - pad), max(header_end, y0 - pad)
+        x1, y1 = min(cols, x1 + pad), min(rows, y1 + pad)
+        boxes.append((x0, y0, x1 - x0, y1 - y0))
+    return boxes, labels, non_text
+
+def detect_text_regions(binary: np.ndarray) -> List[TextBox]:
+    """
+    Finds the text bands of a binarized page (white background, black ink).
+
+    Ink is split into connected components. Logos, stamps, signatures and rules (much
+    taller than the median glyph, or long and thin) are discarded, as is the letterhead
+    above a full-width rule near the top of the page. The remaining letters are dilated
+    into lines, and lines that share rows are merged into bands, so a medicine name and
+    its dosage columns always stay on one band.
+
+    Args:
+        binary (np.ndarray): Binarized, deskewed image.
+
+    Returns:
+        List[TextBox]: (x, y, width, height) of each band, top to bottom. The whole image
+                       when too few glyphs were found to tell text apart.
+    """
+    segments = _segment_text(binary)
+    if segments is None:
+        return [(0, 0, binary.shape[1], binary.shape[0])]
+    return segments[0]
+
+def crop_text_regions(image: Image.Image) -> Tuple[Image.Image, List[TextBox]]:
+    """
+    Optional stage between preprocessing and OCR: keeps only the text bands of the page.
+
+    The bands from `detect_text_regions` are cut out, non-text components inside them are
+    painted white, and the bands are stacked top to bottom (at their original horizontal
+    offsets, one text height apart) into a smaller image. Tesseract then skips the
+    letterhead, logos, stamps and blank margins that `is_noise` would drop anyway.
+
+    Args:
+        image (Image.Image): Output of `preprocess_image`.
+
+    Returns:
+        Tuple[Image.Image, List[TextBox]]: The image to OCR and the band boxes, in the
+                                           coordinates of `image`. The image is returned
+                                           unchanged when no bands could be found.
+    """
+    binary = np.asarray(image)
+    segments = _segment_text(binary)
+    if not segments or not segments[0]:
+        return image, [(0, 0, binary.shape[1], binary.shape[0])]
+    boxes, labels, non_text = segments
+
+    left = min(x for x, _, _, _ in boxes)
+    width = max(x + w for x, _, w, _ in boxes) - left
+    gap = max(4, int(np.median([h for _, _, _, h in boxes]) / 2))
+    height = sum(h for _, _, _, h in boxes) + gap * (len(boxes) + 1)
+
+    canvas = np.full((height, width), 255, dtype=np.uint8)
+    top = gap
+    for x, y, w, h in boxes:
+        piece = binary[y:y + h, x:x + w].copy()
+        piece[non_text[labels[y:y + h, x:x + w]]] = 255
+        canvas[top:top + h, x - left:x - left + w] = piece
+        top += h + gap
+    return Image.fromarray(canvas), boxes
@@ -0,0 +1,130 @@
+"""
+LRU Cache Module
+================
+A small, thread-safe LRU cache bounded by an approximate memory budget rather than
+an entry count, with hit/miss/eviction counters.
+
+Used to memoize per-line and per-word matching results across requests:
+prescriptions from the same clinics repeat the same lines constantly, and a cached
+line skips fuzzy matching and regex extraction altogether. Callers include the
+catalog version in the key, so catalog updates naturally stop old entries from
+being hit and they age out of the LRU.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+def approx_size(obj: Any) -> int:
+    """
+    Roughly estimates the memory held by a value built from str/bytes/numbers and
+    tuples, lists and dicts of them.
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        size += sum(approx_size(item) for item in obj)
+    elif isinstance(obj, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in obj.items())
+    return size
+
+
+class LRUCache:
+    """
+    Thread-safe LRU mapping with a byte budget.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        """
+        Args:
+            max_bytes (int): Approximate memory budget for keys plus values. Least recently
+                             used entries are evicted once it is exceeded. 0 disables caching.
+        """
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value (marking it recently used), or `default`."""
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None) -> None:
+        """
+        Stores a value, evicting least recently used entries to stay within budget.
+
+        Args:
+            key (Hashable): Cache key.
+            value (Any): Value to store. Callers must not mutate it afterwards.
+            size (int, optional): Size in bytes; estimated with `approx_size` if omitted.
+        """
+        if size is None:
+            size = approx_size(key) + approx_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._sizes[key]
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._sizes[key] = size
+            self._bytes += size
+            self._evict_locked()
+
+    def discard(self, key: Hashable) -> None:
+        """Removes an entry if present (not counted as an eviction)."""
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+                self._bytes -= self._sizes.pop(key)
+
+    def resize(self, max_bytes: int) -> None:
+        """Changes the memory budget, evicting immediately if it shrank."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        while self._bytes > self.max_bytes and self._data:
+            key, _ = self._data.popitem(last=False)
+            self._bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns size, budget, and hit/miss/eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
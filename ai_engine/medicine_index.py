@@ -0,0 +1,169 @@
+"""
+Medicine Index Module
+=====================
+A character-trigram inverted index over the medicine catalog, used to preselect a
+small set of candidates before running the (expensive) fuzzy scorer.
+
+Scoring a line against every catalog entry is fine for a few dozen names but grows
+linearly with the catalog. The index instead looks up the postings of the line's
+trigrams, ranks catalog entries by how much of their own trigram set appears in the
+line, and hands only the top-K to `thefuzz`. Per-line cost then depends on the
+posting lists touched and K, not on the catalog size.
+"""
+
+import heapq
+import itertools
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from thefuzz import fuzz, process, utils
+
+from .exact_matcher import ExactMatcher
+
+_index_ids = itertools.count(1)
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Returns the set of character trigrams of a normalized, space-padded string.
+
+    The text is normalized the same way `thefuzz` preprocesses choices (lowercase,
+    non-alphanumerics to spaces), so index lookups line up with what the scorer sees.
+    """
+    processed = utils.full_process(text, force_ascii=True)
+    if not processed:
+        return set()
+    padded = f" {processed} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MedicineIndex:
+    """
+    Trigram inverted index with top-K candidate preselection for fuzzy matching.
+    """
+
+    def __init__(self, names: Iterable[str] = (), top_k: int = 50):
+        """
+        Args:
+            names (Iterable[str]): Catalog of medicine names. Duplicates are ignored.
+            top_k (int): Number of candidates passed on to the fuzzy scorer per query.
+        """
+        self.top_k = top_k
+        # (uid, version) identifies the index contents, e.g. for memoizing match results
+        self.uid = next(_index_ids)
+        self.version = 0
+        self.names: List[str] = []
+        # Names as the fuzzy scorers see them (lowercased, punctuation stripped)
+        self.processed: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._sizes: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+        # Names too short to own an inner trigram (e.g. "D3") are always scored
+        self._short: List[int] = []
+        # Exact (Aho-Corasick) prepass so correctly spelled names skip fuzzy scoring
+        self.exact = ExactMatcher()
+
+        for name in names:
+            self.add(name)
+        self.exact.refresh()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ids
+
+    def add(self, name: str) -> bool:
+        """
+        Adds a single name to the index.
+
+        Returns:
+            bool: True if the name was new, False if it was already indexed.
+        """
+        if name in self._ids:
+            return False
+
+        idx = len(self.names)
+        grams = trigrams(name)
+        processed = utils.full_process(name, force_ascii=True)
+        self.names.append(name)
+        self.processed.append(processed)
+        self._ids[name] = idx
+        self._sizes.append(len(grams))
+        if len(processed) < 3:
+            self._short.append(idx)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(idx)
+        self.exact.add(name)
+        self.version += 1
+        return True
+
+    def candidates(self, query: str, top_k: Optional[int] = None) -> List[str]:
+        """
+        Preselects the catalog entries most likely to match the query.
+
+        Entries are ranked by the fraction of their trigrams found in the query (so a
+        short name fully contained in a long line ranks first), then by the absolute
+        number of shared trigrams. The result is returned in catalog order so that
+        equal fuzzy scores among the candidates resolve the same way `extractOne` does.
+
+        Queries the index cannot narrow down, i.e. shorter than a trigram once
+        normalized ("OD", "5") or sharing no trigram with any name, get the whole
+        catalog: the fuzzy scorers still match them (partially) against long names.
+
+        Args:
+            query (str): The line or word to match.
+            top_k (int, optional): Overrides the index's default K.
+
+        Returns:
+            List[str]: Up to K candidate names, plus any names too short to index, or
+                       every name for queries the index cannot narrow down.
+        """
+        if len(utils.full_process(query, force_ascii=True)) < 3:
+            return list(self.names)
+        k = top_k or self.top_k
+        shared: Counter = Counter()
+        for gram in trigrams(query):
+            postings = self._postings.get(gram)
+            if postings:
+                shared.update(postings)
+        if not shared:
+            return list(self.names)
+
+        sizes = self._sizes
+        best = heapq.nlargest(
+            k, shared.items(), key=lambda item: (item[1] / sizes[item[0]], item[1], -item[0])
+        )
+        selected = {idx for idx, _ in best}
+        selected.update(self._short)
+        return [self.names[idx] for idx in sorted(selected)]
+
+    def extract_one(self, query: str, scorer=fuzz.WRatio, score_cutoff: int = 0) -> Optional[Tuple[str, int]]:
+        """
+        Drop-in replacement for `process.extractOne(query, names, ...)` over the index.
+
+        Correctly spelled, word-aligned catalog names in the query are found by the
+        exact prepass and only they are scored; the best of them is returned (the
+        earliest in the catalog on a tie, like `extractOne`). Fuzzy candidate scoring
+        runs only for queries without such a hit (or whose hits score below the cutoff).
+
+        Args:
+            query (str): The line or word to match.
+            scorer: A `thefuzz.fuzz` scorer. Defaults to WRatio, like `extractOne`.
+            score_cutoff (int): Minimum score for a match to be returned.
+
+        Returns:
+            Optional[Tuple[str, int]]: (name, score) of the best candidate, or None.
+        """
+        best = None
+        for hit in self.exact.find_all(query):
+            score = scorer(query, hit)
+            if score >= score_cutoff and (best is None or score > best[1]):
+                best = (hit, score)
+        if best is not None:
+            return best
+
+        choices = self.candidates(query)
+        if not choices:
+            return None
+        return process.extractOne(query, choices, scorer=scorer, score_cutoff=score_cutoff)
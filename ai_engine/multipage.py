@@ -0,0 +1,153 @@
+"""
+Multi-Page Module
+=================
+Ingestion of multi-page prescriptions (PDF and TIFF).
+
+Pages are rasterized lazily, one at a time, as the worker pool has room for them.
+Each page is normalized, binarized, deskewed and OCR'd on a thread pool with at most
+`max_in_flight` pages held in memory, and the page texts are returned in page order
+so they can be stitched into one document. A medicine block that runs onto the next
+page therefore parses exactly as if it had been on one page.
+
+PDF rendering uses the optional `pypdfium2` package; TIFF pages are read with Pillow.
+"""
+
+import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+
+import cv2
+import numpy as np
+from PIL import Image, ImageSequence
+
+from .image_processor import ImageSource, as_decodable, decode_image
+
+# Resolution PDF pages are rendered at
+PDF_DPI = 300
+# Pages rasterized and processed at the same time
+MAX_PAGES_IN_FLIGHT = 4
+# Longest document accepted
+MAX_PAGES = 100
+
+T = TypeVar("T")
+
+_PDF_MAGIC = b"%PDF"
+_TIFF_MAGIC = (b"II*\x00", b"MM\x00*")
+
+def _head(source) -> bytes:
+    if isinstance(source, str):
+        try:
+            with open(source, "rb") as f:
+                return f.read(4)
+        except OSError:
+            return b""
+    return source[:4].tobytes()
+
+def document_format(source: ImageSource) -> str:
+    """Returns "pdf", "tiff" or "image" based on the file signature."""
+    head = _head(as_decodable(source))
+    if head == _PDF_MAGIC:
+        return "pdf"
+    if head in _TIFF_MAGIC:
+        return "tiff"
+    return "image"
+
+def is_multipage(source: ImageSource) -> bool:
+    """Whether the source is a PDF or TIFF (handled page by page, even with one page)."""
+    return document_format(source) != "image"
+
+def _iter_pdf_pages(source, dpi: int) -> Iterator[np.ndarray]:
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        raise ValueError("PDF input requires the pypdfium2 package")
+
+    document = pdfium.PdfDocument(source if isinstance(source, str) else source.tobytes())
+    try:
+        for index in range(len(document)):
+            page = document[index]
+            try:
+                bitmap = page.render(scale=dpi / 72, grayscale=True)
+                # Copy out of the bitmap buffer, which is freed with the page
+                pixels = np.array(bitmap.to_numpy())
+                yield pixels if pixels.ndim == 2 else pixels[:, :, 0]
+            finally:
+                page.close()
+    finally:
+        document.close()
+
+def _iter_tiff_pages(source) -> Iterator[np.ndarray]:
+    image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+    with image:
+        for frame in ImageSequence.Iterator(image):
+            yield np.asarray(frame.convert("L"))
+
+def iter_pages(source: ImageSource, dpi: int = PDF_DPI, max_pages: int = MAX_PAGES) -> Iterator[np.ndarray]:
+    """
+    Lazily yields the pages of a PDF, TIFF or single image as grayscale arrays.
+
+    Args:
+        source (ImageSource): Path or in-memory file.
+        dpi (int): Rendering resolution for PDF pages.
+        max_pages (int): Documents with more pages are rejected.
+
+    Raises:
+        ValueError: If the document cannot be read or has more than `max_pages` pages.
+    """
+    source = as_decodable(source)
+    kind = document_format(source)
+    if kind == "pdf":
+        pages = _iter_pdf_pages(source, dpi)
+    elif kind == "tiff":
+        pages = _iter_tiff_pages(source)
+    else:
+        pages = iter([decode_image(source, cv2.IMREAD_GRAYSCALE)])
+
+    for number, page in enumerate(pages, start=1):
+        if number > max_pages:
+            raise ValueError(f"Document has more than {max_pages} pages")
+        yield page
+
+def map_pages(pages: Iterable[np.ndarray], process: Callable[[np.ndarray], T],
+              workers: Optional[int] = None, max_in_flight: int = MAX_PAGES_IN_FLIGHT) -> Iterator[T]:
+    """
+    Runs `process` over the pages on a thread pool and yields the results in page order.
+
+    A new page is pulled from `pages` (i.e. rasterized) only when fewer than
+    `max_in_flight` pages are being processed or waiting to be yielded, so memory
+    stays bounded however long the document is.
+
+    Args:
+        pages (Iterable[np.ndarray]): Lazily produced pages.
+        process (Callable): Turns one page into its text (preprocessing + OCR).
+        workers (int, optional): Threads; defaults to `max_in_flight`.
+        max_in_flight (int): Upper bound on pages held at once.
+    """
+    pages = iter(pages)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers or max_in_flight) as pool:
+        try:
+            while True:
+                # Free a slot before the next page is rasterized
+                if len(pending) >= max_in_flight:
+                    yield pending.popleft().result()
+                    continue
+                page = next(pages, None)
+                if page is None:
+                    break
+                pending.append(pool.submit(process, page))
+                del page
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+def ocr_document(source: ImageSource, process: Callable[[np.ndarray], T], workers: Optional[int] = None,
+                 max_in_flight: int = MAX_PAGES_IN_FLIGHT, dpi: int = PDF_DPI) -> List[T]:
+    """
+    OCRs every page of a multi-page document and returns the results of `process`
+    (the page texts) in page order.
+    """
+    return list(map_pages(iter_pages(source, dpi=dpi), process, workers=workers, max_in_flight=max_in_flight))
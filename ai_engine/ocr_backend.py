@@ -0,0 +1,311 @@
+"""
+OCR Backend Module
+==================
+Pluggable OCR engines for the pipeline.
+
+- **PytesseractBackend** (default and fallback): `pytesseract.image_to_string`, which
+  starts the tesseract binary, writes a temp image and reloads the language models
+  on every call.
+- **TesseractPoolBackend**: long-lived worker processes that each load the models
+  once (through the tesserocr bindings) and receive raw pixels over a pipe. Jobs are
+  handed to an idle worker; a worker that exceeds the per-job timeout is killed and
+  replaced.
+
+`create_ocr_backend` picks a backend by name and falls back to pytesseract (with a
+logged warning) when the pooled engine is unavailable.
+"""
+
+import abc
+import logging
+import multiprocessing
+import queue
+import struct
+import threading
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+class OCRTimeout(TimeoutError):
+    """Raised when an OCR job exceeds the backend's per-job timeout."""
+
+class OCRBackend(abc.ABC):
+    """
+    Interface for OCR engines: turn a preprocessed image into text.
+    """
+    name = "base"
+
+    @abc.abstractmethod
+    def image_to_string(self, image: Image.Image) -> str:
+        """Returns the text recognized in the image."""
+
+    def image_to_text_and_confidence(self, image: Image.Image) -> Tuple[str, Optional[float]]:
+        """
+        Returns the text and the mean word confidence (0-100), or None for the confidence
+        if the engine does not report one. The text is the same as `image_to_string`'s.
+        """
+        return self.image_to_string(image), None
+
+    def close(self) -> None:
+        """Releases any resources (worker processes) held by the backend."""
+
+class PytesseractBackend(OCRBackend):
+    """
+    One tesseract process per call, through pytesseract.
+    """
+    name = "pytesseract"
+
+    def __init__(self, config: str = "", lang: Optional[str] = None):
+        self.config = config
+        self.lang = lang
+
+    def image_to_string(self, image: Image.Image) -> str:
+        return pytesseract.image_to_string(image, lang=self.lang, config=self.config)
+
+    def image_to_text_and_confidence(self, image: Image.Image) -> Tuple[str, Optional[float]]:
+        """
+        One tesseract run writes both the plain text (what `image_to_string` returns) and
+        the per-word data, whose confidences are averaged (None if no words were found).
+        """
+        tess = pytesseract.pytesseract
+        config = f"-c tessedit_create_tsv=1 {self.config}".strip()
+        with tess.save(image) as (output_base, input_filename):
+            tess.run_tesseract(input_filename, output_base, "txt tsv", self.lang, config)
+            with open(f"{output_base}.txt", "rb") as f:
+                text = f.read().decode("utf-8")
+            with open(f"{output_base}.tsv", "rb") as f:
+                data = tess.file_to_dict(f.read().decode("utf-8"), "\t", -1)
+        return text, words_to_text_and_confidence(data)[1]
+
+def words_to_text_and_confidence(data) -> Tuple[str, Optional[float]]:
+    """
+    Turns `image_to_data` output (a dict of columns) into (text, mean word confidence).
+    """
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if conf < 0 or not word.strip():
+            # Page, block, paragraph and line rows, and empty words
+            continue
+        key = (data["page_num"][i], data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+        confidences.append(conf)
+    text = "\n".join(" ".join(words) for words in lines.values())
+    return text, (sum(confidences) / len(confidences) if confidences else None)
+
+# --- Worker process side ---
+# A job is one pipe message: a (width, height, bytes_per_pixel) header followed by raw
+# 8-bit pixels, row-major. The worker answers with ("ok", text, mean confidence or None)
+# or ("error", message, None).
+_HEADER = struct.Struct("<III")
+
+class _TesserocrEngine:
+    """Keeps one initialized Tesseract API for the life of the worker."""
+
+    def __init__(self, lang: str, config: str):
+        import tesserocr
+        self.api = tesserocr.PyTessBaseAPI(lang=lang)
+        # Only "-c name=value" style variables carry over from a pytesseract config string
+        tokens = config.split()
+        for flag, setting in zip(tokens, tokens[1:]):
+            if flag == "-c" and "=" in setting:
+                self.api.SetVariable(*setting.split("=", 1))
+
+    def recognize(self, pixels: bytes, width: int, height: int, bytes_per_pixel: int) -> str:
+        self.api.SetImageBytes(pixels, width, height, bytes_per_pixel, width * bytes_per_pixel)
+        return self.api.GetUTF8Text()
+
+    def confidence(self) -> float:
+        """Mean word confidence of the last recognized image."""
+        return float(self.api.MeanTextConf())
+
+def tesserocr_engine(lang: str, config: str) -> _TesserocrEngine:
+    return _TesserocrEngine(lang, config)
+
+def _worker_main(conn, engine_factory: Callable[[str, str], Any], lang: str, config: str) -> None:
+    engine = engine_factory(lang, config)
+    while True:
+        try:
+            message = conn.recv_bytes()
+        except EOFError:
+            return
+        if not message:
+            return
+        width, height, bytes_per_pixel = _HEADER.unpack_from(message)
+        try:
+            text = engine.recognize(message[_HEADER.size:], width, height, bytes_per_pixel)
+            confidence = engine.confidence() if hasattr(engine, "confidence") else None
+            conn.send(("ok", text, confidence))
+        except Exception as e:
+            conn.send(("error", str(e), None))
+
+class _Worker:
+    def __init__(self, ctx, engine_factory, lang: str, config: str):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, engine_factory, lang, config), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send_bytes(b"")
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+        self.conn.close()
+
+class TesseractPoolBackend(OCRBackend):
+    """
+    Pool of persistent OCR worker processes.
+    """
+    name = "pool"
+
+    def __init__(self, pool_size: int = 2, timeout: float = 30.0, lang: str = "eng", config: str = "",
+                 engine_factory: Callable[[str, str], Any] = tesserocr_engine):
+        """
+        Args:
+            pool_size (int): Number of worker processes, i.e. concurrent OCR jobs.
+            timeout (float): Seconds a job may run before its worker is killed and replaced.
+            lang (str): Tesseract language(s), loaded once per worker.
+            config (str): Tesseract variables as "-c name=value" pairs.
+            engine_factory (Callable): Builds the per-worker engine from (lang, config). Must
+                                       be picklable; the object it returns needs a
+                                       `recognize(pixels, width, height, bytes_per_pixel)` method,
+                                       and may have a `confidence()` method.
+        """
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.lang = lang
+        self.config = config
+        self._engine_factory = engine_factory
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(pool_size):
+            self._start_worker()
+
+    @staticmethod
+    def available() -> bool:
+        """Whether the tesserocr bindings used by the default engine are installed."""
+        try:
+            import tesserocr  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def _start_worker(self) -> None:
+        worker = _Worker(self._ctx, self._engine_factory, self.lang, self.config)
+        with self._lock:
+            if not self._closed:
+                self._workers.append(worker)
+                self._idle.put(worker)
+                return
+        worker.stop()
+
+    def _release(self, worker: _Worker) -> None:
+        """Returns a worker after its job: to the idle queue, or stopped if the pool closed meanwhile."""
+        with self._lock:
+            if not self._closed:
+                self._idle.put(worker)
+                return
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.stop()
+
+    def _retire(self, worker: _Worker) -> None:
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.stop(kill=True)
+        if not self._closed:
+            self._start_worker()
+
+    def image_to_string(self, image: Image.Image) -> str:
+        return self.image_to_text_and_confidence(image)[0]
+
+    def image_to_text_and_confidence(self, image: Image.Image) -> Tuple[str, Optional[float]]:
+        """
+        Runs OCR on an idle worker, waiting for one if all are busy.
+
+        Raises:
+            OCRTimeout: If the job did not finish within `timeout` seconds.
+            RuntimeError: If the worker reported an error or died, or the backend is closed.
+        """
+        pixels = np.ascontiguousarray(image.convert("L") if image.mode not in ("L", "RGB") else image)
+        height, width = pixels.shape[:2]
+        bytes_per_pixel = 1 if pixels.ndim == 2 else pixels.shape[2]
+
+        if self._closed:
+            raise RuntimeError("OCR backend is closed")
+        worker = self._idle.get()
+        if worker is None:
+            # Closed while waiting: pass the wake-up on to the next waiter
+            self._idle.put(None)
+            raise RuntimeError("OCR backend is closed")
+        try:
+            worker.conn.send_bytes(_HEADER.pack(width, height, bytes_per_pixel) + pixels.tobytes())
+            finished = worker.conn.poll(self.timeout)
+            result = worker.conn.recv() if finished else None
+        except (EOFError, OSError) as e:
+            self._retire(worker)
+            raise RuntimeError(f"OCR worker died: {e}")
+
+        if result is None:
+            self._retire(worker)
+            raise OCRTimeout(f"OCR job exceeded {self.timeout}s")
+        self._release(worker)
+
+        status, payload, confidence = result
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload, confidence
+
+    def close(self) -> None:
+        """
+        Stops the idle workers; busy ones are stopped when their job ends. Jobs waiting for
+        a worker, and any later calls, raise RuntimeError.
+        """
+        idle = []
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if worker is not None:
+                    idle.append(worker)
+                    self._workers.remove(worker)
+        self._idle.put(None)
+        for worker in idle:
+            worker.stop()
+
+def create_ocr_backend(name: str = "pytesseract", pool_size: int = 2, timeout: float = 30.0,
+                       lang: str = "eng") -> OCRBackend:
+    """
+    Builds an OCR backend by name ("pytesseract" or "pool").
+
+    The pooled backend needs the tesserocr bindings; without them this falls back to
+    pytesseract, so callers can always ask for the pool.
+
+    Raises:
+        ValueError: If the name is unknown.
+    """
+    if name == "pool":
+        if TesseractPoolBackend.available():
+            return TesseractPoolBackend(pool_size=pool_size, timeout=timeout, lang=lang)
+        logger.warning("OCR backend 'pool' needs the tesserocr bindings, which are not installed; "
+                       "falling back to pytesseract")
+        return PytesseractBackend(lang=lang)
+    if name == "pytesseract":
+        return PytesseractBackend(lang=lang)
+    raise ValueError(f"Unknown OCR backend '{name}'. Choose from: pytesseract, pool")
@@ -0,0 +1,242 @@
+"""
+OCR Cache Module
+================
+Persistent store of OCR results keyed by the uploaded image.
+
+Every entry is indexed two ways:
+
+- **Exact**: SHA-256 of the encoded bytes, so a re-uploaded file is found at once.
+- **Near-duplicate**: a 256-bit perceptual hash (DCT of a 64x64 grayscale thumbnail).
+  A rescaled, recompressed or re-exposed copy of the same scan lands within a few
+  bits of the original; `max_distance` sets how many bits may differ.
+
+Each entry belongs to a namespace naming the OCR settings that produced it, and is
+keyed by (SHA-256, namespace): the same image OCR'd under different settings is
+stored once per namespace, and lookups never cross namespaces.
+
+Entries are stored in SQLite and trimmed least-recently-used first once the store
+exceeds `max_entries` or `max_bytes` of text. The perceptual hashes are mirrored in
+a NumPy array, so a near-duplicate lookup is one vectorized scan.
+
+Near-duplicate matching trades certainty for hit rate. The hash is sized so that
+different prescriptions on the same letterhead stay well apart (a 64-bit hash puts
+them within 2-4 bits of each other), at the cost of missing photos retaken with a
+different framing, which are simply OCR'd again. Keep `max_distance` small, or set
+it to None to match exact uploads only.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .image_processor import ImageSource, as_decodable, decode_image
+
+# Hashes at most this many bits (of 256) apart are treated as the same page
+DEFAULT_MAX_DISTANCE = 6
+HASH_BYTES = 32
+
+def perceptual_hash(gray: np.ndarray) -> bytes:
+    """
+    DCT perceptual hash: the sign of the 16x16 lowest-frequency DCT coefficients of a
+    64x64 thumbnail, relative to their median (the DC term excluded).
+
+    Returns:
+        bytes: 256-bit hash.
+    """
+    thumb = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(thumb)[:16, :16].flatten()
+    return np.packbits(low > np.median(low[1:])).tobytes()
+
+def _hamming(hashes: np.ndarray, phash: bytes) -> np.ndarray:
+    """Bit distance from `phash` to each row of an (N, HASH_BYTES) uint8 array."""
+    diff = np.bitwise_xor(hashes, np.frombuffer(phash, dtype=np.uint8))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(diff).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(diff, axis=1).sum(axis=1, dtype=np.int64)
+
+class OCRCache:
+    """
+    OCR results for previously seen images, persistent and LRU-bounded.
+    """
+
+    def __init__(self, db_path: str = ":memory:", max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 max_distance: Optional[int] = DEFAULT_MAX_DISTANCE, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            db_path (str): SQLite file holding the store. In memory if omitted.
+            max_entries (int): Least recently used entries beyond this are deleted.
+            max_bytes (int): Budget for the stored OCR text; least recently used entries
+                             are deleted once it is exceeded.
+            max_distance (int, optional): Largest perceptual-hash Hamming distance accepted
+                                          as a near-duplicate. None disables near matching.
+            clock (Callable[[], float]): Source of the current timestamp.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_distance = max_distance
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        columns = self._db.execute("PRAGMA table_info(ocr_cache)").fetchall()
+        if columns and sum(1 for column in columns if column[5]) < 2:
+            # Stores from before namespaces were part of the key: it is only a cache, start over
+            self._db.execute("DROP TABLE ocr_cache")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            "sha256 TEXT NOT NULL, namespace TEXT NOT NULL, phash BLOB, text TEXT NOT NULL, "
+            "regions TEXT, size INTEGER NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (sha256, namespace))"
+        )
+        self._db.commit()
+
+        # Mirror of (sha256, namespace, phash) for the near-duplicate scan
+        rows = self._db.execute("SELECT sha256, namespace, phash FROM ocr_cache WHERE phash IS NOT NULL").fetchall()
+        self._keys: List[Tuple[str, str]] = [(sha, namespace) for sha, namespace, _ in rows]
+        self._hashes = np.frombuffer(b"".join(phash for _, _, phash in rows), dtype=np.uint8).reshape(-1, HASH_BYTES)
+
+    @staticmethod
+    def fingerprint(image: ImageSource) -> Tuple[str, Optional[bytes]]:
+        """
+        Returns the SHA-256 of the encoded image and its perceptual hash. The hash is
+        None when the bytes cannot be decoded as a single image (e.g. a PDF).
+        """
+        data = as_decodable(image)
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                data = np.frombuffer(f.read(), dtype=np.uint8)
+        sha = hashlib.sha256(data).hexdigest()
+        try:
+            # A 1/8-scale decode is plenty for a 64x64 thumbnail (and skips most of the JPEG work)
+            gray = decode_image(data, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        except ValueError:
+            return sha, None
+        return sha, perceptual_hash(gray)
+
+    def get(self, sha256: str, phash: Optional[bytes], namespace: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Looks up an image by exact hash, then by perceptual hash.
+
+        Args:
+            sha256 (str): From `fingerprint`.
+            phash (bytes, optional): From `fingerprint`.
+            namespace (str): Separates results produced with different OCR settings.
+
+        Returns:
+            Optional[Dict[str, Any]]: {"text", "regions", "match" ("exact" or "near"),
+                                      "distance"}, or None on a miss.
+        """
+        with self._lock:
+            match, distance = "exact", 0
+            key = (sha256, namespace)
+            row = self._db.execute(
+                "SELECT text, regions FROM ocr_cache WHERE sha256 = ? AND namespace = ?", key
+            ).fetchone()
+            if row is None and phash is not None and self.max_distance is not None and len(self._keys):
+                distances = _hamming(self._hashes, phash)
+                for index in np.argsort(distances, kind="stable"):
+                    if distances[index] > self.max_distance:
+                        break
+                    if self._keys[index][1] == namespace:
+                        key = self._keys[index]
+                        row = self._db.execute(
+                            "SELECT text, regions FROM ocr_cache WHERE sha256 = ? AND namespace = ?", key
+                        ).fetchone()
+                        match, distance = "near", int(distances[index])
+                        break
+
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE ocr_cache SET last_used = ? WHERE sha256 = ? AND namespace = ?",
+                             (self._clock(), *key))
+            self._db.commit()
+            if match == "exact":
+                self.exact_hits += 1
+            else:
+                self.near_hits += 1
+        return {"text": row[0], "regions": json.loads(row[1]) if row[1] else None,
+                "match": match, "distance": distance}
+
+    def put(self, sha256: str, phash: Optional[bytes], text: str, regions: Optional[list] = None,
+            namespace: str = "") -> None:
+        """Stores the OCR text (and text regions, if any) of an image."""
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            key = (sha256, namespace)
+            if self._db.execute("SELECT 1 FROM ocr_cache WHERE sha256 = ? AND namespace = ?", key).fetchone():
+                self._remove_from_index_locked([key])
+            self._db.execute(
+                "INSERT OR REPLACE INTO ocr_cache (sha256, namespace, phash, text, regions, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (sha256, namespace, phash, text,
+                 None if regions is None else json.dumps(regions), size, self._clock()),
+            )
+            if phash is not None:
+                self._keys.append(key)
+                self._hashes = np.vstack([self._hashes, np.frombuffer(phash, dtype=np.uint8)])
+            self._trim_locked()
+            self._db.commit()
+
+    def _trim_locked(self) -> None:
+        # Walk from the most recently used entry and cut once either limit is exceeded
+        rows = self._db.execute(
+            "SELECT sha256, namespace, size FROM ocr_cache ORDER BY last_used DESC, rowid DESC"
+        ).fetchall()
+        total = 0
+        for position, (_, _, size) in enumerate(rows):
+            total += size
+            if position >= self.max_entries or total > self.max_bytes:
+                evicted = [(sha, namespace) for sha, namespace, _ in rows[position:]]
+                break
+        else:
+            return
+        self._db.executemany("DELETE FROM ocr_cache WHERE sha256 = ? AND namespace = ?", evicted)
+        self._remove_from_index_locked(evicted)
+        self.evictions += len(evicted)
+
+    def _remove_from_index_locked(self, keys: List[Tuple[str, str]]) -> None:
+        drop = set(keys)
+        keep = [i for i, key in enumerate(self._keys) if key not in drop]
+        if len(keep) != len(self._keys):
+            self._keys = [self._keys[i] for i in keep]
+            self._hashes = self._hashes[keep]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM ocr_cache")
+            self._db.commit()
+            self._keys = []
+            self._hashes = np.empty((0, HASH_BYTES), dtype=np.uint8)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns exact/near hit counts, hit ratio, size and evictions."""
+        hits = self.exact_hits + self.near_hits
+        lookups = hits + self.misses
+        with self._lock:
+            entries, stored = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()
+        return {
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "bytes": stored,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
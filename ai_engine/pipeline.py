@@ -1,8 +1,21 @@
+import threading
 import pytesseract
-from .image_processor import preprocess_image
+from .image_processor import (preprocess_image, quick_preprocess_image, normalize_gray, binarize_and_deskew,
+                              crop_text_regions, ImageSource, TextBox, as_decodable, TARGET_TEXT_HEIGHT,
+                              QUICK_TEXT_HEIGHT)
+from .deskew import DEFAULT_DESKEW_METHOD, SkewEstimator
+from .multipage import is_multipage, ocr_document, MAX_PAGES_IN_FLIGHT
 from .text_processor import extract_entities
 from .refill_estimator import enrich_with_refill_info
-from typing import Dict, Any, Optional, List
+from .medicine_index import MedicineIndex
+from .ocr_backend import OCRBackend, PytesseractBackend
+from .ocr_cache import OCRCache
+from typing import Callable, Dict, Any, Optional, List, Tuple, Union
+
+# Cascade thresholds: the cheap pass is kept when its mean word confidence and the number
+# of medicines it matched in the catalog both reach these
+CASCADE_MIN_CONFIDENCE = 70.0
+CASCADE_MIN_CATALOG_HITS = 1
 
 class PrescriptionParser:
     """
@@ -10,57 +23,230 @@ class PrescriptionParser:
     It connects image processing, OCR, text extraction, and refill estimation
     into a single, easy-to-use pipeline.
     """
-    def __init__(self, tesseract_cmd: Optional[str] = None):
+    def __init__(self, tesseract_cmd: Optional[str] = None, ocr_backend: Optional[OCRBackend] = None,
+                 page_workers: Optional[int] = None, max_pages_in_flight: int = MAX_PAGES_IN_FLIGHT,
+                 crop_text: bool = False, ocr_cache: Optional[OCRCache] = None, tile_workers: int = 1,
+                 cascade: bool = False, min_confidence: float = CASCADE_MIN_CONFIDENCE,
+                 min_catalog_hits: int = CASCADE_MIN_CATALOG_HITS,
+                 target_text_height: Optional[int] = TARGET_TEXT_HEIGHT,
+                 deskew_method: Union[str, SkewEstimator] = DEFAULT_DESKEW_METHOD):
         """
         Initializes the parser.
         
         Args:
             tesseract_cmd (str, optional): Path to the Tesseract binary. 
                                            If not provided, relies on the system PATH.
+            ocr_backend (OCRBackend, optional): OCR engine to use, e.g. a TesseractPoolBackend.
+                                                Defaults to pytesseract.
+            page_workers (int, optional): Threads used for the pages of a PDF/TIFF document.
+                                          Defaults to `max_pages_in_flight`.
+            max_pages_in_flight (int): Most pages of a document rasterized and held at once.
+            crop_text (bool): OCR only the text bands of each page (see `crop_text_regions`),
+                              skipping letterheads, logos, stamps and margins. The band
+                              boxes are returned under "text_regions".
+            ocr_cache (OCRCache, optional): Store of earlier OCR results. Images seen before
+                                            (exactly, or as a near-duplicate) skip
+                                            preprocessing and OCR.
+            tile_workers (int): Threads for tiled denoising/binarization of large images
+                                (identical output). 1 runs untiled.
+            cascade (bool): OCR single images with a cheap pass first (see `quick_preprocess_image`)
+                            and run the full preprocessing only if that pass falls short of
+                            `min_confidence` or `min_catalog_hits`. The tier used is reported
+                            under "ocr_cascade".
+            min_confidence (float): Mean word confidence (0-100) the cheap pass must reach.
+                                    Ignored for backends that report no confidence.
+            min_catalog_hits (int): Catalog medicines the cheap pass must find.
+            target_text_height (int, optional): Median glyph height images are normalized to
+                                                before binarization (see `preprocess_image`).
+            deskew_method (str | Callable): Skew estimator name from `DESKEW_METHODS`, or a callable.
         """
         if tesseract_cmd:
             pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        self.ocr_backend = ocr_backend or PytesseractBackend()
+        self.page_workers = page_workers
+        self.max_pages_in_flight = max_pages_in_flight
+        self.crop_text = crop_text
+        self.ocr_cache = ocr_cache
+        self.tile_workers = tile_workers
+        self.cascade = cascade
+        self.min_confidence = min_confidence
+        self.min_catalog_hits = min_catalog_hits
+        self.target_text_height = target_text_height
+        self.deskew_method = deskew_method
+        self._tier_counts = {"quick": 0, "full": 0}
+        self._tier_lock = threading.Lock()
+
+    def _ocr_page(self, page) -> Tuple[str, Optional[List[TextBox]]]:
+        """Preprocesses and OCRs one rasterized page of a multi-page document."""
+        gray, _ = normalize_gray(page, self.target_text_height)
+        processed_img = binarize_and_deskew(gray, self.deskew_method, tile_workers=self.tile_workers)
+        regions = None
+        if self.crop_text:
+            processed_img, regions = crop_text_regions(processed_img)
+        return self.ocr_backend.image_to_string(processed_img), regions
+
+    def _cache_namespace(self) -> str:
+        """OCR results are only reused under the settings that produced them."""
+        deskew_method = getattr(self.deskew_method, "__qualname__", self.deskew_method)
+        namespace = (f"{self.ocr_backend.name}:crop_text={int(self.crop_text)}:text_height={self.target_text_height}"
+                     f":deskew={deskew_method}:cascade={int(self.cascade)}")
+        if self.cascade:
+            namespace += f":quick_text_height={QUICK_TEXT_HEIGHT}"
+        return namespace
 
-    def run(self, image_path: Optional[str] = None, raw_text: Optional[str] = None, medicine_db: Optional[List[str]] = None) -> Dict[str, Any]:
+    def _quick_pass_ok(self, confidence: Optional[float], catalog_hits: int) -> bool:
+        if confidence is not None and confidence < self.min_confidence:
+            return False
+        return catalog_hits >= self.min_catalog_hits
+
+    def cascade_stats(self) -> Dict[str, Any]:
+        """Returns how many images each cascade tier produced, and the escalation rate."""
+        with self._tier_lock:
+            counts = dict(self._tier_counts)
+        total = counts["quick"] + counts["full"]
+        return {**counts, "escalation_rate": round(counts["full"] / total, 4) if total else 0.0}
+
+    def run(self, image_path: Optional[str] = None, raw_text: Optional[str] = None, medicine_db: Optional[Union[List[str], MedicineIndex]] = None,
+            image_data: Optional[ImageSource] = None, progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """
         Executes the full parsing pipeline.
 
         Workflow:
-        1.  **Image Processing** (if `image_path` provided): Preprocesses the image (deskew, denoise).
-        2.  **OCR** (if `image_path` provided): Extracts text using Tesseract.
+        1.  **Image Processing** (if `image_path` or `image_data` provided): Preprocesses the image (deskew, denoise),
+            and crops it to its text bands when `crop_text` is enabled.
+        2.  **OCR** (if an image was provided): Extracts text using the configured OCR backend,
+            or takes it from `ocr_cache` when the image was seen before (steps 1-2 are skipped).
+            With `cascade`, a cheap preprocess + OCR pass runs first and steps 1-2 run in full
+            only when its confidence or catalog hits are below the thresholds.
+            PDF and TIFF documents are processed page by page in parallel and the page texts
+            are joined in page order, so a medicine block can continue onto the next page.
         3.  **Text Extraction**: Parses the text (raw or OCR'd) to identify medicines, dosages, etc.
         4.  **Refill Estimation**: Calculates quantity needed and refill dates.
 
         Args:
             image_path (str, optional): Path to the prescription image.
             raw_text (str, optional): Direct text input (bypasses OCR).
-            medicine_db (List[str], optional): List of known medicines for fuzzy matching.
+            medicine_db (List[str] | MedicineIndex, optional): Known medicines for fuzzy matching.
+            image_data (bytes | memoryview | file-like, optional): Encoded image held in memory,
+                                                                 decoded without a temp file.
+            progress (Callable[[str], None], optional): Called with the name of each stage as it
+                                                        starts: "preprocess", "ocr", "extraction",
+                                                        "refill" (the first two only for images).
 
         Returns:
             Dict[str, Any]: Structured data containing medicines, reminders, and refill info.
+                            With `crop_text`, "text_regions" holds the band boxes of each page
+                            (in preprocessed-image coordinates) for debugging. With `ocr_cache`,
+                            "ocr_cache" reports {"hit": False} or {"hit": True, "match":
+                            "exact" | "near", "distance": <bits>} for image input. With `cascade`,
+                            "ocr_cascade" holds the tier used ("quick" or "full") and the
+                            confidence and catalog hits of each pass that ran.
                             Returns a dictionary with an "error" key if a step fails.
         """
-        if image_path:
-            # 1. Image Preprocessing
+        report = progress or (lambda stage: None)
+        regions = None
+        image = image_path or image_data
+        if image is not None:
+            # Read file-like input once; every step below can then reuse it
+            image = as_decodable(image)
+
+        cache_key = cache_info = cascade_info = data = None
+        if image is not None and self.ocr_cache is not None:
             try:
-                processed_img = preprocess_image(image_path)
-            except Exception as e:
+                cache_key = self.ocr_cache.fingerprint(image)
+            except OSError as e:
                 return {"error": f"Image processing failed: {str(e)}"}
+            cached = self.ocr_cache.get(*cache_key, namespace=self._cache_namespace())
+            cache_info = {"hit": cached is not None}
+            if cached is not None:
+                cache_info.update(match=cached["match"], distance=cached["distance"])
 
-            # 2. OCR
+        if cache_info and cache_info["hit"]:
+            # 1-2. Seen before: reuse the stored OCR output
+            text, regions = cached["text"], cached["regions"]
+        elif image is not None and is_multipage(image):
+            # 1-2. Multi-page document: pages are preprocessed and OCR'd concurrently
+            report("preprocess")
+            report("ocr")
             try:
-                text = pytesseract.image_to_string(processed_img)
+                pages = ocr_document(image, self._ocr_page, workers=self.page_workers,
+                                     max_in_flight=self.max_pages_in_flight)
             except Exception as e:
-                return {"error": f"OCR failed: {str(e)}"}
+                return {"error": f"Multi-page OCR failed: {str(e)}"}
+            text = "\n".join(page_text for page_text, _ in pages)
+            if self.crop_text:
+                regions = [page_regions for _, page_regions in pages]
+        elif image is not None:
+            text = None
+            report("preprocess")
+            if self.cascade:
+                # 1-2. Cascade: cheap pass first, kept if it looks trustworthy
+                try:
+                    quick_img = quick_preprocess_image(image)
+                except Exception as e:
+                    return {"error": f"Image processing failed: {str(e)}"}
+                report("ocr")
+                try:
+                    quick_text, confidence = self.ocr_backend.image_to_text_and_confidence(quick_img)
+                except Exception as e:
+                    return {"error": f"OCR failed: {str(e)}"}
+                quick_data = extract_entities(quick_text, medicine_db=medicine_db)
+                hits = len(quick_data["medicines"])
+                cascade_info = {"tier": "quick", "quick_confidence": confidence, "quick_catalog_hits": hits}
+                if self._quick_pass_ok(confidence, hits):
+                    # Step 3 reuses this extraction
+                    text, data = quick_text, quick_data
+                else:
+                    cascade_info["tier"] = "full"
+
+            if text is None:
+                # 1. Image Preprocessing
+                try:
+                    processed_img = preprocess_image(image, self.target_text_height, self.deskew_method,
+                                                     tile_workers=self.tile_workers)
+                    if self.crop_text:
+                        processed_img, page_regions = crop_text_regions(processed_img)
+                        regions = [page_regions]
+                except Exception as e:
+                    return {"error": f"Image processing failed: {str(e)}"}
+
+                # 2. OCR
+                if not self.cascade:
+                    report("ocr")
+                try:
+                    if self.cascade:
+                        # The same text as image_to_string, with the confidence for the report
+                        text, cascade_info["full_confidence"] = self.ocr_backend.image_to_text_and_confidence(processed_img)
+                    else:
+                        text = self.ocr_backend.image_to_string(processed_img)
+                except Exception as e:
+                    return {"error": f"OCR failed: {str(e)}"}
+
+            if cascade_info is not None:
+                with self._tier_lock:
+                    self._tier_counts[cascade_info["tier"]] += 1
         elif raw_text:
             text = raw_text
         else:
-            return {"error": "No image_path or raw_text provided"}
+            return {"error": "No image_path, image_data or raw_text provided"}
+
+        if cache_key is not None and not cache_info["hit"]:
+            self.ocr_cache.put(*cache_key, text, regions, namespace=self._cache_namespace())
 
         # 3. Text Extraction
-        data = extract_entities(text, medicine_db=medicine_db)
+        report("extraction")
+        if data is None:
+            data = extract_entities(text, medicine_db=medicine_db)
 
         # 4. Refill Estimation
+        report("refill")
         data["medicines"] = enrich_with_refill_info(data["medicines"])
 
+        if regions is not None:
+            data["text_regions"] = regions
+        if cache_info is not None:
+            data["ocr_cache"] = cache_info
+        if cascade_info is not None:
+            data["ocr_cascade"] = cascade_info
+
         return data
@@ -1,6 +1,9 @@
 import re
-from typing import List, Dict, Any, Optional
-from thefuzz import process
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Union
+from .entity_scanner import EntityScanner
+from .medicine_index import MedicineIndex
+from .batch_matcher import BatchMatcher
+from .lru_cache import LRUCache
 
 """
 Text Processor Module
@@ -53,51 +56,135 @@ NOISE_PATTERNS = [
     r'Dr\.', r'Clinic', r'Hospital', r'Ph:', r'Date:', r'Name:', r'Age:', r'Sex:', r'Rx'
 ]
 
+# Precompiled once at import: one combined noise regex, and a scanner that tags
+# dosage/timing/food/duration entities with a single call per line.
+NOISE_REGEX = re.compile("|".join(f"(?:{p})" for p in NOISE_PATTERNS), re.IGNORECASE)
+
+DEFAULT_MEDICINE_INDEX = MedicineIndex(MEDICINE_DB)
+
+ENTITY_SCANNER = EntityScanner({
+    "dosage": DOSAGE_PATTERNS,
+    "timing": TIMING_PATTERNS,
+    "food_instruction": FOOD_PATTERNS,
+    "duration": DURATION_PATTERNS,
+})
+
+# Per-line memo shared across requests: stripped line -> (best match, tagged entities).
+# Keys include the catalog index id and version, so catalog updates never serve stale
+# matches. Only long-lived indexes (the default or one passed in) are memoized.
+LINE_CACHE = LRUCache(max_bytes=16 * 1024 * 1024)
+
 def is_noise(line: str) -> bool:
     """
     Checks if a line contains common prescription noise (headers, doctor info, etc.).
     """
-    for pattern in NOISE_PATTERNS:
-        if re.search(pattern, line, re.IGNORECASE):
-            return True
-    return False
+    return NOISE_REGEX.search(line) is not None
 
-def extract_entities(text: str, medicine_db: Optional[List[str]] = None) -> Dict[str, Any]:
+def extract_details(line: str) -> Dict[str, List[str]]:
     """
-    Extracts structured medicine data from raw text.
+    Extracts dosage, timing, food instruction and duration strings from a single line.
+
+    Returns:
+        Dict[str, List[str]]: The matches per field, with timings and food instructions lowercased.
+    """
+    found = ENTITY_SCANNER.scan(line)
+
+    # Flatten tuple matches if any (some regex groups return tuples)
+    food_instruction = []
+    for m in found["food_instruction"]:
+        if isinstance(m, tuple):
+            food_instruction.append(" ".join(m).lower())
+        else:
+            food_instruction.append(m.lower())
+
+    return {
+        "dosage": found["dosage"],
+        "timing": [m.lower() for m in found["timing"]],
+        "duration": found["duration"],
+        "food_instruction": food_instruction,
+    }
+
+def _finalize(med: Dict[str, Any]) -> Dict[str, Any]:
+    """Deduplicates the detail lists of a finished medicine record."""
+    med["dosage"] = list(set(med["dosage"]))
+    med["timing"] = list(set(med["timing"]))
+    med["duration"] = list(set(med["duration"]))
+    med["food_instruction"] = list(set(med["food_instruction"]))
+    return med
+
+def iter_medicines(lines: Iterable[str], medicine_db: Optional[Union[List[str], MedicineIndex]] = None,
+                   batch_match: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Streams structured medicine records from an iterable of OCR text lines.
+
+    A record is yielded as soon as the next medicine header closes it (the last one
+    when the input ends), so memory stays constant in the length of the input: only
+    the open record and the set of names already yielded are kept. Like
+    `extract_entities`, a medicine that appears again later is reported once, with
+    the details of its first occurrence.
 
     Args:
-        text (str): The raw OCR text output.
-        medicine_db (List[str], optional): A list of known medicine names for fuzzy matching.
-                                           Defaults to the internal MEDICINE_DB if not provided.
+        lines (Iterable[str]): Lines of OCR text; a file object or any lazy iterator works.
+        medicine_db (List[str] | MedicineIndex, optional): Known medicine names, as in
+                                                          `extract_entities`.
+        batch_match (bool): Score all lines in one similarity matrix. This needs every
+                            line up front, so the input is materialized first.
 
-    Returns:
-        Dict[str, Any]: A dictionary containing:
-            - 'medicines': A list of medicine objects (dicts).
-            - 'raw_text': The original input text.
+    Yields:
+        Dict[str, Any]: Medicine objects with name, dosage, timing, duration and
+                        food_instruction.
     """
     if medicine_db is None:
-        medicine_db = MEDICINE_DB
-        
-    lines = text.split('\n')
-    medicines = []
-    
+        medicine_db = DEFAULT_MEDICINE_INDEX
+
+    memo_key = None
+    if batch_match:
+        # Match every candidate line up front, in one (chunked) similarity matrix
+        lines = [l.strip() for l in lines]
+        candidate_lines = [l for l in lines if l and not is_noise(l)]
+        batch_matches = iter(BatchMatcher(medicine_db).best_matches(candidate_lines, score_cutoff=80))
+    elif isinstance(medicine_db, MedicineIndex):
+        medicine_index = medicine_db
+        memo_key = (medicine_index.uid, medicine_index.version)
+    else:
+        medicine_index = MedicineIndex(medicine_db)
+
     current_med = None
-    
+    seen_names = set()
+
     for line in lines:
         line = line.strip()
         if not line or is_noise(line):
             continue
-            
-        # 1. Identify Medicine Name (Fuzzy Match)
-        # We use a high score cutoff (80) to avoid false positives on random text
-        best_match = process.extractOne(line, medicine_db, score_cutoff=80)
-        
+
+        memo = memo_key + (line,) if memo_key else None
+        cached = LINE_CACHE.get(memo) if memo else None
+        if cached is not None:
+            best_match, details = cached
+        else:
+            # 1. Identify Medicine Name (Fuzzy Match)
+            # We use a high score cutoff (80) to avoid false positives on random text.
+            # The trigram index narrows the catalog to a few candidates before scoring.
+            if batch_match:
+                best_match = next(batch_matches)
+            else:
+                best_match = medicine_index.extract_one(line, score_cutoff=80)
+
+            # Remove the medicine name from the line to parse the rest of the details
+            # This prevents the medicine name itself from triggering other regex matches
+            details_line = line.replace(best_match[0], "") if best_match else line
+
+            # 2-5. Extract Dosage, Timing, Food Instructions and Duration
+            details = extract_details(details_line)
+            if memo:
+                LINE_CACHE.put(memo, (best_match, details))
+
         if best_match:
-            # Save previous medicine if exists
-            if current_med:
-                medicines.append(current_med)
-            
+            # The previous medicine is complete; emit it unless its name was already seen
+            if current_med and current_med["name"] not in seen_names:
+                seen_names.add(current_med["name"])
+                yield _finalize(current_med)
+
             current_med = {
                 "name": best_match[0],
                 "dosage": [],
@@ -105,58 +192,32 @@ def extract_entities(text: str, medicine_db: Optional[List[str]] = None) -> Dict
                 "duration": [],
                 "food_instruction": []
             }
-            
-            # Remove the medicine name from the line to parse the rest of the details
-            # This prevents the medicine name itself from triggering other regex matches
-            line = line.replace(best_match[0], "") 
-            
+
         if current_med:
-            # 2. Extract Dosage
-            for pattern in DOSAGE_PATTERNS:
-                matches = re.findall(pattern, line, re.IGNORECASE)
-                if matches:
-                    current_med["dosage"].extend(matches)
-            
-            # 3. Extract Timing
-            for pattern in TIMING_PATTERNS:
-                matches = re.findall(pattern, line, re.IGNORECASE)
-                if matches:
-                    current_med["timing"].extend([m.lower() for m in matches])
-
-            # 4. Extract Food Instructions
-            for pattern in FOOD_PATTERNS:
-                matches = re.findall(pattern, line, re.IGNORECASE)
-                if matches:
-                    # Flatten tuple matches if any (some regex groups return tuples)
-                    for m in matches:
-                        if isinstance(m, tuple):
-                            current_med["food_instruction"].append(" ".join(m).lower())
-                        else:
-                            current_med["food_instruction"].append(m.lower())
-
-            # 5. Extract Duration
-            for pattern in DURATION_PATTERNS:
-                matches = re.findall(pattern, line, re.IGNORECASE)
-                if matches:
-                    current_med["duration"].extend(matches)
-                    
-    # Append the last medicine found
-    if current_med:
-        medicines.append(current_med)
-        
-    # Deduplicate within each medicine object
-    for med in medicines:
-        med["dosage"] = list(set(med["dosage"]))
-        med["timing"] = list(set(med["timing"]))
-        med["duration"] = list(set(med["duration"]))
-        med["food_instruction"] = list(set(med["food_instruction"]))
-        
-    # Deduplicate medicines list (in case the same medicine appears multiple times)
-    unique_medicines = []
-    seen_names = set()
-    for med in medicines:
-        if med["name"] not in seen_names:
-            unique_medicines.append(med)
-            seen_names.add(med["name"])
-            
-    return {"medicines": unique_medicines, "raw_text": text}
+            for key, values in details.items():
+                current_med[key].extend(values)
+
+    # Emit the last medicine found
+    if current_med and current_med["name"] not in seen_names:
+        yield _finalize(current_med)
+
+def extract_entities(text: str, medicine_db: Optional[Union[List[str], MedicineIndex]] = None,
+                     batch_match: bool = False) -> Dict[str, Any]:
+    """
+    Extracts structured medicine data from raw text.
+
+    Args:
+        text (str): The raw OCR text output.
+        medicine_db (List[str] | MedicineIndex, optional): Known medicine names for fuzzy matching,
+                                           either as a plain list or a prebuilt MedicineIndex.
+                                           Defaults to the internal MEDICINE_DB if not provided.
+        batch_match (bool): Score all lines against the full catalog in one similarity matrix
+                            (see BatchMatcher) instead of one trigram-filtered lookup per line.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing:
+            - 'medicines': A list of medicine objects (dicts).
+            - 'raw_text': The original input text.
+    """
+    medicines = list(iter_medicines(text.split('\n'), medicine_db, batch_match=batch_match))
+    return {"medicines": medicines, "raw_text": text}
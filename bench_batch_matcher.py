@@ -0,0 +1,55 @@
+import random
+import sys
+import time
+from thefuzz import process
+from ai_engine.batch_matcher import BatchMatcher
+from ai_engine.text_processor import MEDICINE_DB
+from testing_helpers import synthetic_catalog, typo
+
+TAILS = ["500mg 1-0-1 for 5 days", "BD after food", "1 tab OD x 1 week", "before breakfast", ""]
+
+def synthetic_lines(catalog, count: int, rng: random.Random):
+    lines = []
+    for _ in range(count):
+        if rng.random() < 0.4:
+            # Detail lines without a medicine name
+            lines.append(rng.choice(["1-0-1 after food", "for 3 days", "Take with water", "BD x 5 days"]))
+        else:
+            lines.append(f"{typo(rng.choice(catalog), rng)} {rng.choice(TAILS)}".strip())
+    return lines
+
+def run_benchmarks(catalog_sizes=(1_000, 100_000), line_counts=(10, 100, 1000), max_per_line_seconds=60.0):
+    rng = random.Random(11)
+    for size in catalog_sizes:
+        catalog = list(dict.fromkeys(MEDICINE_DB + synthetic_catalog(size)))[:size]
+        matcher = BatchMatcher(catalog)
+        print(f"Catalog: {len(catalog)} names")
+
+        for count in line_counts:
+            lines = synthetic_lines(catalog, count, rng)
+
+            start = time.perf_counter()
+            batched = matcher.best_matches(lines, score_cutoff=80)
+            batch_time = time.perf_counter() - start
+
+            # Per-line extractOne; on very large inputs only a prefix is timed and the
+            # total is extrapolated so the benchmark finishes in reasonable time
+            start = time.perf_counter()
+            per_line = []
+            for line in lines:
+                per_line.append(process.extractOne(line, catalog, score_cutoff=80))
+                if time.perf_counter() - start > max_per_line_seconds:
+                    break
+            measured = time.perf_counter() - start
+            per_line_time = measured * len(lines) / len(per_line)
+            note = "" if len(per_line) == len(lines) else f" (extrapolated from {len(per_line)} lines)"
+
+            identical = batched[:len(per_line)] == per_line
+            print(f"  {count:>5} lines: per-line {per_line_time:8.3f}s{note}, "
+                  f"matrix {batch_time:8.3f}s, speedup {per_line_time / batch_time:6.1f}x, "
+                  f"identical={identical}")
+        print("-" * 20)
+
+if __name__ == "__main__":
+    sizes = tuple(int(s) for s in sys.argv[1:]) or (1_000, 100_000)
+    run_benchmarks(sizes)
@@ -0,0 +1,44 @@
+import random
+import sys
+import time
+from ai_engine.deletion_index import DeletionIndex
+from ai_engine.medicine_index import MedicineIndex
+from testing_helpers import synthetic_catalog, typo
+
+def run_benchmarks(size: int = 100_000):
+    catalog = synthetic_catalog(size)
+    rng = random.Random(7)
+    queries = [typo(rng.choice(catalog).split()[0], rng) for _ in range(500)]
+
+    print(f"Catalog: {len(catalog)} names, {len(queries)} single-word queries")
+    print("-" * 20)
+
+    for max_distance in (1, 2):
+        index = DeletionIndex(catalog, max_distance=max_distance)
+
+        report = index.report()
+        start = time.perf_counter()
+        hits = ambiguous = 0
+        for q in queries:
+            found = index.lookup(q)
+            hits += bool(found)
+            ambiguous += len(found) > 1
+        elapsed = time.perf_counter() - start
+
+        print(f"max_distance={max_distance}")
+        print(f"  Build: {report['build_seconds']}s, delete keys: {report['delete_keys']}, "
+              f"postings: {report['postings']}")
+        print(f"  Memory: ~{report['approx_bytes'] / 1e6:.1f} MB")
+        print(f"  Lookup: {elapsed / len(queries) * 1e6:.1f} us/word, "
+              f"hits {hits}/{len(queries)}, ambiguous {ambiguous}")
+        del index
+
+    index = MedicineIndex(catalog)
+    start = time.perf_counter()
+    for q in queries:
+        index.extract_one(q)
+    elapsed = time.perf_counter() - start
+    print(f"Trigram MedicineIndex.extract_one: {elapsed / len(queries) * 1e6:.1f} us/word")
+
+if __name__ == "__main__":
+    run_benchmarks(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,40 @@
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from ai_engine.deskew import DESKEW_METHODS
+from testing_helpers import a4_scan
+
+def rotated_page(angle: float, scale: float = 1.0) -> np.ndarray:
+    """
+    An A4 scan at 300 DPI (times `scale`) skewed by `angle` degrees, binarized the way
+    preprocess_image does.
+    """
+    page = a4_scan(300 * scale, angle=angle)
+    return cv2.adaptiveThreshold(cv2.medianBlur(page, 3), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, 11, 2)
+
+def run_benchmarks(angles=(-10, -4.5, -1, 0, 2, 6.5, 12), scales=(1.0, 2.0)):
+    for scale in scales:
+        pages = [(angle, rotated_page(angle, scale)) for angle in angles]
+        (h, w) = pages[0][1].shape
+        print(f"{w}x{h} pages, skew {list(angles)}")
+        for name, estimate in DESKEW_METHODS.items():
+            errors, seconds, peaks = [], [], []
+            for angle, page in pages:
+                tracemalloc.start()
+                start = time.perf_counter()
+                correction = estimate(page)
+                seconds.append(time.perf_counter() - start)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+                # The page was rotated by `angle`, so the ideal correction is -angle
+                errors.append(abs(correction + angle))
+            print(f"  {name:<14} mean error {np.mean(errors):6.2f} deg  max {np.max(errors):6.2f} deg  "
+                  f"{np.mean(seconds) * 1000:8.1f} ms  peak {max(peaks) / 2 ** 20:8.1f} MB")
+        print("-" * 20)
+
+if __name__ == "__main__":
+    scales = tuple(float(s) for s in sys.argv[1:]) or (1.0, 2.0)
+    run_benchmarks(scales=scales)
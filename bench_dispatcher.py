@@ -0,0 +1,79 @@
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import MedicineModel, ReminderModel
+from reminder_dispatcher import ReminderDispatcher
+
+START = datetime(2024, 1, 1)
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+def pending_reminders(count: int, per_minute: int = 20):
+    """An in-memory database with `count` pending reminders rows, `per_minute` due each minute."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(MedicineModel), [{"id": 1, "name": "Medicine"}])
+        conn.execute(insert(ReminderModel), [
+            {"medicine_id": 1, "status": "pending", "dosage_str": "1 tab", "instruction": "",
+             "datetime": (START + timedelta(minutes=i // per_minute)).strftime("%Y-%m-%d %H:%M")}
+            for i in range(count)
+        ])
+    return engine, sessionmaker(bind=engine)
+
+def poll_once(engine, now: datetime) -> float:
+    """
+    One tick of the scheduler.js approach: every pending reminder in the last 5 minutes,
+    found through the index on reminders.datetime.
+    """
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        conn.execute(text(
+            "SELECT * FROM reminders WHERE status = 'pending' AND datetime > :lo AND datetime <= :hi"
+        ), {"lo": (now - timedelta(minutes=5)).strftime("%Y-%m-%d %H:%M"), "hi": now.strftime("%Y-%m-%d %H:%M")}).fetchall()
+    return time.perf_counter() - start
+
+def run_benchmarks(counts=(10_000, 100_000, 1_000_000), minutes=120):
+    for count in counts:
+        engine, factory = pending_reminders(count)
+        clock = FakeClock(START - timedelta(seconds=30))
+        fired = []
+
+        async def notifier(reminder):
+            fired.append(reminder["datetime"])
+
+        dispatcher = ReminderDispatcher(factory, notifier, clock=clock)
+
+        async def simulate():
+            # Wake at each deadline the dispatcher asks for, over `minutes` of reminders
+            steps, seconds = 0, 0.0
+            while clock.now < START + timedelta(minutes=minutes):
+                start = time.perf_counter()
+                delay = await dispatcher.step()
+                seconds += time.perf_counter() - start
+                steps += 1
+                clock.now += timedelta(seconds=max(delay, 1))
+            return steps, seconds
+
+        steps, seconds = asyncio.run(simulate())
+        poll = min(poll_once(engine, START + timedelta(minutes=60)) for _ in range(3))
+        print(f"{count:>9} pending: {len(fired)} fired in {minutes} min over {steps} wake-ups, "
+              f"{seconds / steps * 1000:7.3f} ms/wake-up incl. loads ({dispatcher.loads} loads)  |  "
+              f"indexed per-minute poll {poll * 1000:7.3f} ms/tick")
+        engine.dispose()
+
+if __name__ == "__main__":
+    counts = tuple(int(c) for c in sys.argv[1:]) or (10_000, 100_000, 1_000_000)
+    run_benchmarks(counts)
@@ -0,0 +1,73 @@
+import multiprocessing
+import resource
+import shutil
+import sys
+import time
+import cv2
+import numpy as np
+from ai_engine.image_processor import preprocess_image
+from testing_helpers import LINES, a4_scan
+
+def synthetic_page(megapixels: float, seed: int = 5):
+    """
+    Renders an A4 prescription scan at the DPI that gives the requested size, like a
+    phone photo of the page.
+
+    Returns:
+        Tuple[bytes, np.ndarray]: The photo JPEG-encoded in color, and the photo before
+        encoding.
+    """
+    photo = a4_scan(300 * (megapixels * 1e6 / (3508 * 2480)) ** 0.5, seed=seed)
+    encoded = cv2.imencode(".jpg", cv2.cvtColor(photo, cv2.COLOR_GRAY2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])[1]
+    return encoded.tobytes(), photo
+
+def _measure(data: bytes, target, queue) -> None:
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    image = preprocess_image(data, target_text_height=target)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    queue.put((seconds, peak, np.asarray(image)))
+
+def measure(data: bytes, target):
+    # A forked child starts its RSS high-water mark afresh (a spawned one can inherit the
+    # parent's across exec), so its ru_maxrss covers only this call
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(data, target, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+def accuracy(image: np.ndarray, clean: np.ndarray) -> str:
+    """
+    Binarization F-measure against the ink of the unencoded photo (scaled to the output
+    size), plus OCR word recall when Tesseract is installed.
+    """
+    truth = cv2.resize(clean, (image.shape[1], image.shape[0]), interpolation=cv2.INTER_AREA) < 128
+    ink = image == 0
+    hits = np.count_nonzero(ink & truth)
+    precision = hits / max(np.count_nonzero(ink), 1)
+    recall = hits / max(np.count_nonzero(truth), 1)
+    result = f"F {2 * precision * recall / max(precision + recall, 1e-9):.3f}"
+    if shutil.which("tesseract"):
+        import pytesseract
+        words = set(pytesseract.image_to_string(image).split())
+        expected = {w for line in LINES for w in line.split()}
+        result += f"  OCR recall {len(words & expected) / len(expected):.2f}"
+    return result
+
+def run_benchmarks(megapixels=(12, 48)):
+    for mp in megapixels:
+        data, clean = synthetic_page(mp)
+        print(f"{mp} MP photo ({len(data) / 1e6:.1f} MB JPEG)")
+        for label, target in (("full resolution", None), ("normalized", 24)):
+            seconds, peak_kb, image = measure(data, target)
+            print(f"  {label:<16} {seconds * 1000:8.0f} ms  peak +{peak_kb / 1024:7.1f} MB  "
+                  f"output {image.shape[1]}x{image.shape[0]}  {accuracy(image, clean)}")
+        print("-" * 20)
+
+if __name__ == "__main__":
+    sizes = tuple(float(s) for s in sys.argv[1:]) or (12, 48)
+    run_benchmarks(sizes)
@@ -0,0 +1,39 @@
+import sys
+import time
+import tracemalloc
+from itertools import islice
+from scheduler import SCHEDULE_TEMPLATES, generate_reminders, iter_reminders
+from testing_helpers import chronic_care, legacy_generate_reminders
+
+def measure(fn, repeat: int):
+    """Best wall time over `repeat` runs, then the peak traced memory of one more run."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(seconds), peak, result
+
+def run_benchmarks(durations=(1, 30, 365), repeat=5):
+    for days in durations:
+        data = chronic_care(days)
+        print(f"8 medicines x {days} day(s)")
+        runs = {
+            "legacy": lambda: legacy_generate_reminders(data, "2024-01-01"),
+            "iter_reminders (all)": lambda: list(iter_reminders(data, "2024-01-01")),
+            "generate_reminders (cold)": lambda: (SCHEDULE_TEMPLATES.clear(), generate_reminders(data, "2024-01-01"))[1],
+            "generate_reminders (warm)": lambda: generate_reminders(data, "2024-01-01"),
+            "iter_reminders (first 10)": lambda: list(islice(iter_reminders(data, "2024-01-01"), 10)),
+        }
+        for name, fn in runs.items():
+            seconds, peak, result = measure(fn, repeat)
+            print(f"  {name:<26} {seconds * 1000:8.2f} ms  peak {peak / 1024:9.1f} KB  {len(result)} reminders")
+        print("-" * 20)
+
+if __name__ == "__main__":
+    durations = tuple(int(d) for d in sys.argv[1:]) or (1, 30, 365)
+    run_benchmarks(durations)
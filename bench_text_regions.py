@@ -0,0 +1,37 @@
+import shutil
+import time
+import cv2
+import numpy as np
+from ai_engine.image_processor import binarize_and_deskew, crop_text_regions
+from testing_helpers import letterhead_page, oracle_text, recall
+
+def run_benchmarks(pages=6):
+    ocr = None
+    if shutil.which("tesseract"):
+        import pytesseract
+        ocr = pytesseract.image_to_string
+    print(f"{pages} letterhead pages, 2480x3508, OCR: {'tesseract' if ocr else 'layout oracle (no tesseract)'}")
+
+    rows = {"off": [], "on": []}
+    for seed in range(pages):
+        page, lines = letterhead_page(seed)
+        processed = binarize_and_deskew(page)
+        full_box = [(0, 0, processed.width, processed.height)]
+
+        start = time.perf_counter()
+        cropped, boxes = crop_text_regions(processed)
+        crop_seconds = time.perf_counter() - start
+
+        for mode, image, regions, extra in (("off", processed, full_box, 0.0), ("on", cropped, boxes, crop_seconds)):
+            start = time.perf_counter()
+            text = ocr(image) if ocr else oracle_text(lines, regions)
+            seconds = time.perf_counter() - start + extra
+            rows[mode].append((seconds, image.width * image.height / (processed.width * processed.height), recall(text)))
+
+    for mode, results in rows.items():
+        seconds, area, found = np.array(results).T
+        print(f"  regions {mode:<3}  {np.mean(seconds) * 1000:8.1f} ms/page (incl. detection)  "
+              f"OCR area {np.mean(area) * 100:5.1f}%  medicine recall {np.mean(found):.2f}")
+
+if __name__ == "__main__":
+    run_benchmarks()
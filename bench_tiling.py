@@ -0,0 +1,34 @@
+import os
+import sys
+import time
+import cv2
+import numpy as np
+from ai_engine.image_processor import denoise_and_threshold, denoise_and_threshold_tiled
+from testing_helpers import a4_scan
+
+def best_of(fn, repeat=3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def run_benchmarks(dpis=(300, 600), workers=(1, 2, 4, 8)):
+    # Keep OpenCV's own thread pool out of the picture so the scaling shown is the tiling's
+    cv2.setNumThreads(1)
+    print(f"{os.cpu_count()} CPU core(s) available; OpenCV internal threads disabled")
+    for dpi in dpis:
+        gray = a4_scan(dpi)
+        expected = denoise_and_threshold(gray)
+        untiled = best_of(lambda: denoise_and_threshold(gray))
+        print(f"A4 at {dpi} DPI ({gray.shape[1]}x{gray.shape[0]}): untiled {untiled * 1000:7.1f} ms")
+        for count in workers:
+            identical = np.array_equal(denoise_and_threshold_tiled(gray, workers=count), expected)
+            tiled = best_of(lambda: denoise_and_threshold_tiled(gray, workers=count))
+            print(f"  {count} worker(s)  {tiled * 1000:7.1f} ms  speedup {untiled / tiled:4.2f}x  identical {identical}")
+        print("-" * 20)
+
+if __name__ == "__main__":
+    workers = tuple(int(w) for w in sys.argv[1:]) or (1, 2, 4, 8)
+    run_benchmarks(workers=workers)
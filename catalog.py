@@ -0,0 +1,73 @@
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy.orm import Session
+
+from ai_engine import MedicineIndex
+import crud
+
+class MedicineCatalog:
+    """
+    In-process cache of the merged medicine catalog (defaults + names saved in the DB).
+
+    The catalog is read from the database once; after that, new names are added
+    incrementally and each change bumps `version`, so `/parse` never has to re-query
+    or rebuild the catalog and downstream caches can key on the version.
+    """
+
+    def __init__(self, base_names: Iterable[str]):
+        self.index = MedicineIndex(base_names)
+        self.version = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self, db: Session) -> None:
+        """
+        Merges the medicine names stored in the DB into the catalog, once per process.
+        """
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._add_locked(crud.get_all_medicine_names(db))
+            self._loaded = True
+
+    def add(self, names: Iterable[str]) -> int:
+        """
+        Adds names to the catalog, bumping the version if any of them are new.
+
+        Returns:
+            int: The catalog version after the update.
+        """
+        with self._lock:
+            return self._add_locked(names)
+
+    def _add_locked(self, names: Iterable[str]) -> int:
+        added = False
+        for name in names:
+            if name and self.index.add(name):
+                added = True
+        if added:
+            # Pay for the exact-match automaton update here, not in the next /parse
+            self.index.exact.refresh()
+            self.version += 1
+        return self.version
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the catalog version and size, and the exact-match hit rate."""
+        return {
+            "version": self.version,
+            "size": len(self.index),
+            "exact_match": self.index.exact.stats(),
+        }
+
+    @property
+    def names(self) -> List[str]:
+        """Returns the catalog names in insertion order."""
+        return list(self.index.names)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, name: Optional[str]) -> bool:
+        return name in self.index
@@ -1,6 +1,13 @@
+import heapq
+from datetime import datetime, timedelta
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from models import MedicineModel, ReminderModel
-from typing import List, Dict, Any
+from models import MedicineModel, ReminderModel, ScheduleModel, ReminderOverrideModel
+from reminder_schedule import (
+    CANCELLED, DATETIME_FORMAT, LEGACY, PENDING, SCHEDULED, SKIPPED, TAKEN, ReminderKey, compress_reminders,
+    iter_occurrences,
+)
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 
 def create_medicine(db: Session, medicine_data: Dict[str, Any], refill_info: Dict[str, Any]) -> MedicineModel:
     """
@@ -35,6 +42,177 @@ def create_reminders(db: Session, medicine_id: int, reminders_data: List[Dict[st
         db.add(db_rem)
     db.commit()
 
+def create_schedule(db: Session, medicine_id: int, reminders_data: List[Dict[str, Any]]) -> Optional[ScheduleModel]:
+    """
+    Store a medicine's reminders as one schedule row, plus an override for each
+    occurrence the user cancelled or added off the schedule. Reminders that do not fit
+    a schedule are stored as reminder rows instead, and None is returned.
+    """
+    compressed = compress_reminders(reminders_data)
+    if compressed is None:
+        create_reminders(db, medicine_id, reminders_data)
+        return None
+    fields, cancelled, extras = compressed
+    db_schedule = ScheduleModel(medicine_id=medicine_id, **fields)
+    db.add(db_schedule)
+    db.flush()
+    db.add_all(
+        ReminderOverrideModel(schedule_id=db_schedule.id, datetime=dt, status=CANCELLED)
+        for dt in cancelled
+    )
+    db.add_all(
+        ReminderOverrideModel(schedule_id=db_schedule.id, datetime=dt, status=PENDING, extra=True)
+        for dt in extras
+    )
+    db.commit()
+    db.refresh(db_schedule)
+    return db_schedule
+
+def get_reminders(db: Session, window_start: datetime, window_end: datetime,
+                  medicine_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Occurrences of the stored schedules in [window_start, window_end), in chronological
+    order, each with its status ("pending" unless marked taken or skipped).
+    """
+    window = (window_start.strftime(DATETIME_FORMAT), window_end.strftime(DATETIME_FORMAT))
+    # Food offsets can move a dose a day either side of its schedule's dates
+    first_date = (window_start - timedelta(days=1)).date().isoformat()
+    last_date = (window_end + timedelta(days=1)).date().isoformat()
+    # Extra occurrences can lie outside their schedule's dates, so they are found by datetime
+    extra_ids = db.query(ReminderOverrideModel.schedule_id).filter(
+        ReminderOverrideModel.extra.is_(True),
+        ReminderOverrideModel.datetime >= window[0],
+        ReminderOverrideModel.datetime < window[1],
+    )
+    query = db.query(ScheduleModel, MedicineModel.name).join(MedicineModel).filter(or_(
+        (ScheduleModel.start_date <= last_date)
+        & (ScheduleModel.end_date.is_(None) | (ScheduleModel.end_date >= first_date)),
+        ScheduleModel.id.in_(extra_ids),
+    ))
+    if medicine_id is not None:
+        query = query.filter(ScheduleModel.medicine_id == medicine_id)
+    rows = query.all()
+
+    overrides, extras = {}, {}
+    schedule_ids = [schedule.id for schedule, _ in rows]
+    if schedule_ids:
+        for o in db.query(ReminderOverrideModel).filter(
+            ReminderOverrideModel.schedule_id.in_(schedule_ids),
+            ReminderOverrideModel.datetime >= window[0],
+            ReminderOverrideModel.datetime < window[1],
+        ):
+            overrides[(o.schedule_id, o.datetime)] = o.status
+            if o.extra:
+                extras.setdefault(o.schedule_id, []).append(o.datetime)
+
+    schedules = [{
+        "schedule_id": schedule.id,
+        "medicine_id": schedule.medicine_id,
+        "medicine": name,
+        "dosage": schedule.dosage_str,
+        "instruction": schedule.instruction,
+        "start_date": schedule.start_date,
+        "times": schedule.times,
+        "offset_minutes": schedule.offset_minutes,
+        "days": schedule.days,
+        "rrule": schedule.rrule,
+        "extras": extras.get(schedule.id),
+    } for schedule, name in rows]
+    return iter_occurrences(schedules, overrides, window_start, window_end)
+
+def iter_reminder_window(db: Session, window_start: datetime, window_end: datetime, status: Optional[str] = None,
+                         after: Optional[ReminderKey] = None) -> Iterator[Tuple[ReminderKey, Dict[str, Any]]]:
+    """
+    Every reminder in [window_start, window_end) in chronological order: schedule
+    occurrences merged with the reminders rows saved before schedules existed.
+
+    Work is proportional to the window (from `after`, when resuming a page), never to
+    the length of the prescriptions.
+
+    Args:
+        status (str, optional): Only reminders with this status.
+        after (ReminderKey, optional): Resume after the reminder with this key.
+
+    Yields:
+        Tuple[ReminderKey, Dict[str, Any]]: The reminder's key (for cursors) and the reminder.
+    """
+    if after is not None:
+        window_start = max(window_start, datetime.strptime(after[0], DATETIME_FORMAT))
+
+    scheduled = (
+        ((r["datetime"], SCHEDULED, r["schedule_id"]), {**r, "reminder_id": None})
+        for r in get_reminders(db, window_start, window_end)
+    )
+    legacy_rows = db.query(ReminderModel, MedicineModel.name).join(MedicineModel).filter(
+        ReminderModel.datetime >= window_start.strftime(DATETIME_FORMAT),
+        ReminderModel.datetime < window_end.strftime(DATETIME_FORMAT),
+    ).order_by(ReminderModel.datetime, ReminderModel.id).yield_per(500)
+    legacy = (
+        ((rem.datetime, LEGACY, rem.id), {
+            "schedule_id": None,
+            "reminder_id": rem.id,
+            "medicine_id": rem.medicine_id,
+            "medicine": name,
+            "dosage": rem.dosage_str,
+            "instruction": rem.instruction,
+            "datetime": rem.datetime,
+            "status": rem.status,
+        })
+        for rem, name in legacy_rows
+    )
+
+    for key, reminder in heapq.merge(scheduled, legacy, key=lambda item: item[0]):
+        if after is not None and key <= after:
+            continue
+        if status is None or reminder["status"] == status:
+            yield key, reminder
+
+def set_reminder_status(db: Session, schedule_id: int, occurrence: str, status: str) -> ReminderOverrideModel:
+    """
+    Mark one occurrence of a schedule as taken or skipped.
+
+    Raises:
+        ValueError: If the status is not "taken" or "skipped", or the schedule has no
+                    occurrence at that datetime.
+    """
+    if status not in (TAKEN, SKIPPED):
+        raise ValueError(f"Unsupported status '{status}'. Choose from: {TAKEN}, {SKIPPED}")
+    schedule = db.query(ScheduleModel).filter(ScheduleModel.id == schedule_id).first()
+    moment = datetime.strptime(occurrence, "%Y-%m-%d %H:%M")
+    if schedule is None or not any(
+            r["schedule_id"] == schedule_id
+            for r in get_reminders(db, moment, moment + timedelta(minutes=1), medicine_id=schedule.medicine_id)):
+        raise ValueError(f"No reminder of schedule {schedule_id} at {occurrence}")
+
+    db_override = db.query(ReminderOverrideModel).filter(
+        ReminderOverrideModel.schedule_id == schedule_id,
+        ReminderOverrideModel.datetime == occurrence,
+    ).first()
+    if db_override is None:
+        db_override = ReminderOverrideModel(schedule_id=schedule_id, datetime=occurrence)
+        db.add(db_override)
+    db_override.status = status
+    db.commit()
+    db.refresh(db_override)
+    return db_override
+
+def set_stored_reminder_status(db: Session, reminder_id: int, status: str) -> ReminderModel:
+    """
+    Mark a reminder stored as its own row (not part of a schedule) as taken or skipped.
+
+    Raises:
+        ValueError: If the status is not "taken" or "skipped", or there is no such reminder.
+    """
+    if status not in (TAKEN, SKIPPED):
+        raise ValueError(f"Unsupported status '{status}'. Choose from: {TAKEN}, {SKIPPED}")
+    db_rem = db.query(ReminderModel).filter(ReminderModel.id == reminder_id).first()
+    if db_rem is None:
+        raise ValueError(f"No reminder {reminder_id}")
+    db_rem.status = status
+    db.commit()
+    db.refresh(db_rem)
+    return db_rem
+
 def get_medicines(db: Session, skip: int = 0, limit: int = 100):
     """
     Get all medicines.
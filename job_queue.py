@@ -0,0 +1,291 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Job lifecycle: queued -> running -> done | failed
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class JobQueue:
+    """
+    Durable job queue backed by SQLite.
+
+    Jobs and their progress events are rows in a database file, so queued work survives
+    restarts and any process that opens the same file can enqueue, claim or watch jobs.
+    Claiming is a single UPDATE, so two workers never pick the same job.
+    """
+
+    def __init__(self, db_path: str = "./jobs.db"):
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL, kind TEXT NOT NULL, "
+                "payload BLOB NOT NULL, status TEXT NOT NULL, stage TEXT, result TEXT, error TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (status, updated_at)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT NOT NULL, stage TEXT NOT NULL, at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, seq)")
+
+    def recover(self) -> int:
+        """
+        Puts jobs left running by a crashed or stopped worker back in the queue.
+        Call it once at startup, before any worker of this queue is running.
+
+        Returns:
+            int: Number of jobs re-queued.
+        """
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET status = ?, stage = NULL, updated_at = ? WHERE status = ?",
+                (QUEUED, time.time(), RUNNING),
+            ).rowcount
+
+    def enqueue(self, kind: str, payload: bytes) -> str:
+        """
+        Adds a job and returns its ID.
+
+        Args:
+            kind (str): "text" (payload is UTF-8 text) or "image" (payload is an encoded image).
+            payload (bytes): The job input.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, payload, QUEUED, now, now),
+            )
+            self._add_event_locked(job_id, QUEUED, now)
+        return job_id
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Marks the oldest queued job as running and returns it (id, kind, payload), or
+        None if the queue is empty.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE seq = "
+                "(SELECT seq FROM jobs WHERE status = ? ORDER BY seq LIMIT 1) "
+                "RETURNING id, kind, payload",
+                (RUNNING, now, QUEUED),
+            ).fetchone()
+            if row is None:
+                return None
+            self._add_event_locked(row[0], RUNNING, now)
+        return {"id": row[0], "kind": row[1], "payload": row[2]}
+
+    def set_stage(self, job_id: str, stage: str) -> None:
+        """Records that a running job has entered a pipeline stage."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE jobs SET stage = ?, updated_at = ? WHERE id = ?", (stage, now, job_id))
+            self._add_event_locked(job_id, stage, now)
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        self._finish(job_id, DONE, result=json.dumps(result))
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._finish(job_id, FAILED, error=error)
+
+    def _finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        now = time.time()
+        with self._lock:
+            # The input (up to an image's worth of bytes) is not needed once the job has finished
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, payload = x'', updated_at = ? WHERE id = ?",
+                (status, result, error, now, job_id),
+            )
+            self._add_event_locked(job_id, status, now)
+
+    def _add_event_locked(self, job_id: str, stage: str, at: float) -> None:
+        self._db.execute("INSERT INTO job_events (job_id, stage, at) VALUES (?, ?, ?)", (job_id, stage, at))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the job's status, current stage, and result or error; None if unknown."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, status, stage, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "stage": row[3],
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "created_at": row[6],
+            "updated_at": row[7],
+        }
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Returns the job's progress events with a sequence number above `after`, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, stage, at FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after),
+            ).fetchall()
+        return [{"seq": seq, "stage": stage, "at": at} for seq, stage, at in rows]
+
+    def watch(self, job_id: str, poll_interval: float = 0.2, timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yields the job's progress events as they are recorded, ending after "done" or
+        "failed" (or once `timeout` seconds have passed).
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        last = 0
+        while True:
+            for event in self.events(job_id, last):
+                last = event["seq"]
+                yield event
+                if event["stage"] in (DONE, FAILED):
+                    return
+            if deadline and time.monotonic() > deadline:
+                return
+            time.sleep(poll_interval)
+
+    def purge(self, older_than: float, now: Optional[float] = None) -> int:
+        """
+        Deletes jobs that finished more than `older_than` seconds ago, with their events.
+
+        Returns:
+            int: Number of jobs deleted.
+        """
+        cutoff = (time.time() if now is None else now) - older_than
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute(
+                    "DELETE FROM job_events WHERE job_id IN "
+                    "(SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?)",
+                    (DONE, FAILED, cutoff),
+                )
+                deleted = self._db.execute(
+                    "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, cutoff)
+                ).rowcount
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return deleted
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of jobs in each status."""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+JobHandler = Callable[[Dict[str, Any], Callable[[str], None]], Dict[str, Any]]
+
+class JobWorkerPool:
+    """
+    Threads that drain a JobQueue in this process.
+
+    Each worker claims a job, runs the handler with a progress callback that records
+    stages on the job, and stores the result (or the error message). Idle workers wait
+    for `notify()` or poll the queue every `poll_interval` seconds, so jobs enqueued by
+    other processes are picked up too. With a `retention`, idle workers also delete
+    jobs finished longer ago than that, at most once per `purge_interval`.
+    """
+
+    def __init__(self, queue: JobQueue, handler: JobHandler, workers: int = 2, poll_interval: float = 1.0,
+                 retention: Optional[float] = None, purge_interval: float = 300.0):
+        """
+        Args:
+            queue (JobQueue): The queue to drain.
+            handler (Callable): Called as handler(job, progress) and returns the job result.
+                                Exceptions mark the job as failed.
+            workers (int): Number of worker threads.
+            poll_interval (float): Seconds an idle worker waits before checking the queue again.
+            retention (float, optional): Seconds finished jobs are kept. None keeps them forever.
+            purge_interval (float): Seconds between purges of expired jobs.
+        """
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def start(self, recover: bool = True) -> None:
+        """
+        Starts the worker threads (no-op if already running).
+
+        Args:
+            recover (bool): Re-queue jobs left running by a previous run first. Disable it
+                            when other processes are draining the same queue.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping = False
+            if recover:
+                self.queue.recover()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def notify(self) -> None:
+        """Wakes an idle worker after a job was enqueued."""
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def _run(self) -> None:
+        while not self._stopping:
+            job = self.queue.claim()
+            if job is None:
+                self._maybe_purge()
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            try:
+                result = self.handler(job, lambda stage, job_id=job["id"]: self.queue.set_stage(job_id, stage))
+            except Exception as e:
+                self.queue.fail(job["id"], str(e))
+            else:
+                self.queue.complete(job["id"], result)
+
+    def _maybe_purge(self) -> None:
+        if self.retention is None:
+            return
+        with self._purge_lock:
+            now = time.monotonic()
+            if now < self._next_purge:
+                return
+            self._next_purge = now + self.purge_interval
+        self.queue.purge(self.retention)
+
+    def stop(self) -> None:
+        """Stops the workers after their current job."""
+        with self._lock:
+            self._stopping = True
+            with self._wakeup:
+                self._wakeup.notify_all()
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
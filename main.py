@@ -1,19 +1,38 @@
 import os
-from fastapi import FastAPI, HTTPException, Depends, Query
+import json
+import asyncio
+from datetime import date, datetime, timedelta
+from itertools import islice
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
 
 from ai_engine import PrescriptionParser
-from ai_engine.text_processor import MEDICINE_DB as DEFAULT_MEDICINE_DB
-from scheduler import generate_reminders
-from database import engine, get_db, Base
-from models import MedicineModel
+from ai_engine.pipeline import CASCADE_MIN_CONFIDENCE, CASCADE_MIN_CATALOG_HITS
+from ai_engine.ocr_backend import create_ocr_backend
+from ai_engine.ocr_cache import OCRCache, DEFAULT_MAX_DISTANCE
+from ai_engine.text_processor import MEDICINE_DB as DEFAULT_MEDICINE_DB, LINE_CACHE
+from database import engine, get_db, Base, SessionLocal
+from models import MedicineModel, ReminderModel
+from catalog import MedicineCatalog
+from parse_service import parse_text, parse_image, BatchParser
+from upload_reader import read_multipart_file, UploadTooLarge
+from job_queue import JobQueue, JobWorkerPool, DONE, FAILED
+from result_cache import ParseResultCache
+from reminder_schedule import DATETIME_FORMAT, PENDING, SKIPPED, TAKEN, decode_cursor, encode_cursor
+from reminder_dispatcher import ReminderDispatcher
+from scheduler import SCHEDULE_TEMPLATES
 import crud
 
 # Initialize DB tables
 Base.metadata.create_all(bind=engine)
+# create_all skips existing tables, so add indexes introduced since they were created
+for index in ReminderModel.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
 
 app = FastAPI(
     title="Prescription OCR API",
@@ -22,7 +41,99 @@ app = FastAPI(
 )
 
 # Initialize AI Parser
-ai_parser = PrescriptionParser()
+# OCR_BACKEND=pool keeps OCR_POOL_SIZE Tesseract workers alive (falls back to pytesseract
+# if the pooled engine is not installed); each job may run for OCR_TIMEOUT seconds.
+# OCR_CROP_TEXT=1 OCRs only the text bands of each page (no letterhead, logos or stamps).
+ocr_backend = create_ocr_backend(
+    os.getenv("OCR_BACKEND", "pytesseract"),
+    pool_size=int(os.getenv("OCR_POOL_SIZE", 2)),
+    timeout=float(os.getenv("OCR_TIMEOUT", 30)),
+)
+# OCR_CACHE_DB=<file> keeps OCR results of uploaded images, so re-uploads and near-duplicate
+# photos (perceptual hashes at most OCR_CACHE_DISTANCE bits apart) skip OCR.
+ocr_cache = OCRCache(
+    os.getenv("OCR_CACHE_DB"),
+    max_entries=int(os.getenv("OCR_CACHE_ENTRIES", 10000)),
+    max_distance=int(os.getenv("OCR_CACHE_DISTANCE", DEFAULT_MAX_DISTANCE)),
+) if os.getenv("OCR_CACHE_DB") else None
+# PREPROCESS_TILE_WORKERS>1 denoises and binarizes large scans in tiles on that many threads.
+# OCR_CASCADE=1 tries a cheap OCR pass first and runs the full preprocessing only when its mean
+# word confidence is below OCR_CASCADE_MIN_CONFIDENCE or it finds fewer than OCR_CASCADE_MIN_HITS
+# catalog medicines.
+ai_parser = PrescriptionParser(
+    ocr_backend=ocr_backend,
+    crop_text=os.getenv("OCR_CROP_TEXT", "0") == "1",
+    ocr_cache=ocr_cache,
+    tile_workers=int(os.getenv("PREPROCESS_TILE_WORKERS", 1)),
+    cascade=os.getenv("OCR_CASCADE", "0") == "1",
+    min_confidence=float(os.getenv("OCR_CASCADE_MIN_CONFIDENCE", CASCADE_MIN_CONFIDENCE)),
+    min_catalog_hits=int(os.getenv("OCR_CASCADE_MIN_HITS", CASCADE_MIN_CATALOG_HITS)),
+)
+
+# In-memory medicine catalog (defaults + saved medicines), loaded from the DB once
+medicine_catalog = MedicineCatalog(DEFAULT_MEDICINE_DB)
+
+# Memory budget for the per-line match memo shared across requests
+LINE_CACHE.resize(int(os.getenv("LINE_MEMO_BYTES", LINE_CACHE.max_bytes)))
+# Memory budget for the precomputed reminder times of each distinct schedule shape
+SCHEDULE_TEMPLATES.resize(int(os.getenv("SCHEDULE_TEMPLATE_BYTES", SCHEDULE_TEMPLATES.max_bytes)))
+
+# Cache of whole /parse responses for resubmitted texts, optionally persisted to SQLite
+parse_cache = ParseResultCache(
+    max_bytes=int(os.getenv("PARSE_CACHE_BYTES", 32 * 1024 * 1024)),
+    db_path=os.getenv("PARSE_CACHE_DB") or None,
+)
+
+# Largest image accepted by /parse/image
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 20 * 1024 * 1024))
+
+# Process pool for /parse/batch, sized to the host's cores unless overridden
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 100))
+batch_parser = BatchParser(medicine_catalog, max_workers=int(os.getenv("BATCH_WORKERS", 0)) or None)
+
+# Durable queue for asynchronous parse jobs, drained by worker threads in this process
+job_queue = JobQueue(os.getenv("JOBS_DB", "./jobs.db"))
+
+def run_parse_job(job: Dict[str, Any], progress) -> Dict[str, Any]:
+    """Runs one queued /jobs item through the same path as /parse or /parse/image."""
+    if job["kind"] == "image":
+        return parse_image(ai_parser, job["payload"], medicine_catalog.index, progress=progress)
+    return parse_text(ai_parser, job["payload"].decode("utf-8"), medicine_catalog.index, progress=progress)
+
+# Finished jobs (results and progress events) are deleted after JOB_RETENTION_SECONDS
+job_workers = JobWorkerPool(
+    job_queue, run_parse_job,
+    workers=int(os.getenv("JOB_WORKERS", 2)),
+    retention=float(os.getenv("JOB_RETENTION_SECONDS", 24 * 3600)),
+)
+# A /jobs/{id}/events stream ends with a "timeout" event after this many seconds
+JOB_EVENTS_TIMEOUT = float(os.getenv("JOB_EVENTS_TIMEOUT", 300))
+
+@app.on_event("startup")
+def start_job_workers():
+    job_workers.start()
+
+# REMINDER_DISPATCHER=1 fires due reminders from this process (see reminder_dispatcher.py),
+# loading REMINDER_HORIZON_MINUTES of them ahead into memory.
+reminder_dispatcher = ReminderDispatcher(
+    SessionLocal,
+    horizon=timedelta(minutes=int(os.getenv("REMINDER_HORIZON_MINUTES", 60))),
+) if os.getenv("REMINDER_DISPATCHER", "0") == "1" else None
+
+@app.on_event("startup")
+async def start_reminder_dispatcher():
+    if reminder_dispatcher is not None:
+        app.state.reminder_task = asyncio.create_task(reminder_dispatcher.run())
+
+@app.on_event("shutdown")
+def shutdown_batch_pool():
+    batch_parser.shutdown()
+    job_workers.stop()
+    if reminder_dispatcher is not None:
+        reminder_dispatcher.stop()
+    ocr_backend.close()
+    if ocr_cache is not None:
+        ocr_cache.close()
 
 # --- CORS Configuration ---
 # Get allowed origins from environment or default to all for development
@@ -71,12 +182,42 @@ class ParseResponse(BaseModel):
     raw_text: str
     reminders: List[Reminder]
     refill_info: List[RefillInfo]
+    ocr_cache: Optional[Dict[str, Any]] = None
+    ocr_cascade: Optional[Dict[str, Any]] = None
 
 class SaveRequest(BaseModel):
     medicines: List[Medicine]
     reminders: List[Reminder]
     refill_info: List[RefillInfo]
 
+class ReminderStatusRequest(BaseModel):
+    schedule_id: Optional[int] = Field(None, description="Schedule of the occurrence (with datetime)")
+    datetime: Optional[str] = Field(None, description="Occurrence as 'YYYY-MM-DD HH:MM'")
+    reminder_id: Optional[int] = Field(None, description="Reminder stored as its own row, instead of schedule_id")
+    status: str = Field(..., description="taken or skipped")
+
+class BatchParseRequest(BaseModel):
+    texts: List[str] = Field(..., description="Raw prescription texts to parse")
+    
+    @validator('texts')
+    def batch_must_fit(cls, v):
+        if not v:
+            raise ValueError('At least one text is required')
+        if len(v) > BATCH_MAX_ITEMS:
+            raise ValueError(f'At most {BATCH_MAX_ITEMS} texts per batch')
+        for text in v:
+            if len(text) > 10000:
+                raise ValueError('Each text must be at most 10000 characters')
+        return v
+
+class BatchItem(BaseModel):
+    index: int
+    result: Optional[ParseResponse] = None
+    error: Optional[str] = None
+
+class BatchParseResponse(BaseModel):
+    results: List[BatchItem]
+
 class ParseRequest(BaseModel):
     text: str = Field(..., min_length=1, max_length=10000, description="Raw prescription text to parse")
     
@@ -95,44 +236,28 @@ async def health_check():
 def parse_prescription(request: ParseRequest, db: Session = Depends(get_db)):
     """
     Parses raw prescription text using the AI Engine.
-    Fetches known medicines from DB to improve fuzzy matching.
+    Uses the cached catalog of known medicines (defaults + DB) to improve fuzzy matching.
+    Identical resubmissions on the same day are answered from the result cache.
     """
     try:
-        # 1. Get known medicines from DB
-        db_medicines = crud.get_all_medicine_names(db)
-        
-        # 2. Combine with default list (to ensure we have a base knowledge)
-        combined_medicines = list(set(DEFAULT_MEDICINE_DB + db_medicines))
-        
-        # 3. Run AI Pipeline
-        extracted_data = ai_parser.run(raw_text=request.text, medicine_db=combined_medicines)
-        
-        if "error" in extracted_data:
-            raise HTTPException(status_code=400, detail=extracted_data["error"])
-
-        medicines_data = extracted_data.get("medicines", [])
+        # 1-2. Known medicines: defaults merged with the DB, cached in-process
+        medicine_catalog.ensure_loaded(db)
         
-        # 4. Generate Reminders (Scheduler Logic)
-        reminders = generate_reminders(extracted_data)
+        # Reminders start today, so today's date is part of the cache key
+        start_date = date.today().isoformat()
+        cache_key = parse_cache.key(request.text, medicine_catalog.version, start_date)
+        cached = parse_cache.get(cache_key)
+        if cached is not None:
+            cached["raw_text"] = request.text
+            return cached
         
-        # 5. Refill Info is already calculated by AI Engine
-        # But we need to ensure the format matches the API response model
-        refill_info = []
-        for med in medicines_data:
-            refill_info.append({
-                "medicine": med["name"],
-                "total_quantity_needed": med.get("quantity_required", 0),
-                "refill_due_date": med.get("estimated_refill_date", ""),
-                "duration_days": 0,
-                "daily_frequency": 0
-            })
-
-        return {
-            "medicines": medicines_data,
-            "raw_text": extracted_data.get("raw_text", ""),
-            "reminders": reminders,
-            "refill_info": refill_info
-        }
+        # 3-5. Run AI Pipeline, generate reminders and format refill info
+        try:
+            result = parse_text(ai_parser, request.text, medicine_catalog.index, start_date=start_date)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        parse_cache.put(cache_key, result, start_date)
+        return result
     except HTTPException:
         raise
     except Exception as e:
@@ -140,6 +265,124 @@ def parse_prescription(request: ParseRequest, db: Session = Depends(get_db)):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Error processing prescription")
 
+@app.post(
+    "/parse/image",
+    response_model=ParseResponse,
+    openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object", "required": ["file"],
+        "properties": {"file": {"type": "string", "format": "binary"}},
+    }}}}},
+)
+async def parse_prescription_image(request: Request, db: Session = Depends(get_db)):
+    """
+    Parses a prescription photo, or a multi-page PDF/TIFF, uploaded as the multipart field "file".
+    The upload is streamed into memory and decoded there; no temp file is written.
+    """
+    try:
+        image_data = await read_multipart_file(request, "file", max_bytes=IMAGE_MAX_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    await run_in_threadpool(medicine_catalog.ensure_loaded, db)
+    try:
+        return await run_in_threadpool(parse_image, ai_parser, image_data, medicine_catalog.index)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/parse/batch", response_model=BatchParseResponse)
+def parse_prescription_batch(request: BatchParseRequest, db: Session = Depends(get_db)):
+    """
+    Parses many prescription texts in one call across a process pool.
+    Results come back in input order; a failing item carries an "error" instead of a "result".
+    """
+    medicine_catalog.ensure_loaded(db)
+    return {"results": batch_parser.parse_all(request.texts)}
+
+@app.post("/parse/batch/stream")
+def parse_prescription_batch_stream(request: BatchParseRequest, db: Session = Depends(get_db)):
+    """
+    Same as /parse/batch, but streams one NDJSON line per item as soon as it finishes.
+    Lines arrive in completion order; use "index" to match them to the input texts.
+    """
+    medicine_catalog.ensure_loaded(db)
+
+    def ndjson():
+        items = batch_parser.iter_completed(request.texts)
+        try:
+            for item in items:
+                yield json.dumps(item) + "\n"
+        finally:
+            # Also runs when the client disconnects mid-stream
+            items.close()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request, db: Session = Depends(get_db)):
+    """
+    Queues a parse and returns its job ID immediately.
+    Send either JSON {"text": ...} or a multipart form with the image in the field "file".
+    Poll GET /jobs/{id} or follow GET /jobs/{id}/events for progress.
+    """
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        try:
+            payload = bytes(await read_multipart_file(request, "file", max_bytes=IMAGE_MAX_BYTES))
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        kind = "image"
+    else:
+        try:
+            text = ParseRequest(**await request.json()).text
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid job request: {e}")
+        payload, kind = text.encode("utf-8"), "text"
+
+    # SQLite work stays off the event loop
+    await run_in_threadpool(medicine_catalog.ensure_loaded, db)
+    job_id = await run_in_threadpool(job_queue.enqueue, kind, payload)
+    # Workers normally start with the app; make sure they run even without a startup event
+    await run_in_threadpool(job_workers.start)
+    job_workers.notify()
+    return {"id": job_id, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """
+    Reports a job's status (queued, running, done, failed), its current pipeline stage,
+    and the parse result or error once finished.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+def stream_job_events(job_id: str):
+    """
+    Server-Sent Events stream of a job's progress: one "progress" event per stage
+    (queued, running, preprocess, ocr, extraction, refill), then a final "done" event
+    carrying the result or a "failed" event carrying the error. If the job has not
+    finished within JOB_EVENTS_TIMEOUT seconds, the stream ends with a "timeout" event.
+    """
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    def sse():
+        for event in job_queue.watch(job_id, timeout=JOB_EVENTS_TIMEOUT):
+            if event["stage"] in (DONE, FAILED):
+                job = job_queue.get(job_id)
+                data = {"stage": event["stage"], "result": job["result"], "error": job["error"]}
+                yield f"event: {event['stage']}\nid: {event['seq']}\ndata: {json.dumps(data)}\n\n"
+                return
+            yield f"event: progress\nid: {event['seq']}\ndata: {json.dumps({'stage': event['stage']})}\n\n"
+        yield f"event: timeout\ndata: {json.dumps({'timeout': JOB_EVENTS_TIMEOUT})}\n\n"
+
+    return StreamingResponse(sse(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.post("/save")
 async def save_prescription(data: SaveRequest, db: Session = Depends(get_db)):
     """
@@ -169,12 +412,17 @@ async def save_prescription(data: SaveRequest, db: Session = Depends(get_db)):
             # Create Medicine record
             db_med = crud.create_medicine(db, med.dict(), ref_info)
             
-            # Create Reminder records
+            # Store the reminders as one recurring schedule, not one row per dose
             med_reminders = reminders_by_med.get(med.name, [])
-            crud.create_reminders(db, db_med.id, med_reminders)
+            crud.create_schedule(db, db_med.id, med_reminders)
             
             saved_medicines.append(db_med.name)
             
+        # Keep the in-memory catalog in sync without re-reading the table
+        medicine_catalog.add(saved_medicines)
+        if reminder_dispatcher is not None:
+            reminder_dispatcher.wake()
+            
         return {"message": "Prescription saved successfully", "saved_medicines": saved_medicines}
     except HTTPException:
         raise
@@ -183,6 +431,111 @@ async def save_prescription(data: SaveRequest, db: Session = Depends(get_db)):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Error saving prescription")
 
+@app.post("/reminders/status")
+async def set_reminder_status(data: ReminderStatusRequest, db: Session = Depends(get_db)):
+    """
+    Marks a reminder as taken or skipped: an occurrence of a saved schedule
+    (schedule_id and datetime), or a reminder stored as its own row (reminder_id).
+    """
+    try:
+        if data.reminder_id is not None:
+            reminder = crud.set_stored_reminder_status(db, data.reminder_id, data.status)
+            result = {"reminder_id": reminder.id, "datetime": reminder.datetime, "status": reminder.status}
+        elif data.schedule_id is not None and data.datetime:
+            override = crud.set_reminder_status(db, data.schedule_id, data.datetime, data.status)
+            result = {"schedule_id": override.schedule_id, "datetime": override.datetime, "status": override.status}
+        else:
+            raise ValueError("Pass schedule_id and datetime, or reminder_id")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if reminder_dispatcher is not None:
+        reminder_dispatcher.wake()
+    return result
+
+def _parse_window_bound(value: str, name: str) -> datetime:
+    for fmt in (DATETIME_FORMAT, "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise HTTPException(status_code=400, detail=f"'{name}' must be YYYY-MM-DD or YYYY-MM-DD HH:MM")
+
+@app.get("/reminders")
+def list_reminders(
+    window_from: Optional[str] = Query(None, alias="from", description="Window start, YYYY-MM-DD[ HH:MM]; default today"),
+    window_to: Optional[str] = Query(None, alias="to", description="Window end (exclusive); default one day after 'from'"),
+    status: Optional[str] = Query(None, description="pending, taken or skipped"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of reminders to return"),
+    db: Session = Depends(get_db)
+):
+    """
+    Lists the reminders due in [from, to), computed from the saved schedules with
+    their taken/skipped status, in chronological order. Pass `next_cursor` back as
+    `cursor` for the next page; it is null on the last page.
+    """
+    start = _parse_window_bound(window_from, "from") if window_from else datetime.combine(date.today(), datetime.min.time())
+    end = _parse_window_bound(window_to, "to") if window_to else start + timedelta(days=1)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    if status is not None and status not in (PENDING, TAKEN, SKIPPED):
+        raise HTTPException(status_code=400, detail=f"Unsupported status '{status}'. Choose from: {PENDING}, {TAKEN}, {SKIPPED}")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # One extra item tells whether another page follows
+    page = list(islice(crud.iter_reminder_window(db, start, end, status=status, after=after), limit + 1))
+    next_cursor = encode_cursor(page[limit - 1][0]) if len(page) > limit else None
+    return {"reminders": [reminder for _, reminder in page[:limit]], "next_cursor": next_cursor}
+
+@app.get("/reminders/dispatcher/stats")
+async def get_dispatcher_stats():
+    """
+    Reports how many reminders the dispatcher fired, dropped as too late or failed to
+    send, and its high-water mark (REMINDER_DISPATCHER=1).
+    """
+    if reminder_dispatcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **reminder_dispatcher.stats()}
+
+@app.get("/catalog/stats")
+async def get_catalog_stats():
+    """
+    Reports the medicine catalog version and size, how often lines were matched
+    by the exact-name prepass instead of fuzzy scoring, and the per-line memo counters.
+    """
+    stats = medicine_catalog.stats()
+    stats["line_memo"] = LINE_CACHE.stats()
+    return stats
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Reports the /parse result cache hit ratio, size, evictions and expirations, the
+    reminder schedule template counters under "schedule_templates", and the image OCR
+    cache counters under "ocr" when it is enabled.
+    """
+    stats = parse_cache.stats()
+    stats["schedule_templates"] = SCHEDULE_TEMPLATES.stats()
+    if ocr_cache is not None:
+        stats["ocr"] = ocr_cache.stats()
+    return stats
+
+@app.get("/ocr/stats")
+async def get_ocr_stats():
+    """
+    Reports how many images the cheap and the full OCR tier produced (OCR_CASCADE=1),
+    for tuning the cascade thresholds.
+    """
+    return {
+        "cascade": ai_parser.cascade,
+        "min_confidence": ai_parser.min_confidence,
+        "min_catalog_hits": ai_parser.min_catalog_hits,
+        **ai_parser.cascade_stats(),
+    }
+
 @app.get("/medicines")
 async def get_all_medicines(
     skip: int = Query(0, ge=0, description="Number of records to skip"),
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, JSON, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -20,15 +20,67 @@ class MedicineModel(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     reminders = relationship("ReminderModel", back_populates="medicine")
+    schedules = relationship("ScheduleModel", back_populates="medicine")
 
 class ReminderModel(Base):
+    # One row per dose per day, as written by /save before schedules existed
     __tablename__ = "reminders"
 
     id = Column(Integer, primary_key=True, index=True)
     medicine_id = Column(Integer, ForeignKey("medicines.id"))
-    datetime = Column(String) # Storing ISO string
+    datetime = Column(String, index=True) # Storing ISO string
     status = Column(String, default="pending") # pending, taken, skipped
     instruction = Column(String, nullable=True)
     dosage_str = Column(String, nullable=True)
 
     medicine = relationship("MedicineModel", back_populates="reminders")
+
+class ScheduleModel(Base):
+    """
+    When one saved medicine is taken, as a recurrence instead of one row per dose.
+    Occurrences are expanded on demand (see reminder_schedule.py).
+    """
+    __tablename__ = "schedules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    medicine_id = Column(Integer, ForeignKey("medicines.id"), index=True)
+    start_date = Column(String, index=True) # 'YYYY-MM-DD'
+    end_date = Column(String, nullable=True, index=True) # Last occurrence date; NULL if open-ended
+    times = Column(JSON) # Times of day before the food offset, e.g. ["08:00", "21:00"]
+    offset_minutes = Column(Integer, default=0) # Food offset applied to every time
+    days = Column(Integer, nullable=True) # Daily for this many days (when rrule is NULL)
+    rrule = Column(String, nullable=True) # e.g. "FREQ=DAILY;INTERVAL=7;COUNT=4"
+    dosage_str = Column(String, nullable=True)
+    instruction = Column(String, nullable=True)
+
+    medicine = relationship("MedicineModel", back_populates="schedules")
+    overrides = relationship("ReminderOverrideModel", back_populates="schedule")
+
+class ReminderOverrideModel(Base):
+    """
+    One occurrence of a schedule that differs from the recurrence: taken, skipped, or
+    cancelled (dropped from the schedule when it was saved); or an extra occurrence
+    off the recurrence, with its own status (pending until marked).
+    """
+    __tablename__ = "reminder_overrides"
+    __table_args__ = (UniqueConstraint("schedule_id", "datetime"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    schedule_id = Column(Integer, ForeignKey("schedules.id"), index=True)
+    datetime = Column(String, index=True) # 'YYYY-MM-DD HH:MM' of the occurrence
+    status = Column(String) # taken, skipped, cancelled (or pending, for extras)
+    extra = Column(Boolean, default=False) # Occurrence added to the recurrence, not a change to one
+
+    schedule = relationship("ScheduleModel", back_populates="overrides")
+
+class DispatcherStateModel(Base):
+    """
+    High-water mark of a reminder dispatcher: the key of the last reminder it handled
+    (see reminder_dispatcher.py).
+    """
+    __tablename__ = "dispatcher_state"
+
+    name = Column(String, primary_key=True)
+    datetime = Column(String) # 'YYYY-MM-DD HH:MM'
+    source = Column(Integer) # 0 = schedule occurrence, 1 = reminders row
+    ref_id = Column(Integer) # schedule_id or reminder id
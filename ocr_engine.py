@@ -1,7 +1,11 @@
 import re
 import json
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Iterable, Iterator, Optional, Any, Tuple
 from thefuzz import process, fuzz
+from ai_engine.medicine_index import MedicineIndex
+from ai_engine.deletion_index import DeletionIndex
+from ai_engine.lru_cache import LRUCache
+from ai_engine.text_processor import NOISE_REGEX
 
 # --- Mock Medicine Database ---
 MEDICINE_DB: List[str] = [
@@ -12,6 +16,16 @@ MEDICINE_DB: List[str] = [
     "Aspirin", "Clopidogrel", "Rosuvastatin", "Vitamin D3", "Calcium"
 ]
 
+MEDICINE_INDEX = MedicineIndex(MEDICINE_DB)
+WORD_INDEX = DeletionIndex(MEDICINE_DB, max_distance=2)
+
+# --- Match Memos ---
+# Shared across requests and keyed on the catalog version, so repeated lines and
+# words skip fuzzy matching and regex extraction.
+LINE_CACHE = LRUCache(max_bytes=8 * 1024 * 1024)
+WORD_CACHE = LRUCache(max_bytes=2 * 1024 * 1024)
+_NOT_CACHED = object()
+
 # --- Regex Patterns ---
 DOSAGE_PATTERNS: List[str] = [
     r'\b\d+(?:[\.,]\d+)?\s*(?:mg|g|mcg|IU|ml|tsp|tbsp)\b', # Units with decimals: 0.5 mg, 500mcg
@@ -40,10 +54,6 @@ DURATION_PATTERNS: List[str] = [
     r'\b(?:till finish|until finished)\b'
 ]
 
-NOISE_PATTERNS: List[str] = [
-    r'Dr\.', r'Clinic', r'Hospital', r'Ph:', r'Date:', r'Name:', r'Age:', r'Sex:', r'Rx'
-]
-
 def clean_text(text: str) -> str:
     """
     Basic text cleaning: remove extra whitespace.
@@ -55,10 +65,7 @@ def is_noise(line: str) -> bool:
     """
     Check if a line is likely noise (doctor info, headers).
     """
-    for pattern in NOISE_PATTERNS:
-        if re.search(pattern, line, re.IGNORECASE):
-            return True
-    return False
+    return NOISE_REGEX.search(line) is not None
 
 def extract_medicine(line: str, threshold: int = 85) -> Optional[str]:
     """
@@ -66,19 +73,43 @@ def extract_medicine(line: str, threshold: int = 85) -> Optional[str]:
     Returns the best match if score > threshold.
     """
     # 1. Try whole line match
-    best_match, score = process.extractOne(line, MEDICINE_DB, scorer=fuzz.token_set_ratio)
-    if score >= threshold:
-        return best_match
+    result = MEDICINE_INDEX.extract_one(line, scorer=fuzz.token_set_ratio)
+    if result and result[1] >= threshold:
+        return result[0]
     
     # 2. Try splitting by words (for messy lines)
+    # Typos within edit distance 2 resolve through the deletion index; the fuzzy
+    # scorer only breaks ties between equally close names, or handles words the
+    # lookup can't place (e.g. glued tokens like "Metformin500mg").
     words = line.split()
     for word in words:
         if len(word) > 3:
-            match, score = process.extractOne(word, MEDICINE_DB)
-            if score >= 90: # Higher threshold for single words
+            match = match_word(word)
+            if match:
                 return match
     return None
 
+def match_word(word: str) -> Optional[str]:
+    """
+    Matches a single word against the medicine database (memoized).
+    Returns the best match if score >= 90.
+    """
+    key = (MEDICINE_INDEX.uid, MEDICINE_INDEX.version, word)
+    cached = WORD_CACHE.get(key, _NOT_CACHED)
+    if cached is not _NOT_CACHED:
+        return cached
+
+    result = None
+    candidates = WORD_INDEX.lookup(word)
+    if candidates:
+        result = process.extractOne(word, candidates)
+    if not result or result[1] < 90:
+        result = MEDICINE_INDEX.extract_one(word)
+    match = result[0] if result and result[1] >= 90 else None # Higher threshold for single words
+
+    WORD_CACHE.put(key, match)
+    return match
+
 def extract_patterns(text: str, patterns: List[str]) -> List[str]:
     """
     Find all matches for a list of regex patterns in the text.
@@ -100,66 +131,78 @@ def extract_patterns(text: str, patterns: List[str]) -> List[str]:
             
     return list(set(final_matches))
 
-def process_prescription(ocr_text: str) -> Dict[str, Any]:
+def analyze_line(line: str) -> Tuple[Optional[str], Dict[str, List[str]]]:
     """
-    Main function to process raw OCR text and return structured data.
-    Returns a dictionary containing extracted medicines and raw text.
+    Matches the medicine on a line and extracts its details (memoized).
+    Callers must copy the returned lists before modifying them.
     """
-    cleaned_text = clean_text(ocr_text)
-    lines = [l.strip() for l in ocr_text.split('\n') if l.strip()]
-    
-    extracted_data: Dict[str, Any] = {
-        "medicines": [],
-        "raw_text": cleaned_text
+    key = (MEDICINE_INDEX.uid, MEDICINE_INDEX.version, line)
+    cached = LINE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    med_name = extract_medicine(line)
+    details = {
+        "dosage": extract_patterns(line, DOSAGE_PATTERNS),
+        "timing": extract_patterns(line, TIMING_PATTERNS),
+        "duration": extract_patterns(line, DURATION_PATTERNS),
+        "food_instruction": extract_patterns(line, FOOD_PATTERNS),
     }
-    
+
+    LINE_CACHE.put(key, (med_name, details))
+    return med_name, details
+
+def iter_medicines(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Streams medicine blocks from an iterable of OCR text lines.
+
+    Each block (a medicine header plus the detail lines that follow it) is yielded as
+    soon as the next header closes it, so memory stays constant in the length of the
+    input. A medicine mentioned in several places yields one block per mention;
+    `process_prescription` merges them.
+    """
     current_med: Optional[Dict[str, Any]] = None
-    
+
     for line in lines:
-        if is_noise(line):
+        line = line.strip()
+        if not line or is_noise(line):
             continue
-            
-        med_name = extract_medicine(line)
-        
+
+        med_name, details = analyze_line(line)
+
         if med_name:
-            # Save previous med
+            # The previous med is complete
             if current_med:
-                extracted_data["medicines"].append(current_med)
-            
+                yield current_med
+
+            # Look for details in the same line
             current_med = {
                 "name": med_name,
-                "dosage": [],
-                "timing": [],
-                "duration": [],
-                "food_instruction": []
+                "dosage": list(details["dosage"]),
+                "timing": list(details["timing"]),
+                "duration": list(details["duration"]),
+                "food_instruction": list(details["food_instruction"])
             }
-            
-            # Look for details in the same line
-            current_med["dosage"] = extract_patterns(line, DOSAGE_PATTERNS)
-            current_med["timing"] = extract_patterns(line, TIMING_PATTERNS)
-            current_med["duration"] = extract_patterns(line, DURATION_PATTERNS)
-            current_med["food_instruction"] = extract_patterns(line, FOOD_PATTERNS)
-            
+
         elif current_med:
             # Look for details in subsequent lines
-            dosages = extract_patterns(line, DOSAGE_PATTERNS)
-            timings = extract_patterns(line, TIMING_PATTERNS)
-            durations = extract_patterns(line, DURATION_PATTERNS)
-            foods = extract_patterns(line, FOOD_PATTERNS)
-            
-            if dosages or timings or durations or foods:
-                current_med["dosage"].extend(dosages)
-                current_med["timing"].extend(timings)
-                current_med["duration"].extend(durations)
-                current_med["food_instruction"].extend(foods)
-    
-    # Append the last one
+            current_med["dosage"].extend(details["dosage"])
+            current_med["timing"].extend(details["timing"])
+            current_med["duration"].extend(details["duration"])
+            current_med["food_instruction"].extend(details["food_instruction"])
+
+    # Emit the last one
     if current_med:
-        extracted_data["medicines"].append(current_med)
-        
+        yield current_med
+
+def process_prescription(ocr_text: str) -> Dict[str, Any]:
+    """
+    Main function to process raw OCR text and return structured data.
+    Returns a dictionary containing extracted medicines and raw text.
+    """
     # Deduplication and Cleanup
     unique_meds: Dict[str, Dict[str, Any]] = {}
-    for med in extracted_data["medicines"]:
+    for med in iter_medicines(ocr_text.split('\n')):
         name = med["name"]
         if name not in unique_meds:
             unique_meds[name] = med
@@ -179,6 +222,7 @@ def process_prescription(ocr_text: str) -> Dict[str, Any]:
         med["food_instruction"] = list(set(med["food_instruction"]))
         final_list.append(med)
 
-    extracted_data["medicines"] = final_list
-
-    return extracted_data
+    return {
+        "medicines": final_list,
+        "raw_text": clean_text(ocr_text)
+    }
@@ -0,0 +1,204 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Callable, List, Dict, Any, Iterator, Optional, Tuple, Union
+
+from ai_engine import PrescriptionParser, MedicineIndex
+from ai_engine.image_processor import ImageSource
+from scheduler import generate_reminders
+
+def parse_text(parser: PrescriptionParser, text: str, medicine_db: Optional[Union[List[str], MedicineIndex]] = None,
+               start_date: Optional[str] = None, progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Runs the AI pipeline and scheduler on one prescription text and shapes the
+    result like the /parse response.
+
+    start_date: 'YYYY-MM-DD' of the first reminder day, defaults to today.
+    progress: Called with each pipeline stage name as it starts (see PrescriptionParser.run).
+
+    Raises:
+        ValueError: If the AI pipeline reports an error.
+    """
+    extracted_data = parser.run(raw_text=text, medicine_db=medicine_db, progress=progress)
+    return _build_response(extracted_data, start_date)
+
+def parse_image(parser: PrescriptionParser, image_data: ImageSource, medicine_db: Optional[Union[List[str], MedicineIndex]] = None,
+                start_date: Optional[str] = None, progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Same as `parse_text`, for an encoded image held in memory (OCR runs first).
+
+    Raises:
+        ValueError: If the image cannot be decoded or the AI pipeline reports an error.
+    """
+    extracted_data = parser.run(image_data=image_data, medicine_db=medicine_db, progress=progress)
+    return _build_response(extracted_data, start_date)
+
+def _build_response(extracted_data: Dict[str, Any], start_date: Optional[str]) -> Dict[str, Any]:
+    if "error" in extracted_data:
+        raise ValueError(extracted_data["error"])
+
+    medicines_data = extracted_data.get("medicines", [])
+
+    # Generate Reminders (Scheduler Logic)
+    reminders = generate_reminders(extracted_data, start_date)
+
+    # Refill Info is already calculated by AI Engine
+    # But we need to ensure the format matches the API response model
+    refill_info = []
+    for med in medicines_data:
+        refill_info.append({
+            "medicine": med["name"],
+            "total_quantity_needed": med.get("quantity_required", 0),
+            "refill_due_date": med.get("estimated_refill_date", ""),
+            "duration_days": 0,
+            "daily_frequency": 0
+        })
+
+    response = {
+        "medicines": medicines_data,
+        "raw_text": extracted_data.get("raw_text", ""),
+        "reminders": reminders,
+        "refill_info": refill_info
+    }
+    for key in ("ocr_cache", "ocr_cascade"):
+        if key in extracted_data:
+            response[key] = extracted_data[key]
+    return response
+
+# --- Worker process state ---
+# Each pool worker builds the catalog index once, in its initializer, and reuses it
+# for every item it is handed.
+_worker_parser: Optional[PrescriptionParser] = None
+_worker_index: Optional[MedicineIndex] = None
+
+def _init_worker(medicine_names: List[str]) -> None:
+    global _worker_parser, _worker_index
+    _worker_parser = PrescriptionParser()
+    _worker_index = MedicineIndex(medicine_names)
+
+def _parse_item(index: int, text: str) -> Dict[str, Any]:
+    """Parses one batch item inside a worker, turning failures into a per-item error."""
+    try:
+        if not text or not text.strip():
+            raise ValueError("Text cannot be empty")
+        return {"index": index, "result": parse_text(_worker_parser, text.strip(), _worker_index)}
+    except Exception as e:
+        return {"index": index, "error": str(e)}
+
+class BatchParser:
+    """
+    Fans prescription parsing out over a process pool.
+
+    The pool is created lazily and is tied to a catalog version: workers receive the
+    catalog names once, when they start, and the pool is replaced only when the
+    catalog has changed since it was created. Batches lease the pool they start on,
+    so a replaced pool is shut down only once its last batch has finished.
+    """
+
+    def __init__(self, catalog, max_workers: Optional[int] = None):
+        """
+        Args:
+            catalog (MedicineCatalog): The in-process medicine catalog.
+            max_workers (int, optional): Pool size. Defaults to the host's CPU count.
+        """
+        self.catalog = catalog
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_version: Optional[int] = None
+        # Batches running on each pool, current or replaced
+        self._leases: Dict[ProcessPoolExecutor, int] = {}
+        self._lock = threading.Lock()
+
+    def _retire_locked(self, pool: ProcessPoolExecutor) -> None:
+        if self._pool is pool:
+            self._pool = None
+            self._pool_version = None
+        if not self._leases.get(pool):
+            self._leases.pop(pool, None)
+            pool.shutdown(wait=False)
+
+    @contextmanager
+    def _lease(self) -> Iterator[ProcessPoolExecutor]:
+        with self._lock:
+            if self._pool is not None and self._pool_version != self.catalog.version:
+                self._retire_locked(self._pool)
+            if self._pool is None:
+                self._pool_version = self.catalog.version
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.catalog.names,),
+                )
+            pool = self._pool
+            self._leases[pool] = self._leases.get(pool, 0) + 1
+        try:
+            yield pool
+        finally:
+            with self._lock:
+                self._leases[pool] -= 1
+                if pool is not self._pool:
+                    self._retire_locked(pool)
+
+    def _submit_all(self, pool: ProcessPoolExecutor, texts: List[str]) -> List[Tuple[int, Future]]:
+        futures = []
+        for i, text in enumerate(texts):
+            try:
+                future = pool.submit(_parse_item, i, text)
+            except (BrokenProcessPool, RuntimeError) as e:
+                future = Future()
+                future.set_exception(e)
+            futures.append((i, future))
+        return futures
+
+    def _item_result(self, pool: ProcessPoolExecutor, index: int, future: Future) -> Dict[str, Any]:
+        """The item's result, or a per-item error if the pool failed to run it."""
+        try:
+            return future.result()
+        except (BrokenProcessPool, RuntimeError, CancelledError) as e:
+            if isinstance(e, BrokenProcessPool):
+                # Start the next batch on a fresh pool; this one is shut down once released
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = None
+                        self._pool_version = None
+            return {"index": index, "error": f"Worker pool failed: {e or type(e).__name__}"}
+
+    def parse_all(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Parses every text and returns the results in input order.
+
+        Returns:
+            List[Dict[str, Any]]: One entry per text, either {"index", "result"} or
+                                  {"index", "error"}.
+        """
+        with self._lease() as pool:
+            return [self._item_result(pool, i, future) for i, future in self._submit_all(pool, texts)]
+
+    def iter_completed(self, texts: List[str]) -> Iterator[Dict[str, Any]]:
+        """
+        Parses every text, yielding each result as soon as it is ready (not in input
+        order; use the "index" field to match results to inputs). Closing the generator
+        early (e.g. when a streaming client disconnects) cancels the items not yet
+        started and releases the pool.
+        """
+        with self._lease() as pool:
+            futures = {future: i for i, future in self._submit_all(pool, texts)}
+            try:
+                for future in as_completed(futures):
+                    yield self._item_result(pool, futures[future], future)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pools = set(self._leases) | ({self._pool} if self._pool is not None else set())
+            self._pool = None
+            self._pool_version = None
+            self._leases.clear()
+        for pool in pools:
+            pool.shutdown(wait=True)
@@ -0,0 +1,210 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import crud
+from models import DispatcherStateModel
+from reminder_schedule import DATETIME_FORMAT, PENDING, ReminderKey
+
+logger = logging.getLogger(__name__)
+
+Notifier = Callable[[Dict[str, Any]], Awaitable[None]]
+
+async def log_notifier(reminder: Dict[str, Any]) -> None:
+    """Default notifier: logs the reminder, like scheduler.js."""
+    logger.info("It's time to take your %s (%s) at %s",
+                reminder["medicine"], reminder["dosage"], reminder["datetime"])
+
+class ReminderDispatcher:
+    """
+    Fires each pending reminder once, when it comes due.
+
+    Nothing is polled. The reminders due within the next `horizon` (at most
+    `batch_size` of them) are loaded into a min-heap, and the dispatcher sleeps until
+    the earliest one. It costs one window query per horizon and O(log n) per reminder
+    fired, however many reminders are pending in total.
+
+    Progress is kept as a high-water mark: the key (datetime, source, id) of the last
+    reminder handled, saved in dispatcher_state every `persist_every` reminders and
+    after each burst of due reminders. A restart resumes right after it, with no rescan.
+    Reminders that came due while the dispatcher was down fire late, or are dropped once
+    they are older than `max_lateness`. Only reminders handled after the last save can
+    fire twice, if the process dies before it saves.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], notifier: Notifier = log_notifier,
+                 name: str = "default", horizon: timedelta = timedelta(hours=1), batch_size: int = 10000,
+                 max_lateness: timedelta = timedelta(hours=1), persist_every: int = 100,
+                 clock: Callable[[], datetime] = datetime.now):
+        """
+        Args:
+            session_factory (Callable[[], Session]): Opens a database session (e.g. SessionLocal).
+            notifier (Notifier): Coroutine called with each due reminder.
+            name (str): Key of this dispatcher's high-water mark.
+            horizon (timedelta): How far ahead reminders are loaded into memory.
+            batch_size (int): Most reminders held in memory at once.
+            max_lateness (timedelta): Overdue reminders older than this are dropped, not sent.
+            persist_every (int): Save the high-water mark at least this often during a burst.
+            clock (Callable[[], datetime]): Source of the current local time.
+        """
+        self._session_factory = session_factory
+        self._notifier = notifier
+        self.name = name
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.max_lateness = max_lateness
+        self.persist_every = persist_every
+        self._clock = clock
+
+        self._heap: List[Tuple[ReminderKey, Dict[str, Any]]] = []
+        self._high_water: Optional[ReminderKey] = None
+        self._origin: Optional[datetime] = None
+        # Every pending reminder before _loaded_until (and up to _loaded_key) is in the heap or handled
+        self._loaded_key: Optional[ReminderKey] = None
+        self._loaded_until: Optional[datetime] = None
+        self._stale = False
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake_event: Optional[asyncio.Event] = None
+        self._stopping = False
+
+        self.fired = 0
+        self.expired = 0
+        self.failed = 0
+        self.loads = 0
+
+    def _load_state(self) -> None:
+        db = self._session_factory()
+        try:
+            state = db.get(DispatcherStateModel, self.name)
+        finally:
+            db.close()
+        if state is not None:
+            self._high_water = (state.datetime, state.source, state.ref_id)
+        self._origin = self._clock().replace(second=0, microsecond=0)
+
+    def _save_state(self) -> None:
+        if self._high_water is None:
+            return
+        dt, source, ref_id = self._high_water
+        db = self._session_factory()
+        try:
+            db.merge(DispatcherStateModel(name=self.name, datetime=dt, source=source, ref_id=ref_id))
+            db.commit()
+        finally:
+            db.close()
+
+    def _refill(self, now: datetime) -> None:
+        if self._origin is None:
+            self._load_state()
+        if self._stale:
+            # Reminders were added or changed: reload everything after the high-water mark
+            self._heap, self._loaded_key, self._loaded_until, self._stale = [], None, None, False
+
+        after = self._loaded_key or self._high_water
+        if self._loaded_until is not None:
+            start = self._loaded_until
+        elif after is not None:
+            start = datetime.strptime(after[0], DATETIME_FORMAT)
+        else:
+            start = self._origin
+        end = max(now, start) + self.horizon
+
+        db = self._session_factory()
+        try:
+            items = list(islice(crud.iter_reminder_window(db, start, end, status=PENDING, after=after), self.batch_size))
+        finally:
+            db.close()
+        self.loads += 1
+        for item in items:
+            heapq.heappush(self._heap, item)
+
+        if len(items) == self.batch_size:
+            # More reminders may share the last one's minute; resume after its key
+            self._loaded_key = items[-1][0]
+            self._loaded_until = datetime.strptime(items[-1][0][0], DATETIME_FORMAT)
+        else:
+            self._loaded_key = items[-1][0] if items else after
+            self._loaded_until = end
+
+    async def step(self) -> float:
+        """
+        Loads more reminders if the loaded horizon has run out, fires every reminder due
+        by now, and returns the seconds until the next one is due (or the next load).
+        """
+        now = self._clock()
+        if self._stale or self._loaded_until is None or now >= self._loaded_until:
+            await asyncio.to_thread(self._refill, now)
+
+        due = now.strftime(DATETIME_FORMAT)
+        unsaved = 0
+        while self._heap and self._heap[0][0][0] <= due:
+            key, reminder = heapq.heappop(self._heap)
+            if now - datetime.strptime(key[0], DATETIME_FORMAT) > self.max_lateness:
+                self.expired += 1
+            else:
+                try:
+                    await self._notifier(reminder)
+                    self.fired += 1
+                except Exception:
+                    logger.exception("Notifier failed for reminder %s", key)
+                    self.failed += 1
+            self._high_water = key
+            unsaved += 1
+            if unsaved >= self.persist_every:
+                await asyncio.to_thread(self._save_state)
+                unsaved = 0
+        if unsaved:
+            await asyncio.to_thread(self._save_state)
+
+        deadline = self._loaded_until
+        if self._heap:
+            deadline = min(deadline, datetime.strptime(self._heap[0][0][0], DATETIME_FORMAT))
+        return max(0.0, (deadline - self._clock()).total_seconds())
+
+    async def run(self) -> None:
+        """Dispatches reminders until `stop` is called. Run it as a task on the app's event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._wake_event = asyncio.Event()
+        self._stopping = False
+        while not self._stopping:
+            try:
+                delay = await self.step()
+            except Exception:
+                logger.exception("Reminder dispatch failed; retrying in 60s")
+                delay = 60.0
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake_event.clear()
+
+    def wake(self) -> None:
+        """
+        Tells the dispatcher that reminders were added or changed, so it reloads the
+        current horizon. Safe to call from any thread.
+        """
+        self._stale = True
+        if self._loop is not None and self._wake_event is not None:
+            self._loop.call_soon_threadsafe(self._wake_event.set)
+
+    def stop(self) -> None:
+        self._stopping = True
+        if self._loop is not None and self._wake_event is not None:
+            self._loop.call_soon_threadsafe(self._wake_event.set)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns fired/expired/failed counts, the loaded heap size and the high-water mark."""
+        return {
+            "fired": self.fired,
+            "expired": self.expired,
+            "failed": self.failed,
+            "loads": self.loads,
+            "loaded": len(self._heap),
+            "high_water": self._high_water[0] if self._high_water else None,
+        }
@@ -0,0 +1,242 @@
+import base64
+import heapq
+from datetime import date, datetime, timedelta
+from functools import reduce
+from math import gcd
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from scheduler import food_offset_minutes
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+
+# Override statuses; occurrences without an override are pending
+TAKEN, SKIPPED, CANCELLED = "taken", "skipped", "cancelled"
+PENDING = "pending"
+
+_FREQ_DAYS = {"DAILY": 1, "WEEKLY": 7}
+
+# A schedule is stored only if its cancelled and extra occurrences number at most this
+# fraction of the reminders it replaces; otherwise the reminders are stored as rows
+MAX_OVERRIDE_RATIO = 0.5
+
+# Position of a reminder in a window listing: (datetime, source, id), where source is
+# SCHEDULED for schedule occurrences (id = schedule_id) and LEGACY for reminders rows
+SCHEDULED, LEGACY = 0, 1
+ReminderKey = Tuple[str, int, int]
+
+def encode_cursor(key: ReminderKey) -> str:
+    """Opaque pagination cursor for the reminder after which the next page starts."""
+    return base64.urlsafe_b64encode("|".join(map(str, key)).encode()).decode()
+
+def decode_cursor(cursor: str) -> ReminderKey:
+    """
+    Raises:
+        ValueError: If the cursor was not produced by `encode_cursor`.
+    """
+    try:
+        dt, source, ident = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        datetime.strptime(dt, DATETIME_FORMAT)
+        return dt, int(source), int(ident)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def parse_rrule(rule: str) -> Dict[str, Any]:
+    """
+    Parses the supported subset of an RFC 5545 RRULE: FREQ=DAILY|WEEKLY with optional
+    INTERVAL, COUNT and UNTIL (YYYYMMDD).
+
+    Returns:
+        Dict[str, Any]: "step" (days between occurrence dates), "count" and "until"
+                        (None when absent).
+
+    Raises:
+        ValueError: If the rule is malformed or uses unsupported parts.
+    """
+    parts = {}
+    for part in rule.upper().removeprefix("RRULE:").split(";"):
+        if not part:
+            continue
+        key, sep, value = part.partition("=")
+        if not sep:
+            raise ValueError(f"Malformed RRULE part '{part}'")
+        parts[key] = value
+
+    unsupported = set(parts) - {"FREQ", "INTERVAL", "COUNT", "UNTIL"}
+    if unsupported:
+        raise ValueError(f"Unsupported RRULE parts: {', '.join(sorted(unsupported))}")
+    if parts.get("FREQ") not in _FREQ_DAYS:
+        raise ValueError(f"Unsupported RRULE FREQ '{parts.get('FREQ')}'. Choose from: DAILY, WEEKLY")
+
+    interval = int(parts.get("INTERVAL", 1))
+    if interval < 1:
+        raise ValueError("RRULE INTERVAL must be positive")
+    until = datetime.strptime(parts["UNTIL"][:8], "%Y%m%d").date() if "UNTIL" in parts else None
+    return {
+        "step": _FREQ_DAYS[parts["FREQ"]] * interval,
+        "count": int(parts["COUNT"]) if "COUNT" in parts else None,
+        "until": until,
+    }
+
+def _recurrence(start: date, days: Optional[int], rrule: Optional[str]) -> Tuple[int, Optional[int]]:
+    """Returns (days between occurrence dates, number of dates or None if open-ended)."""
+    if not rrule:
+        return 1, days
+    rule = parse_rrule(rrule)
+    count = rule["count"]
+    if rule["until"] is not None:
+        until_count = max(0, (rule["until"] - start).days // rule["step"] + 1)
+        count = until_count if count is None else min(count, until_count)
+    return rule["step"], count
+
+def last_date(start_date: str, days: Optional[int], rrule: Optional[str]) -> Optional[str]:
+    """Date of the last occurrence ('YYYY-MM-DD'), or None for an open-ended schedule."""
+    start = date.fromisoformat(start_date)
+    step, count = _recurrence(start, days, rrule)
+    if count is None:
+        return None
+    return (start + timedelta(days=step * max(count - 1, 0))).isoformat()
+
+def _grid_moments(schedule: Dict[str, Any], window_start: datetime, window_end: datetime) -> Iterator[datetime]:
+    start = date.fromisoformat(schedule["start_date"])
+    step, count = _recurrence(start, schedule.get("days"), schedule.get("rrule"))
+    offsets = sorted(
+        timedelta(hours=int(t[:2]), minutes=int(t[3:5]) + (schedule.get("offset_minutes") or 0))
+        for t in schedule["times"]
+    )
+    if not offsets or count == 0:
+        return
+
+    # Offsets can move a dose across midnight, so look one day either side of the window
+    lo = (window_start.date() - timedelta(days=1) - start).days
+    hi = (window_end.date() + timedelta(days=1) - start).days
+    first = max(0, -(-lo // step))
+    last = hi // step if count is None else min(count - 1, hi // step)
+
+    midnight = datetime.combine(start, datetime.min.time())
+    for index in range(first, last + 1):
+        day = midnight + timedelta(days=index * step)
+        for offset in offsets:
+            moment = day + offset
+            if window_start <= moment < window_end:
+                yield moment
+
+def expand_schedule(schedule: Dict[str, Any], window_start: datetime, window_end: datetime) -> Iterator[Tuple[datetime, Dict[str, Any]]]:
+    """
+    Yields (datetime, occurrence) for the occurrences of one schedule in
+    [window_start, window_end), in chronological order.
+
+    Only the dates that can fall in the window are visited: the first one is found
+    arithmetically, so the cost is proportional to the window, not to how far into the
+    schedule it lies.
+
+    Args:
+        schedule (Dict[str, Any]): "start_date", "times", "offset_minutes", "days", "rrule",
+                                   optionally "extras" (off-grid 'YYYY-MM-DD HH:MM' occurrences),
+                                   plus any fields to copy onto each occurrence ("schedule_id",
+                                   "medicine", "dosage", "instruction", ...).
+        window_start (datetime): Inclusive lower bound.
+        window_end (datetime): Exclusive upper bound.
+    """
+    extras = sorted(
+        moment for moment in (datetime.strptime(dt, DATETIME_FORMAT) for dt in schedule.get("extras") or ())
+        if window_start <= moment < window_end
+    )
+    fields = {k: v for k, v in schedule.items()
+              if k not in ("start_date", "times", "offset_minutes", "days", "rrule", "extras")}
+    for moment in heapq.merge(_grid_moments(schedule, window_start, window_end), extras):
+        yield moment, {**fields, "datetime": moment.strftime(DATETIME_FORMAT)}
+
+def iter_occurrences(schedules: Iterable[Dict[str, Any]], overrides: Dict[Tuple[int, str], str],
+                     window_start: datetime, window_end: datetime,
+                     include_cancelled: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Merges the occurrences of many schedules in the window into one chronological
+    stream, each with its status: the override if there is one, "pending" otherwise.
+
+    Args:
+        schedules (Iterable[Dict[str, Any]]): Schedules as accepted by `expand_schedule`,
+                                              each with a "schedule_id".
+        overrides (Dict[Tuple[int, str], str]): Status by (schedule_id, 'YYYY-MM-DD HH:MM').
+        include_cancelled (bool): Also yield occurrences dropped from their schedule.
+    """
+    streams = [expand_schedule(schedule, window_start, window_end) for schedule in schedules]
+    for _, occurrence in heapq.merge(*streams, key=lambda item: (item[0], item[1]["schedule_id"])):
+        status = overrides.get((occurrence["schedule_id"], occurrence["datetime"]), PENDING)
+        if status == CANCELLED and not include_cancelled:
+            continue
+        occurrence["status"] = status
+        yield occurrence
+
+def compress_reminders(reminders: List[Dict[str, Any]]) -> Optional[Tuple[Dict[str, Any], List[str], List[str]]]:
+    """
+    Turns one medicine's expanded reminders (as produced by `generate_reminders` and
+    confirmed by the user) into a schedule record.
+
+    The times of day the reminders mostly use (those on more than half as many dates as
+    the most common one) are fitted to the smallest daily grid that covers their dates:
+    every day, or every N days (as an RRULE) when all dates are N days apart. The times
+    are stored before the food offset that the instruction implies. Grid occurrences the
+    user removed are returned as "cancelled" datetimes and submitted reminders off the
+    grid as "extra" ones, so the schedule reproduces the submitted reminders exactly.
+
+    A schedule only pays off while those exceptions are few: if they exceed
+    MAX_OVERRIDE_RATIO of the reminders, None is returned and the reminders should be
+    stored as they are. The same goes for reminders a schedule cannot represent: ones
+    that differ in dosage or instruction, or two doses at the same minute.
+
+    Returns:
+        Optional[Tuple[Dict[str, Any], List[str], List[str]]]: The schedule fields
+        ("start_date", "end_date", "times", "offset_minutes", "days", "rrule",
+        "dosage_str", "instruction"), the cancelled and the extra datetimes; None if
+        there are no reminders or they do not fit a schedule.
+    """
+    if not reminders:
+        return None
+    # A schedule has one dosage and instruction, and one occurrence per datetime
+    dosage, instruction = reminders[0].get("dosage"), reminders[0].get("instruction") or ""
+    if any(r.get("dosage") != dosage or (r.get("instruction") or "") != instruction for r in reminders):
+        return None
+    moments = sorted({datetime.strptime(r["datetime"], DATETIME_FORMAT) for r in reminders})
+    if len(moments) != len(reminders):
+        return None
+    offset = food_offset_minutes(instruction)
+
+    # Undo the food offset; a dose the offset pushed past midnight belongs to the day before
+    bases = [moment - timedelta(minutes=offset) for moment in moments]
+    dates_by_time: Dict[str, Set[date]] = {}
+    for base in bases:
+        dates_by_time.setdefault(f"{base.hour:02d}:{base.minute:02d}", set()).add(base.date())
+    most = max(len(dates) for dates in dates_by_time.values())
+    base_times = sorted(t for t, dates in dates_by_time.items() if 2 * len(dates) > most)
+
+    dates = sorted(set().union(*(dates_by_time[t] for t in base_times)))
+    start = dates[0]
+    step = reduce(gcd, ((d - start).days for d in dates[1:]), 0) or 1
+    count = (dates[-1] - start).days // step + 1
+    days, rrule = (count, None) if step == 1 else (None, f"FREQ=DAILY;INTERVAL={step};COUNT={count}")
+
+    # Each exception is a row to write; give up before they outnumber what they replace
+    budget = int(len(moments) * MAX_OVERRIDE_RATIO)
+    if count * len(base_times) > len(moments) + budget:
+        return None
+
+    fields = {
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=step * (count - 1))).isoformat(),
+        "times": base_times,
+        "offset_minutes": offset,
+        "days": days,
+        "rrule": rrule,
+        "dosage_str": dosage,
+        "instruction": instruction,
+    }
+
+    submitted = {m.strftime(DATETIME_FORMAT) for m in moments}
+    window_start = datetime.combine(start, datetime.min.time()) - timedelta(days=1)
+    window_end = datetime.combine(dates[-1], datetime.min.time()) + timedelta(days=2)
+    grid = {m.strftime(DATETIME_FORMAT) for m in _grid_moments(fields, window_start, window_end)}
+    cancelled = sorted(grid - submitted)
+    extras = sorted(submitted - grid)
+    if len(cancelled) + len(extras) > budget:
+        return None
+    return fields, cancelled, extras
@@ -0,0 +1,160 @@
+import json
+import hashlib
+import sqlite3
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from ai_engine.lru_cache import LRUCache
+
+class ParseResultCache:
+    """
+    Content-addressed cache of /parse responses.
+
+    Entries are keyed by a hash of the normalized text, the catalog version and the
+    reminder start date, so a resubmitted prescription skips the pipeline and the
+    scheduler entirely. Because reminders depend on the start date, every entry expires
+    at the end of that day. Entries live in a byte-bounded LRU and, optionally, in an
+    SQLite file so the cache survives restarts.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, db_path: Optional[str] = None,
+                 max_disk_entries: int = 10000, clock: Callable[[], datetime] = datetime.now):
+        """
+        Args:
+            max_bytes (int): Memory budget for cached responses. 0 disables the memory tier.
+            db_path (str, optional): SQLite file backing the cache. Memory-only if omitted.
+            max_disk_entries (int): Least recently used rows beyond this are deleted.
+            clock (Callable[[], datetime]): Source of the current local time.
+        """
+        self._memory = LRUCache(max_bytes=max_bytes)
+        self._clock = clock
+        self.max_disk_entries = max_disk_entries
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.disk_evictions = 0
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normalizes text the way the parser sees it: lines are stripped and blank lines
+        dropped, so whitespace-only differences map to the same entry.
+        """
+        lines = (line.strip() for line in text.split("\n"))
+        return "\n".join(line for line in lines if line)
+
+    def key(self, text: str, catalog_version: int, start_date: str) -> str:
+        """Returns the cache key for a text parsed against a catalog version on a start date."""
+        payload = f"{catalog_version}\0{start_date}\0{self.normalize(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def expires_at(start_date: str) -> float:
+        """Returns the timestamp of local midnight at the end of the start date."""
+        next_day = date.fromisoformat(start_date) + timedelta(days=1)
+        return datetime.combine(next_day, time.min).timestamp()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns a copy of the cached response, or None on a miss or an expired entry.
+        """
+        now = self._clock().timestamp()
+        entry = self._memory.get(key)
+        if entry is None and self._db is not None:
+            entry = self._load(key, now)
+
+        if entry is not None and entry[0] <= now:
+            self._drop(key)
+            self.expirations += 1
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(entry[1])
+
+    def put(self, key: str, value: Dict[str, Any], start_date: str) -> None:
+        """Stores a response until the end of its start date."""
+        entry = (self.expires_at(start_date), json.dumps(value))
+        self._memory.put(key, entry, size=len(key) + len(entry[1]) + 64)
+        if self._db is not None:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO parse_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, entry[1], entry[0], self._clock().timestamp()),
+                )
+                self._trim_locked()
+                self._db.commit()
+
+    def _load(self, key: str, now: float) -> Optional[tuple]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT expires_at, value FROM parse_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE parse_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        entry = (row[0], row[1])
+        # Promote to memory so the next hit skips SQLite
+        self._memory.put(key, entry, size=len(key) + len(entry[1]) + 64)
+        return entry
+
+    def _drop(self, key: str) -> None:
+        self._memory.discard(key)
+        if self._db is not None:
+            with self._lock:
+                self._db.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+                self._db.commit()
+
+    def _trim_locked(self) -> None:
+        now = self._clock().timestamp()
+        self.expirations += self._db.execute(
+            "DELETE FROM parse_cache WHERE expires_at <= ?", (now,)
+        ).rowcount
+        self.disk_evictions += self._db.execute(
+            "DELETE FROM parse_cache WHERE key IN ("
+            "SELECT key FROM parse_cache ORDER BY last_used DESC, rowid DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        ).rowcount
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self._db is not None:
+            with self._lock:
+                self._db.execute("DELETE FROM parse_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit ratio, size and eviction counters for the memory and disk tiers."""
+        lookups = self.hits + self.misses
+        memory = self._memory.stats()
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": memory["entries"],
+            "bytes": memory["bytes"],
+            "max_bytes": memory["max_bytes"],
+            "evictions": memory["evictions"] + self.disk_evictions,
+            "expirations": self.expirations,
+            "persistent": self._db is not None,
+        }
+        if self._db is not None:
+            with self._lock:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM parse_cache").fetchone()[0]
+        return stats
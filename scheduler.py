@@ -1,6 +1,12 @@
+import heapq
 import re
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from datetime import date, datetime, time, timedelta
+from operator import itemgetter
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+import numpy as np
+
+from ai_engine.lru_cache import LRUCache, approx_size
 
 # --- Constants ---
 TIME_MAPPING: Dict[str, str] = {
@@ -11,6 +17,10 @@ TIME_MAPPING: Dict[str, str] = {
     "bedtime": "21:00"
 }
 
+# Schedule shape (timing, dosage, duration, food instruction) -> reminder times as minutes
+# from the start date's midnight, so repeated shapes skip the heuristics entirely
+SCHEDULE_TEMPLATES = LRUCache(max_bytes=4 * 1024 * 1024)
+
 def parse_duration(duration_list: List[str]) -> int:
     """
     Parses the duration list and returns the number of days.
@@ -40,78 +50,164 @@ def parse_duration(duration_list: List[str]) -> int:
         
     return 1
 
+def food_offset_minutes(food_instr: str) -> int:
+    """Minutes a reminder moves for its food instruction: 30 earlier before food, 30 later after."""
+    if "before" in food_instr.lower():
+        return -30
+    elif "after" in food_instr.lower():
+        return 30
+    return 0
+
+def _parse_start_date(start_date_str: Optional[str]) -> date:
+    """'YYYY-MM-DD' to a date; today if missing or invalid."""
+    if not start_date_str:
+        return datetime.now().date()
+    try:
+        return datetime.strptime(start_date_str, "%Y-%m-%d").date()
+    except ValueError:
+        # Fallback to today if invalid date format
+        return datetime.now().date()
+
+def medicine_schedule(med: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Works out when one medicine is taken: the daily reminder times (TIME_MAPPING shifted
+    by the food instruction), for how many days, and the text shown on each reminder.
+
+    Returns:
+        Dict[str, Any]: "medicine", "dosage", "instruction", "days", and "offsets", the
+                        sorted times of day as timedeltas from midnight.
+    """
+    name = med.get("name", "Unknown Medicine")
+    # Parsed fields can be missing or None
+    timings = med.get("timing") or []
+    duration_days = parse_duration(med.get("duration") or [])
+    food_instr = ", ".join(med.get("food_instruction") or [])
+    dosage = ", ".join(med.get("dosage") or [])
+
+    # Heuristic for missing timing
+    if not timings:
+        for d in med.get("dosage") or []:
+            if re.match(r'1-0-1', d):
+                timings = ["morning", "night"]
+            elif re.match(r'1-0-0', d):
+                timings = ["morning"]
+            elif re.match(r'0-0-1', d):
+                timings = ["night"]
+            elif re.match(r'0-1-0', d):
+                timings = ["afternoon"]
+            elif re.match(r'BD', d, re.IGNORECASE):
+                timings = ["morning", "night"]
+            elif re.match(r'TID', d, re.IGNORECASE):
+                timings = ["morning", "afternoon", "night"]
+            elif re.match(r'OD', d, re.IGNORECASE):
+                timings = ["morning"] # Default OD to morning
+
+    # Determine time adjustment
+    adjustment_minutes = food_offset_minutes(food_instr)
+
+    unique_timings = set()
+    for t in timings:
+        t_lower = t.lower()
+        for key, val in TIME_MAPPING.items():
+            if key in t_lower:
+                unique_timings.add(val)
+
+    # "HH:MM" strings sort chronologically; turn each into an offset from midnight once
+    offsets = []
+    for time_str in sorted(unique_timings):
+        hours, minutes = time_str.split(":")
+        offsets.append(timedelta(hours=int(hours), minutes=int(minutes) + adjustment_minutes))
+
+    return {"medicine": name, "dosage": dosage, "instruction": food_instr,
+            "days": duration_days, "offsets": offsets}
+
+def _iter_medicine(schedule: Dict[str, Any], start: datetime) -> Iterator[Tuple[datetime, Dict[str, str]]]:
+    """Yields (datetime, reminder) for one medicine, in chronological order."""
+    for day_offset in range(schedule["days"]):
+        day = start + timedelta(days=day_offset)
+        for offset in schedule["offsets"]:
+            final_dt = day + offset
+            yield final_dt, {
+                "medicine": schedule["medicine"],
+                "datetime": final_dt.strftime("%Y-%m-%d %H:%M"),
+                "dosage": schedule["dosage"],
+                "instruction": schedule["instruction"]
+            }
+
+def iter_reminders(medicine_data: Dict[str, Any], start_date_str: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """
+    Lazily yields the reminder events for the given medicines in chronological order.
+
+    Each medicine's reminders are produced in order by adding precomputed time-of-day
+    offsets to each day, and the per-medicine streams are heap-merged, so only one
+    pending reminder per medicine is held at a time. Reminders due at the same minute
+    come out in the order the medicines are listed.
+
+    start_date_str: 'YYYY-MM-DD', defaults to today.
+    """
+    start = datetime.combine(_parse_start_date(start_date_str), time.min)
+    streams = [_iter_medicine(medicine_schedule(med), start) for med in medicine_data.get("medicines", [])]
+    for _, reminder in heapq.merge(*streams, key=itemgetter(0)):
+        yield reminder
+
+def _template_key(med: Dict[str, Any]) -> Tuple:
+    timing = tuple(med.get("timing") or [])
+    # The dosage only matters when it has to stand in for missing timings
+    dosage = () if timing else tuple(med.get("dosage") or [])
+    return timing, dosage, tuple(med.get("duration") or []), tuple(med.get("food_instruction") or [])
+
+def schedule_template(med: Dict[str, Any]) -> np.ndarray:
+    """
+    Returns the reminder times of one medicine as minutes from the start date's midnight,
+    in chronological order. Computed once per schedule shape and then served from
+    SCHEDULE_TEMPLATES; the returned array is read-only.
+    """
+    key = _template_key(med)
+    minutes = SCHEDULE_TEMPLATES.get(key)
+    if minutes is None:
+        schedule = medicine_schedule(med)
+        daily = np.array([offset // timedelta(minutes=1) for offset in schedule["offsets"]], dtype=np.int64)
+        minutes = (np.arange(schedule["days"], dtype=np.int64)[:, None] * 1440 + daily).ravel()
+        minutes.flags.writeable = False
+        SCHEDULE_TEMPLATES.put(key, minutes, size=approx_size(key) + minutes.nbytes)
+    return minutes
+
 def generate_reminders(medicine_data: Dict[str, Any], start_date_str: Optional[str] = None) -> List[Dict[str, str]]:
     """
-    Generates a list of reminder events for the given medicines.
+    Generates a list of reminder events for the given medicines, in chronological order,
+    the same list as `iter_reminders`.
+
+    Each medicine's reminder times come from its cached template, so placing them on the
+    start date is one datetime64 add, and a stable sort merges the medicines.
+
     start_date_str: 'YYYY-MM-DD', defaults to today.
     """
-    if not start_date_str:
-        start_date = datetime.now().date()
-    else:
-        try:
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
-        except ValueError:
-            # Fallback to today if invalid date format
-            start_date = datetime.now().date()
-        
-    reminders: List[Dict[str, str]] = []
-    
-    for med in medicine_data.get("medicines", []):
-        name = med.get("name", "Unknown Medicine")
-        timings = med.get("timing", [])
-        duration_days = parse_duration(med.get("duration", []))
-        food_instr = ", ".join(med.get("food_instruction", []))
-        dosage = ", ".join(med.get("dosage", []))
-        
-        # Heuristic for missing timing
-        if not timings:
-            for d in med.get("dosage", []):
-                if re.match(r'1-0-1', d):
-                    timings = ["morning", "night"]
-                elif re.match(r'1-0-0', d):
-                    timings = ["morning"]
-                elif re.match(r'0-0-1', d):
-                    timings = ["night"]
-                elif re.match(r'0-1-0', d):
-                    timings = ["afternoon"]
-                elif re.match(r'BD', d, re.IGNORECASE):
-                    timings = ["morning", "night"]
-                elif re.match(r'TID', d, re.IGNORECASE):
-                    timings = ["morning", "afternoon", "night"]
-                elif re.match(r'OD', d, re.IGNORECASE):
-                    timings = ["morning"] # Default OD to morning
-        
-        # Determine time adjustment
-        adjustment_minutes = 0
-        if "before" in food_instr.lower():
-            adjustment_minutes = -30
-        elif "after" in food_instr.lower():
-            adjustment_minutes = 30
-            
-        unique_timings = set()
-        for t in timings:
-            t_lower = t.lower()
-            for key, val in TIME_MAPPING.items():
-                if key in t_lower:
-                    unique_timings.add(val)
-        
-        sorted_times = sorted(list(unique_timings))
-        
-        for day_offset in range(duration_days):
-            current_date = start_date + timedelta(days=day_offset)
-            
-            for time_str in sorted_times:
-                # Parse base time
-                base_dt = datetime.strptime(f"{current_date} {time_str}", "%Y-%m-%d %H:%M")
-                
-                # Apply adjustment
-                final_dt = base_dt + timedelta(minutes=adjustment_minutes)
-                
-                reminders.append({
-                    "medicine": name,
-                    "datetime": final_dt.strftime("%Y-%m-%d %H:%M"),
-                    "dosage": dosage,
-                    "instruction": food_instr
-                })
-                
+    medicines = medicine_data.get("medicines", [])
+    start_day = _parse_start_date(start_date_str)
+    templates = [schedule_template(med) for med in medicines]
+    counts = [len(t) for t in templates]
+    if not sum(counts):
+        return []
+
+    minutes = np.concatenate(templates)
+    # strftime does not zero-pad years before 1000 and stops at 9999; leave those to iter_reminders
+    if start_day.year < 1000 or int(minutes.max()) >= (date.max - start_day).days * 1440:
+        return list(iter_reminders(medicine_data, start_date_str))
+
+    # A stable sort keeps reminders due at the same minute in medicine order, like heapq.merge
+    order = np.argsort(minutes, kind="stable")
+    owners = np.repeat(np.arange(len(medicines)), counts)[order]
+    stamps = np.datetime_as_string(np.datetime64(start_day, "m") + minutes[order], unit="m")
+
+    labels = [(med.get("name", "Unknown Medicine"), ", ".join(med.get("dosage") or []),
+               ", ".join(med.get("food_instruction") or [])) for med in medicines]
+    reminders = []
+    for stamp, owner in zip(stamps.tolist(), owners.tolist()):
+        name, dosage, instruction = labels[owner]
+        reminders.append({
+            "medicine": name,
+            "datetime": stamp.replace("T", " "),
+            "dosage": dosage,
+            "instruction": instruction
+        })
     return reminders
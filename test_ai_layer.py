@@ -3,6 +3,20 @@ from unittest.mock import patch, MagicMock
 from ai_engine.pipeline import PrescriptionParser
 import numpy as np
 
+class FakeOCREngine:
+    """Stands in for tesserocr inside pool workers; sleeps on 1-pixel-wide images."""
+
+    def recognize(self, pixels, width, height, bytes_per_pixel):
+        import time
+        if width == 1:
+            time.sleep(10)
+        elif width == 2:
+            time.sleep(1)
+        return f"{width}x{height}x{bytes_per_pixel} ink={bytes(pixels).count(0)}"
+
+def fake_ocr_engine(lang, config):
+    return FakeOCREngine()
+
 class TestAILayer(unittest.TestCase):
 
     @patch('ai_engine.pipeline.preprocess_image')
@@ -50,5 +64,583 @@ class TestAILayer(unittest.TestCase):
         self.assertEqual(parse_duration_days(["5 days"]), 5)
         self.assertEqual(parse_duration_days(["2 weeks"]), 14)
 
+    def test_entity_scanner_matches_findall(self):
+        import re
+        from ai_engine.text_processor import (
+            ENTITY_SCANNER, DOSAGE_PATTERNS, TIMING_PATTERNS, FOOD_PATTERNS, DURATION_PATTERNS
+        )
+
+        categories = {
+            "dosage": DOSAGE_PATTERNS,
+            "timing": TIMING_PATTERNS,
+            "food_instruction": FOOD_PATTERNS,
+            "duration": DURATION_PATTERNS,
+        }
+        lines = [
+            "500mg 1-0-1 for 5 days",
+            "1/2 tablet OD at bedtime",
+            "Once a day before breakfast, empty stomach",
+            "2 caps TID after dinner with food till finish",
+        ]
+        for line in lines:
+            found = ENTITY_SCANNER.scan(line)
+            for category, patterns in categories.items():
+                expected = []
+                for pattern in patterns:
+                    expected.extend(re.findall(pattern, line, re.IGNORECASE))
+                self.assertEqual(found[category], expected)
+
+    def test_medicine_index_matches_brute_force(self):
+        from thefuzz import process
+        from ai_engine.medicine_index import MedicineIndex
+        from ai_engine.text_processor import MEDICINE_DB
+
+        index = MedicineIndex(MEDICINE_DB, top_k=3)
+        lines = [
+            "Paracetamol 500mg 1-0-1 for 5 days",
+            "Amoxcilin 250 mg BD",
+            "Tab Pan 40 before breakfast",
+            "Dolo 650 SOS",
+            "1-0-1 after food",
+            "for 3 days",
+        ]
+        # Too short for a trigram, or sharing none with the catalog: the whole catalog is scored
+        tokens = ["OD", "IU", "5", "BD", "xyz"]
+        for line in lines + tokens:
+            expected = process.extractOne(line, MEDICINE_DB, score_cutoff=80)
+            self.assertEqual(index.extract_one(line, score_cutoff=80), expected)
+        for token in tokens:
+            self.assertEqual(index.extract_one(token), process.extractOne(token, MEDICINE_DB))
+        self.assertEqual(index.extract_one("OD", score_cutoff=80), ("Amlodipine", 90))
+
+    def test_deletion_index_lookup(self):
+        from ai_engine.deletion_index import DeletionIndex
+
+        index = DeletionIndex(["Amoxicillin", "Atorvastatin", "Vitamin D3", "Pan 40", "Pan 20"])
+        self.assertEqual(index.lookup("Amoxcilin"), ["Amoxicillin"])
+        self.assertEqual(index.lookup("Atrovastatin"), ["Atorvastatin"])
+        self.assertEqual(index.lookup("vitamin"), ["Vitamin D3"])
+        self.assertEqual(index.lookup("Pan 30"), ["Pan 40", "Pan 20"])
+        self.assertEqual(index.lookup("tablet"), [])
+        self.assertEqual(index.report()["names"], 5)
+
+    def test_batch_match_equals_per_line(self):
+        from thefuzz import process
+        from ai_engine.batch_matcher import BatchMatcher
+        from ai_engine.text_processor import MEDICINE_DB, extract_entities
+
+        lines = [
+            "Paracetamol 500mg 1-0-1 for 5 days",
+            "Amoxcilin 250 mg BD",
+            "after food",
+            "Tab Pan 40 before breakfast",
+        ]
+        expected = [process.extractOne(line, MEDICINE_DB, score_cutoff=80) for line in lines]
+        self.assertEqual(BatchMatcher(MEDICINE_DB).best_matches(lines), expected)
+
+        text = "\n".join(lines)
+        self.assertEqual(
+            extract_entities(text, batch_match=True)["medicines"],
+            extract_entities(text)["medicines"],
+        )
+
+    def test_exact_matcher_prepass(self):
+        from ai_engine.exact_matcher import ExactMatcher
+
+        matcher = ExactMatcher()
+        for name in ["Pan 40", "Paracetamol", "Dolo 650"]:
+            matcher.add(name)
+        self.assertEqual(matcher.find("Tab. PAN-40 1-0-0"), "Pan 40")
+        self.assertEqual(matcher.find("Paracetamol 500mg"), "Paracetamol")
+        self.assertIsNone(matcher.find("Expan 40"))
+        self.assertIsNone(matcher.find("Paracetmol 500mg"))
+
+        # Names added later are picked up without rebuilding the trie
+        matcher.add("Pantop 40")
+        self.assertEqual(matcher.find("Pantop 40 OD"), "Pantop 40")
+        self.assertEqual(matcher.stats()["hits"], 3)
+
+        # Two names in one line: extract_one scores every exact hit and agrees with extractOne
+        from thefuzz import fuzz, process
+        from ai_engine.medicine_index import MedicineIndex
+        from ai_engine.text_processor import MEDICINE_DB
+
+        index = MedicineIndex(MEDICINE_DB)
+        for line, other in (("Aspirin 75 Clopidogrel 75", "Clopidogrel"), ("Rosuvastatin 10 Aspirin", "Rosuvastatin")):
+            self.assertEqual(index.exact.find_all(line), sorted(["Aspirin", other], key=MEDICINE_DB.index))
+            for scorer in (fuzz.WRatio, fuzz.token_set_ratio):
+                self.assertEqual(index.extract_one(line, scorer=scorer), process.extractOne(line, MEDICINE_DB, scorer=scorer))
+
+    def test_exact_matcher_incremental_links_match_a_full_build(self):
+        import random
+        from ai_engine.exact_matcher import ExactMatcher
+
+        rng = random.Random(7)
+        for _ in range(50):
+            names = ["".join(rng.choice("ab c") for _ in range(rng.randint(1, 6))) for _ in range(30)]
+            built, grown = ExactMatcher(), ExactMatcher()
+            for name in names:
+                built.add(name)
+                grown.add(name)
+                if rng.random() < 0.3:
+                    grown.refresh()
+            for _ in range(20):
+                line = "".join(rng.choice("ab c") for _ in range(20))
+                self.assertEqual(grown.find(line), built.find(line), (names, line))
+
+    def test_lru_cache_budget_and_counters(self):
+        from ai_engine.lru_cache import LRUCache
+
+        cache = LRUCache(max_bytes=1000)
+        cache.put("a", 1, size=400)
+        cache.put("b", 2, size=400)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3, size=400)  # evicts "b", the least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_line_memo_is_keyed_on_catalog_version(self):
+        from ai_engine.medicine_index import MedicineIndex
+        from ai_engine.text_processor import extract_entities, LINE_CACHE
+
+        index = MedicineIndex(["Paracetamol"])
+        text = "Zerodol SP 1-0-1 after food"
+        self.assertEqual(extract_entities(text, index)["medicines"], [])
+        hits = LINE_CACHE.hits
+        self.assertEqual(extract_entities(text, index)["medicines"], [])
+        self.assertEqual(LINE_CACHE.hits, hits + 1)
+
+        index.add("Zerodol SP")
+        meds = extract_entities(text, index)["medicines"]
+        self.assertEqual([m["name"] for m in meds], ["Zerodol SP"])
+
+    def test_iter_medicines_streams_in_bounded_memory(self):
+        import resource
+        from ai_engine.text_processor import iter_medicines
+
+        block = [
+            "Paracetamol 500mg 1-0-1",
+            "after food for 5 days",
+            "Amoxicillin 250mg BD",
+            "for 1 week",
+            "Dr. Smith Clinic",
+        ]
+
+        def lines(count):
+            for i in range(count):
+                yield block[i % len(block)]
+
+        # One million lines, generated lazily: peak RSS must not grow with the input
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        count = 0
+        for med in iter_medicines(lines(1_000_000)):
+            count += 1
+            self.assertIn(med["name"], ("Paracetamol", "Amoxicillin"))
+        rss_growth_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+        # Repeated names are reported once, with the details of their first block
+        self.assertEqual(count, 2)
+        self.assertLess(rss_growth_kb, 64 * 1024)
+
+    def test_decode_image_from_memory_matches_path(self):
+        import io
+        import os
+        import tempfile
+        import cv2
+        from ai_engine.image_processor import decode_image
+
+        page = np.full((60, 120, 3), 255, dtype=np.uint8)
+        cv2.putText(page, "Rx", (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+        ok, encoded = cv2.imencode(".png", page)
+        self.assertTrue(ok)
+        data = encoded.tobytes()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "page.png")
+            with open(path, "wb") as f:
+                f.write(data)
+            expected = decode_image(path)
+
+        for source in (data, bytearray(data), memoryview(data), io.BytesIO(data)):
+            np.testing.assert_array_equal(decode_image(source), expected)
+        with self.assertRaises(ValueError):
+            decode_image(b"not an image")
+
+    def test_resolution_normalization_downsamples_large_text(self):
+        import cv2
+        from ai_engine.image_processor import estimate_text_height, load_normalized_gray
+
+        page = np.full((700, 500), 255, dtype=np.uint8)
+        for i in range(12):
+            cv2.putText(page, "Paracetamol 500mg 1-0-1", (20, 40 + 50 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 0, 2)
+        photo = cv2.resize(page, None, fx=4, fy=4, interpolation=cv2.INTER_CUBIC)
+        data = cv2.imencode(".jpg", cv2.cvtColor(photo, cv2.COLOR_GRAY2BGR))[1].tobytes()
+
+        gray, scale = load_normalized_gray(data, target_text_height=24)
+        self.assertLess(scale, 0.5)
+        self.assertLess(gray.shape[0], photo.shape[0] / 2)
+        self.assertAlmostEqual(estimate_text_height(gray), 24, delta=4)
+
+        # Text already below the target is never upsampled
+        small = cv2.imencode(".png", page)[1].tobytes()
+        gray, scale = load_normalized_gray(small, target_text_height=24)
+        self.assertEqual((gray.shape, scale), (page.shape, 1.0))
+
+    def test_deskew_estimators_recover_rotation(self):
+        import cv2
+        from ai_engine.deskew import deskew, estimate_skew_projection, estimate_skew_hough
+
+        page = np.full((1200, 900), 255, dtype=np.uint8)
+        for i in range(18):
+            cv2.putText(page, "Amoxicillin 250mg BD after food", (40, 60 + 60 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.9, 0, 2)
+        for angle in (-6, 4):
+            M = cv2.getRotationMatrix2D((450, 600), angle, 1.0)
+            skewed = cv2.warpAffine(page, M, (900, 1200), borderValue=255)
+            self.assertAlmostEqual(estimate_skew_projection(skewed), -angle, delta=0.5)
+            self.assertAlmostEqual(estimate_skew_hough(skewed), -angle, delta=0.5)
+
+        level, angle = deskew(skewed)
+        self.assertAlmostEqual(estimate_skew_projection(level), 0, delta=0.5)
+        with self.assertRaises(ValueError):
+            deskew(page, "unknown")
+
+    def test_ocr_pool_reuses_workers_and_replaces_timed_out_ones(self):
+        from PIL import Image
+        from ai_engine.ocr_backend import TesseractPoolBackend, OCRTimeout
+
+        pool = TesseractPoolBackend(pool_size=1, timeout=3, engine_factory=fake_ocr_engine)
+        try:
+            image = Image.new("L", (4, 3), 255)
+            image.putpixel((0, 0), 0)
+            first_pid = pool._workers[0].process.pid
+            self.assertEqual(pool.image_to_string(image), "4x3x1 ink=1")
+            self.assertEqual(pool.image_to_string(image.convert("1")), "4x3x1 ink=1")
+            self.assertEqual(pool._workers[0].process.pid, first_pid)
+
+            with self.assertRaises(OCRTimeout):
+                pool.image_to_string(Image.new("L", (1, 1)))
+            # The stuck worker was replaced and the pool keeps serving
+            self.assertNotEqual(pool._workers[0].process.pid, first_pid)
+            self.assertEqual(pool.image_to_string(image), "4x3x1 ink=1")
+        finally:
+            pool.close()
+        with self.assertRaises(RuntimeError):
+            pool.image_to_string(image)
+
+    def test_ocr_pool_close_lets_running_jobs_finish(self):
+        import threading
+        import time
+        from PIL import Image
+        from ai_engine.ocr_backend import TesseractPoolBackend
+
+        pool = TesseractPoolBackend(pool_size=2, timeout=10, engine_factory=fake_ocr_engine)
+        results = []
+        job = threading.Thread(target=lambda: results.append(pool.image_to_string(Image.new("L", (2, 1), 255))))
+        job.start()
+        while pool._idle.qsize() == 2:
+            time.sleep(0.01)
+
+        start = time.perf_counter()
+        pool.close()
+        self.assertLess(time.perf_counter() - start, 1)
+        job.join(timeout=10)
+        # The busy worker finished its job and was stopped afterwards
+        self.assertEqual(results, ["2x1x1 ink=0"])
+        self.assertEqual(pool._workers, [])
+
+    def test_ocr_backend_interface_and_pool_fallback(self):
+        from ai_engine.ocr_backend import OCRBackend, PytesseractBackend, TesseractPoolBackend, create_ocr_backend
+
+        with self.assertRaises(TypeError):
+            OCRBackend()
+        with patch.object(TesseractPoolBackend, "available", return_value=False):
+            with self.assertLogs("ai_engine.ocr_backend", level="WARNING"):
+                self.assertIsInstance(create_ocr_backend("pool"), PytesseractBackend)
+
+    def test_multipage_documents_are_stitched_in_page_order(self):
+        import io
+        import cv2
+        from PIL import Image
+        from ai_engine.ocr_backend import OCRBackend
+
+        class PageShapeOCR(OCRBackend):
+            # Square pages are page 1, landscape pages are page 2
+            def image_to_string(self, image):
+                width, height = image.size
+                if width <= height:
+                    return "Rx\nParacetamol 500mg 1-0-1"
+                return "for 5 days after food\nAmoxicillin 250mg BD"
+
+        first = np.full((300, 300), 255, dtype=np.uint8)
+        second = np.full((200, 400), 255, dtype=np.uint8)
+        tiff = cv2.imencodemulti(".tiff", [first, second])[1].tobytes()
+        pdf = io.BytesIO()
+        Image.fromarray(first).save(pdf, "PDF", save_all=True, append_images=[Image.fromarray(second)])
+
+        parser = PrescriptionParser(ocr_backend=PageShapeOCR(), max_pages_in_flight=1)
+        documents = [tiff]
+        try:
+            import pypdfium2  # noqa: F401
+            documents.append(pdf.getvalue())
+        except ImportError:
+            pass
+        for document in documents:
+            meds = {m["name"]: m for m in parser.run(image_data=document)["medicines"]}
+            self.assertEqual(list(meds), ["Paracetamol", "Amoxicillin"])
+            # The Paracetamol block continues on page 2
+            self.assertIn("5 days", meds["Paracetamol"]["duration"])
+            self.assertIn("after food", meds["Paracetamol"]["food_instruction"])
+
+    def test_text_region_crop_drops_letterhead_and_stamp(self):
+        from ai_engine.image_processor import binarize_and_deskew, crop_text_regions
+        from testing_helpers import letterhead_page, oracle_text, recall
+
+        page, lines = letterhead_page(seed=0)
+        processed = binarize_and_deskew(page)
+        cropped, boxes = crop_text_regions(processed)
+
+        self.assertLess(cropped.width * cropped.height, processed.width * processed.height * 0.25)
+        self.assertEqual(recall(oracle_text(lines, boxes)), 1.0)
+        # Seed 0 has a rule under the letterhead: nothing above it is kept
+        self.assertTrue(all(y > 500 for _, y, _, _ in boxes))
+        # The stamp ring is painted out of the band it overlaps, if any
+        self.assertLess(np.count_nonzero(np.asarray(cropped) == 0), np.count_nonzero(np.asarray(processed) == 0))
+
+    def test_pipeline_reports_text_regions(self):
+        import cv2
+        from ai_engine.ocr_backend import OCRBackend
+        from testing_helpers import letterhead_page
+
+        class SizeOCR(OCRBackend):
+            def image_to_string(self, image):
+                self.size = image.size
+                return "Paracetamol 500mg 1-0-1"
+
+        backend = SizeOCR()
+        data = cv2.imencode(".png", letterhead_page(seed=1)[0])[1].tobytes()
+        result = PrescriptionParser(ocr_backend=backend, crop_text=True).run(image_data=data)
+        self.assertEqual(result["medicines"][0]["name"], "Paracetamol")
+        self.assertEqual(len(result["text_regions"]), 1)
+        self.assertGreater(len(result["text_regions"][0]), 5)
+        self.assertLess(backend.size[1], 1000)
+        self.assertNotIn("text_regions", PrescriptionParser(ocr_backend=backend).run(image_data=data))
+
+    def test_ocr_cache_exact_near_duplicate_and_lru(self):
+        import os
+        import tempfile
+        import cv2
+        from ai_engine.ocr_cache import OCRCache
+        from testing_helpers import letterhead_page
+
+        page = letterhead_page(seed=2)[0]
+        png = cv2.imencode(".png", page)[1].tobytes()
+        # Another "photo" of the same page: slightly rescaled, darker, JPEG-encoded
+        retake = cv2.resize(page, None, fx=0.9, fy=0.9, interpolation=cv2.INTER_AREA)
+        retake = cv2.imencode(".jpg", cv2.convertScaleAbs(retake, alpha=0.9), [cv2.IMWRITE_JPEG_QUALITY, 70])[1].tobytes()
+        other = cv2.imencode(".png", letterhead_page(seed=3)[0][::-1])[1].tobytes()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ocr.db")
+            cache = OCRCache(path, max_entries=2)
+            cache.put(*cache.fingerprint(png), "Paracetamol 500mg", [[0, 0, 10, 10]], namespace="ns")
+            cache.close()
+
+            # Survives a restart
+            cache = OCRCache(path, max_entries=2)
+            hit = cache.get(*cache.fingerprint(png), namespace="ns")
+            self.assertEqual((hit["match"], hit["text"], hit["regions"]), ("exact", "Paracetamol 500mg", [[0, 0, 10, 10]]))
+            near = cache.get(*cache.fingerprint(retake), namespace="ns")
+            self.assertEqual(near["match"], "near")
+            self.assertLessEqual(near["distance"], cache.max_distance)
+            self.assertIsNone(cache.get(*cache.fingerprint(other), namespace="ns"))
+            # Seed 6 is another prescription on the same letterhead and layout
+            same_template = cv2.imencode(".png", letterhead_page(seed=6)[0])[1].tobytes()
+            self.assertIsNone(cache.get(*cache.fingerprint(same_template), namespace="ns"))
+            self.assertIsNone(cache.get(*cache.fingerprint(png), namespace="other settings"))
+            self.assertIsNone(cache.get(*cache.fingerprint(b"%PDF-1.4 not decodable"), namespace="ns"))
+
+            # Least recently used entries go first once max_entries is exceeded
+            cache.put(*cache.fingerprint(other), "Amoxicillin", namespace="ns")
+            cache.get(*cache.fingerprint(png), namespace="ns")
+            cache.put("f" * 64, None, "Cetirizine", namespace="ns")
+            self.assertIsNotNone(cache.get(*cache.fingerprint(png), namespace="ns"))
+            self.assertIsNone(cache.get(*cache.fingerprint(other), namespace="ns"))
+            stats = cache.stats()
+            self.assertEqual((stats["entries"], stats["evictions"], stats["near_hits"]), (2, 1, 1))
+            cache.close()
+
+    def test_ocr_cache_keeps_one_entry_per_namespace(self):
+        from ai_engine.ocr_backend import OCRBackend
+        from ai_engine.ocr_cache import OCRCache
+
+        cache = OCRCache()
+        key = ("a" * 64, bytes(32))
+        cache.put(*key, "Paracetamol", namespace="text_height=24")
+        cache.put(*key, "Paracetam0l", namespace="text_height=32")
+        self.assertEqual(cache.get(*key, namespace="text_height=24")["text"], "Paracetamol")
+        self.assertEqual(cache.get(*key, namespace="text_height=32")["text"], "Paracetam0l")
+        self.assertEqual(cache.stats()["entries"], 2)
+
+        class NullOCR(OCRBackend):
+            def image_to_string(self, image):
+                return ""
+
+        namespaces = {PrescriptionParser(ocr_backend=NullOCR(), **settings)._cache_namespace()
+                      for settings in ({}, {"target_text_height": 32}, {"deskew_method": "hough"})}
+        self.assertEqual(len(namespaces), 3)
+
+    def test_pipeline_skips_ocr_on_cache_hit(self):
+        import cv2
+        from ai_engine.ocr_backend import OCRBackend
+        from ai_engine.ocr_cache import OCRCache
+
+        class CountingOCR(OCRBackend):
+            calls = 0
+
+            def image_to_string(self, image):
+                CountingOCR.calls += 1
+                return "Paracetamol 500mg 1-0-1 for 5 days"
+
+        page = np.full((400, 600), 255, dtype=np.uint8)
+        cv2.putText(page, "Paracetamol 500mg", (20, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 0, 3)
+        data = cv2.imencode(".png", page)[1].tobytes()
+        stages = []
+        parser = PrescriptionParser(ocr_backend=CountingOCR(), ocr_cache=OCRCache())
+
+        first = parser.run(image_data=data)
+        second = parser.run(image_data=bytearray(data), progress=stages.append)
+        self.assertEqual(CountingOCR.calls, 1)
+        self.assertEqual(first["ocr_cache"], {"hit": False})
+        self.assertEqual(second["ocr_cache"], {"hit": True, "match": "exact", "distance": 0})
+        self.assertEqual(second["medicines"], first["medicines"])
+        self.assertEqual(stages, ["extraction", "refill"])
+
+    def test_tiled_preprocessing_is_pixel_identical(self):
+        from ai_engine.image_processor import binarize_and_deskew, denoise_and_threshold, denoise_and_threshold_tiled
+        from testing_helpers import a4_scan
+
+        gray = a4_scan(dpi=150)
+        expected = denoise_and_threshold(gray)
+        for tile_size in (97, 256, 1000):
+            np.testing.assert_array_equal(denoise_and_threshold_tiled(gray, tile_size=tile_size, workers=3), expected)
+        np.testing.assert_array_equal(np.asarray(binarize_and_deskew(gray, tile_workers=2)),
+                                      np.asarray(binarize_and_deskew(gray)))
+
+    def test_words_to_text_and_confidence(self):
+        from ai_engine.ocr_backend import words_to_text_and_confidence
+
+        data = {
+            "page_num": [1, 1, 1, 1, 1, 1, 1],
+            "block_num": [0, 1, 1, 1, 1, 1, 1],
+            "par_num": [0, 0, 1, 1, 1, 1, 1],
+            "line_num": [0, 0, 0, 1, 1, 2, 2],
+            "conf": ["-1", "-1", "-1", "96.5", "91", "60", "-1"],
+            "text": ["", "", "", "Paracetamol", "500mg", "1-0-1", ""],
+        }
+        text, confidence = words_to_text_and_confidence(data)
+        self.assertEqual(text, "Paracetamol 500mg\n1-0-1")
+        self.assertAlmostEqual(confidence, (96.5 + 91 + 60) / 3)
+        self.assertEqual(words_to_text_and_confidence({k: [] for k in data}), ("", None))
+
+    def test_pytesseract_text_and_confidence_come_from_one_run(self):
+        from PIL import Image
+        from ai_engine.ocr_backend import PytesseractBackend
+
+        tsv = ("level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+               "1\t1\t0\t0\t0\t0\t0\t0\t10\t10\t-1\t\n"
+               "5\t1\t1\t1\t1\t1\t0\t0\t5\t5\t90\tParacetamol\n"
+               "5\t1\t1\t1\t1\t2\t5\t0\t5\t5\t70\t500mg\n")
+        runs = []
+
+        def fake_tesseract(input_filename, output_filename_base, extension, lang, config="", nice=0, timeout=0):
+            runs.append((extension, config))
+            with open(f"{output_filename_base}.txt", "w") as f:
+                f.write("Paracetamol  500mg\n\f")
+            with open(f"{output_filename_base}.tsv", "w") as f:
+                f.write(tsv)
+
+        backend = PytesseractBackend()
+        image = Image.new("L", (10, 10), 255)
+        with patch("pytesseract.pytesseract.run_tesseract", side_effect=fake_tesseract):
+            text, confidence = backend.image_to_text_and_confidence(image)
+            self.assertEqual(text, backend.image_to_string(image))
+        self.assertEqual(confidence, 80.0)
+        self.assertEqual(runs[0], ("txt tsv", "-c tessedit_create_tsv=1"))
+
+    def test_ocr_cascade_escalates_on_low_confidence_or_no_catalog_hits(self):
+        import cv2
+        from ai_engine.ocr_backend import OCRBackend
+        from ai_engine.text_processor import extract_entities
+
+        class ScriptedOCR(OCRBackend):
+            def __init__(self, results):
+                self.results = list(results)
+                self.sizes = []
+
+            def image_to_text_and_confidence(self, image):
+                self.sizes.append(image.size)
+                return self.results.pop(0)
+
+            def image_to_string(self, image):
+                return self.image_to_text_and_confidence(image)[0]
+
+        page = np.full((600, 900), 255, dtype=np.uint8)
+        for i in range(4):
+            cv2.putText(page, "Paracetamol 500mg 1-0-1", (30, 120 + 110 * i), cv2.FONT_HERSHEY_SIMPLEX, 2.0, 0, 4)
+        data = cv2.imencode(".png", page)[1].tobytes()
+        good = "Paracetamol 500mg 1-0-1 for 5 days"
+
+        clean = ScriptedOCR([(good, 92.0)])
+        parser = PrescriptionParser(ocr_backend=clean, cascade=True, min_confidence=80)
+        with patch("ai_engine.pipeline.extract_entities", wraps=extract_entities) as extract:
+            result = parser.run(image_data=data)
+        self.assertEqual(result["ocr_cascade"], {"tier": "quick", "quick_confidence": 92.0, "quick_catalog_hits": 1})
+        self.assertEqual(len(clean.sizes), 1)
+        # The accepted quick pass is extracted once
+        self.assertEqual(extract.call_count, 1)
+
+        blurry = ScriptedOCR([("Paracetanol 5O0mg", 41.0), (good, 88.0)])
+        parser.ocr_backend = blurry
+        result = parser.run(image_data=data)
+        self.assertEqual(result["ocr_cascade"]["tier"], "full")
+        self.assertEqual(result["ocr_cascade"]["full_confidence"], 88.0)
+        self.assertEqual(result["medicines"][0]["name"], "Paracetamol")
+        # The cheap pass ran at reduced resolution
+        self.assertLess(blurry.sizes[0][0], blurry.sizes[1][0])
+
+        no_hits = ScriptedOCR([("illegible", 95.0), (good, 90.0)])
+        parser.ocr_backend = no_hits
+        self.assertEqual(parser.run(image_data=data)["ocr_cascade"]["quick_catalog_hits"], 0)
+        self.assertEqual(parser.cascade_stats(), {"quick": 1, "full": 2, "escalation_rate": 0.6667})
+
+    def test_map_pages_bounds_pages_in_flight(self):
+        import threading
+        import time
+        from ai_engine.multipage import map_pages
+
+        state = {"produced": 0, "consumed": 0, "peak": 0}
+        lock = threading.Lock()
+
+        def pages():
+            for i in range(20):
+                with lock:
+                    state["produced"] += 1
+                    state["peak"] = max(state["peak"], state["produced"] - state["consumed"])
+                yield i
+
+        def process(page):
+            time.sleep(0.002 * (page % 3))
+            return str(page)
+
+        results = []
+        for text in map_pages(pages(), process, max_in_flight=3):
+            with lock:
+                state["consumed"] += 1
+            results.append(text)
+        self.assertEqual(results, [str(i) for i in range(20)])
+        self.assertLessEqual(state["peak"], 3)
+
 if __name__ == '__main__':
     unittest.main()
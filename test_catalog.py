@@ -0,0 +1,89 @@
+import os
+import tempfile
+
+# Use the test database, like test_db.py, in case this module is imported first
+TEST_DIR = os.environ.setdefault("PRESCRIPTION_TEST_DIR", tempfile.mkdtemp(prefix="prescription-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test_prescriptions.db')}"
+os.environ["JOBS_DB"] = os.path.join(TEST_DIR, "test_jobs.db")
+
+import pytest
+from unittest.mock import patch
+from catalog import MedicineCatalog
+
+def test_catalog_loads_once_and_versions_incremental_adds():
+    catalog = MedicineCatalog(["Paracetamol", "Pan 40"])
+    assert catalog.version == 0
+
+    with patch("catalog.crud.get_all_medicine_names", return_value=["Zerodol SP", "Paracetamol"]) as fetch:
+        catalog.ensure_loaded(db=None)
+        catalog.ensure_loaded(db=None)
+    assert fetch.call_count == 1
+    assert catalog.version == 1
+    assert "Zerodol SP" in catalog
+    assert len(catalog) == 3
+
+    # Already-known names don't bump the version
+    assert catalog.add(["Pan 40"]) == 1
+    assert catalog.add(["Dolo 650", "Pan 40"]) == 2
+    assert catalog.names == ["Paracetamol", "Pan 40", "Zerodol SP", "Dolo 650"]
+
+    best = catalog.index.extract_one("Zerodol SP 1-0-1 after food", score_cutoff=80)
+    assert best[0] == "Zerodol SP"
+
+def test_batch_parser_keeps_a_replaced_pool_until_its_batches_finish():
+    from concurrent.futures import Future
+    from concurrent.futures.process import BrokenProcessPool
+    from parse_service import BatchParser
+
+    catalog = MedicineCatalog(["Paracetamol"])
+    parser = BatchParser(catalog, max_workers=1)
+    try:
+        with parser._lease() as old:
+            # A /save during the batch moves the catalog on; new batches get a new pool
+            catalog.add(["Dolo 650"])
+            results = parser.parse_all(["Dolo 650 1-0-1 for 3 days"])
+            assert results[0]["result"]["medicines"][0]["name"] == "Dolo 650"
+            assert parser._pool is not old
+            assert old.submit(len, "still open").result() == 10
+        # Released by its last batch, the old pool is shut down
+        assert old not in parser._leases
+        with pytest.raises(RuntimeError):
+            old.submit(len, "closed")
+
+        class BrokenPool:
+            def submit(self, *args):
+                future = Future()
+                future.set_exception(BrokenProcessPool("worker died"))
+                return future
+
+            def shutdown(self, wait=True):
+                pass
+
+        parser._pool = BrokenPool()
+        results = parser.parse_all(["Paracetamol 500mg", "Dolo 650"])
+        assert [r["index"] for r in results] == [0, 1]
+        assert all(r["error"].startswith("Worker pool failed") for r in results)
+        assert parser._pool is None
+
+        class StalledPool(BrokenPool):
+            """The first item finishes at once; the others never start."""
+            def __init__(self):
+                self.futures = []
+
+            def submit(self, fn, index, text):
+                future = Future()
+                if not self.futures:
+                    future.set_result({"index": index, "result": {}})
+                self.futures.append(future)
+                return future
+
+        stalled = StalledPool()
+        parser._pool, parser._pool_version = stalled, catalog.version
+        stream = parser.iter_completed(["a", "b", "c"])
+        assert next(stream)["index"] == 0
+        # The client went away: the rest are cancelled and the lease is returned
+        stream.close()
+        assert all(f.cancelled() for f in stalled.futures[1:])
+        assert parser._leases[stalled] == 0
+    finally:
+        parser.shutdown()
@@ -1,17 +1,25 @@
 import os
+import json
+import tempfile
 
-# Set test database URL before importing app/database
-os.environ["DATABASE_URL"] = "sqlite:///./test_prescriptions.db"
+# Test databases live in a throwaway directory (shared with test_catalog.py through the
+# environment), set before importing app/database, which open them
+TEST_DIR = os.environ.setdefault("PRESCRIPTION_TEST_DIR", tempfile.mkdtemp(prefix="prescription-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test_prescriptions.db')}"
+os.environ["JOBS_DB"] = os.path.join(TEST_DIR, "test_jobs.db")
 
-# Remove existing test db for clean test BEFORE importing app (which opens DB)
-if os.path.exists("./test_prescriptions.db"):
-    try:
-        os.remove("./test_prescriptions.db")
-    except PermissionError:
-        print("Warning: Could not remove existing test DB. It might be in use.")
+# Remove existing test dbs for clean test BEFORE importing app (which opens DB)
+for name in ("test_prescriptions.db", "test_jobs.db", "test_jobs.db-wal", "test_jobs.db-shm"):
+    path = os.path.join(TEST_DIR, name)
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except PermissionError:
+            print(f"Warning: Could not remove existing test DB {path}. It might be in use.")
 
 from fastapi.testclient import TestClient
 from main import app
+from models import MedicineModel
 
 client = TestClient(app)
 
@@ -48,5 +56,182 @@ def test_save_flow():
     assert medicines[0]["name"] == "Paracetamol"
     assert medicines[0]["total_quantity"] == 10
 
+def test_batch_parse():
+    texts = [
+        "Paracetamol 500mg 1-0-1 for 5 days",
+        "   ",
+        "Amoxicillin 250mg BD after food for 1 week",
+    ]
+    response = client.post("/parse/batch", json={"texts": texts})
+    assert response.status_code == 200
+    results = response.json()["results"]
+
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert results[0]["result"]["medicines"][0]["name"] == "Paracetamol"
+    assert results[1]["error"] == "Text cannot be empty"
+    assert results[2]["result"]["medicines"][0]["name"] == "Amoxicillin"
+
+    # Streaming variant: one NDJSON line per item, in completion order
+    stream = client.post("/parse/batch/stream", json={"texts": texts})
+    assert stream.status_code == 200
+    lines = [json.loads(l) for l in stream.text.splitlines() if l]
+    assert sorted(l["index"] for l in lines) == [0, 1, 2]
+
+def test_parse_result_cache():
+    ocr_text = "Amoxicillin 250mg BD after food for 1 week"
+    before = client.get("/cache/stats").json()
+    first = client.post("/parse", json={"text": ocr_text})
+    second = client.post("/parse", json={"text": "  " + ocr_text + "\n"})
+    assert first.status_code == second.status_code == 200
+    assert second.json()["medicines"] == first.json()["medicines"]
+    assert second.json()["reminders"] == first.json()["reminders"]
+
+    stats = client.get("/cache/stats").json()
+    assert stats["hits"] == before["hits"] + 1
+
+def test_parse_image_upload():
+    import cv2
+    import numpy as np
+    from unittest.mock import patch
+
+    page = np.full((80, 200), 255, dtype=np.uint8)
+    cv2.putText(page, "Paracetamol", (5, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, 0, 2)
+    png = cv2.imencode(".png", page)[1].tobytes()
+
+    with patch("ai_engine.pipeline.pytesseract.image_to_string", return_value="Paracetamol 500mg 1-0-1 for 5 days"):
+        response = client.post("/parse/image", files={"file": ("rx.png", png, "image/png")})
+    assert response.status_code == 200
+    assert response.json()["medicines"][0]["name"] == "Paracetamol"
+
+    bad = client.post("/parse/image", files={"file": ("rx.png", b"not an image", "image/png")})
+    assert bad.status_code == 400
+    missing = client.post("/parse/image", files={"other": ("rx.png", png, "image/png")})
+    assert missing.status_code == 400
+
+def test_async_job_flow():
+    import time
+
+    response = client.post("/jobs", json={"text": "Paracetamol 500mg 1-0-1 for 5 days"})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    for _ in range(100):
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.1)
+    assert job["status"] == "done"
+    assert job["result"]["medicines"][0]["name"] == "Paracetamol"
+
+    # The SSE stream replays every stage and ends with the result
+    events = client.get(f"/jobs/{job_id}/events").text.strip().split("\n\n")
+    stages = [json.loads(e.split("data: ", 1)[1])["stage"] for e in events]
+    assert stages == ["queued", "running", "extraction", "refill", "done"]
+    assert events[-1].startswith("event: done")
+
+    assert client.get("/jobs/unknown").status_code == 404
+    assert client.post("/jobs", json={"text": "   "}).status_code == 400
+
+def test_save_stores_schedules_not_rows():
+    from datetime import datetime
+    import crud
+    from database import SessionLocal
+    from models import ReminderModel, ScheduleModel
+
+    data = client.post("/parse", json={"text": "Metformin 500mg 1-0-1 after food for 30 days"}).json()
+    response = client.post("/save", json={
+        "medicines": data["medicines"], "reminders": data["reminders"], "refill_info": data["refill_info"],
+    })
+    assert response.status_code == 200
+
+    db = SessionLocal()
+    try:
+        med = db.query(MedicineModel).filter(MedicineModel.name == "Metformin").one()
+        schedules = db.query(ScheduleModel).filter(ScheduleModel.medicine_id == med.id).all()
+        assert len(schedules) == 1 and schedules[0].days == 30
+        assert db.query(ReminderModel).filter(ReminderModel.medicine_id == med.id).count() == 0
+
+        window = (datetime(2000, 1, 1), datetime(2100, 1, 1))
+        stored = list(crud.get_reminders(db, *window, medicine_id=med.id))
+        assert [r["datetime"] for r in stored] == [r["datetime"] for r in data["reminders"]]
+        assert {r["status"] for r in stored} == {"pending"}
+    finally:
+        db.close()
+
+    first = stored[0]
+    marked = client.post("/reminders/status", json={
+        "schedule_id": first["schedule_id"], "datetime": first["datetime"], "status": "taken",
+    })
+    assert marked.status_code == 200
+    bad = client.post("/reminders/status", json={
+        "schedule_id": first["schedule_id"], "datetime": "1999-01-01 08:00", "status": "taken",
+    })
+    assert bad.status_code == 400
+
+    db = SessionLocal()
+    try:
+        statuses = [r["status"] for r in crud.get_reminders(db, *window, medicine_id=med.id)]
+        assert statuses[0] == "taken" and statuses[1:] == ["pending"] * (len(stored) - 1)
+    finally:
+        db.close()
+
+def test_reminder_window_pagination():
+    import crud
+    from database import SessionLocal
+
+    data = client.post("/parse", json={"text": "Pantoprazole 40mg OD before breakfast for 10 days"}).json()
+    client.post("/save", json={
+        "medicines": data["medicines"], "reminders": data["reminders"], "refill_info": data["refill_info"],
+    })
+    start = data["reminders"][0]["datetime"][:10]
+
+    # A medicine saved before schedules existed, with one reminders row per dose
+    db = SessionLocal()
+    try:
+        legacy = crud.create_medicine(db, {"name": "Legacy Syrup"}, {})
+        crud.create_reminders(db, legacy.id, [
+            {"datetime": f"{start} 07:30", "dosage": "5ml", "instruction": ""},
+            {"datetime": f"{start} 21:00", "dosage": "5ml", "instruction": ""},
+        ])
+    finally:
+        db.close()
+
+    day = client.get("/reminders", params={"from": start}).json()
+    names = [(r["datetime"][11:], r["medicine"]) for r in day["reminders"]]
+    assert ("07:30", "Pantoprazole") in names and ("21:00", "Legacy Syrup") in names
+    assert [r["datetime"] for r in day["reminders"]] == sorted(r["datetime"] for r in day["reminders"])
+    assert day["next_cursor"] is None
+
+    # Paging with a small limit returns the same reminders as one large page
+    params = {"from": start, "to": data["reminders"][-1]["datetime"][:10] + " 23:59"}
+    everything = client.get("/reminders", params={**params, "limit": 1000}).json()["reminders"]
+    paged, cursor = [], None
+    while True:
+        page = client.get("/reminders", params={**params, "limit": 3, **({"cursor": cursor} if cursor else {})}).json()
+        paged += page["reminders"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert paged == everything
+    assert sum(r["medicine"] == "Pantoprazole" for r in everything) == 10
+
+    pantoprazole = next(r for r in everything if r["medicine"] == "Pantoprazole")
+    client.post("/reminders/status", json={
+        "schedule_id": pantoprazole["schedule_id"], "datetime": pantoprazole["datetime"], "status": "skipped",
+    })
+    skipped = client.get("/reminders", params={**params, "status": "skipped"}).json()["reminders"]
+    assert [(r["medicine"], r["datetime"]) for r in skipped] == [("Pantoprazole", pantoprazole["datetime"])]
+
+    assert client.get("/reminders", params={"from": "tomorrow"}).status_code == 400
+    assert client.get("/reminders", params={"from": start, "to": start}).status_code == 400
+    assert client.get("/reminders", params={"status": "lost"}).status_code == 400
+    assert client.get("/reminders", params={"cursor": "nonsense"}).status_code == 400
+
 if __name__ == "__main__":
     test_save_flow()
+    test_batch_parse()
+    test_parse_result_cache()
+    test_parse_image_upload()
+    test_async_job_flow()
+    test_save_stores_schedules_not_rows()
+    test_reminder_window_pagination()
@@ -0,0 +1,81 @@
+import threading
+
+from job_queue import JobQueue, JobWorkerPool
+
+def test_queue_is_durable_and_claims_each_job_once(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    queue = JobQueue(db_path)
+    first = queue.enqueue("text", b"Paracetamol 500mg")
+    second = queue.enqueue("text", b"Amoxicillin 250mg")
+
+    job = queue.claim()
+    assert (job["id"], job["payload"]) == (first, b"Paracetamol 500mg")
+    queue.set_stage(first, "extraction")
+    assert queue.get(first)["stage"] == "extraction"
+
+    # A restart finds the interrupted job and puts it back in line
+    restarted = JobQueue(db_path)
+    assert restarted.recover() == 1
+    assert [restarted.claim()["id"], restarted.claim()["id"]] == [first, second]
+    assert restarted.claim() is None
+    assert restarted.stats()["running"] == 2
+
+def test_worker_pool_records_stages_results_and_errors(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    finished = threading.Semaphore(0)
+
+    def handler(job, progress):
+        try:
+            progress("extraction")
+            if job["payload"] == b"boom":
+                raise ValueError("bad input")
+            return {"text": job["payload"].decode()}
+        finally:
+            finished.release()
+
+    ok = queue.enqueue("text", b"hello")
+    bad = queue.enqueue("text", b"boom")
+    pool = JobWorkerPool(queue, handler, workers=2, poll_interval=0.05)
+    pool.start()
+    assert finished.acquire(timeout=5) and finished.acquire(timeout=5)
+
+    events = list(queue.watch(ok, poll_interval=0.01, timeout=5))
+    assert [e["stage"] for e in events] == ["queued", "running", "extraction", "done"]
+    assert queue.get(ok)["result"] == {"text": "hello"}
+    list(queue.watch(bad, poll_interval=0.01, timeout=5))
+    assert queue.get(bad)["status"] == "failed"
+    assert queue.get(bad)["error"] == "bad input"
+    pool.stop()
+
+def test_finished_jobs_drop_their_payload_and_are_purged(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    done = queue.enqueue("image", b"\x89PNG" * 1000)
+    waiting = queue.enqueue("text", b"Paracetamol")
+    queue.claim()
+    queue.complete(done, {"medicines": []})
+    assert queue._db.execute("SELECT length(payload) FROM jobs WHERE id = ?", (done,)).fetchone() == (0,)
+
+    finished_at = queue.get(done)["updated_at"]
+    assert queue.purge(older_than=60, now=finished_at + 30) == 0
+    assert queue.purge(older_than=60, now=finished_at + 90) == 1
+    assert queue.get(done) is None and queue.events(done) == []
+    # Unfinished jobs are never purged
+    assert queue.get(waiting)["status"] == "queued"
+
+    # An idle worker pool runs the purge itself
+    other = queue.enqueue("text", b"boom")
+    queue.claim()
+    queue.fail(other, "bad input")
+    pool = JobWorkerPool(queue, lambda job, progress: {}, workers=1, poll_interval=0.01, retention=0)
+    pool.start(recover=False)
+    for _ in range(200):
+        if queue.get(other) is None:
+            break
+        threading.Event().wait(0.01)
+    pool.stop()
+    assert queue.get(other) is None
+
+def test_watch_ends_at_the_timeout(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    job_id = queue.enqueue("text", b"stuck")
+    assert [e["stage"] for e in queue.watch(job_id, poll_interval=0.01, timeout=0.05)] == ["queued"]
@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import crud
+from database import Base
+from reminder_dispatcher import ReminderDispatcher
+
+class FakeClock:
+    def __init__(self, now: datetime):
+        self.now = now
+
+    def __call__(self) -> datetime:
+        return self.now
+
+def _session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+def _add_legacy(factory, name, datetimes):
+    db = factory()
+    try:
+        med = crud.create_medicine(db, {"name": name}, {})
+        crud.create_reminders(db, med.id, [{"datetime": dt, "dosage": "1 tab", "instruction": ""} for dt in datetimes])
+    finally:
+        db.close()
+
+def _add_schedule(factory, name, datetimes):
+    db = factory()
+    try:
+        med = crud.create_medicine(db, {"name": name}, {})
+        crud.create_schedule(db, med.id, [{"datetime": dt, "dosage": "500mg", "instruction": ""} for dt in datetimes])
+    finally:
+        db.close()
+
+def _dispatcher(factory, clock, **kwargs):
+    sent = []
+
+    async def notifier(reminder):
+        sent.append((reminder["datetime"], reminder["medicine"]))
+
+    return ReminderDispatcher(factory, notifier, clock=clock, **kwargs), sent
+
+def test_fires_due_reminders_in_order_and_sleeps_until_the_next():
+    factory = _session_factory()
+    _add_schedule(factory, "Paracetamol", ["2024-01-01 08:00", "2024-01-01 21:00", "2024-01-02 08:00"])
+    _add_legacy(factory, "Cough Syrup", ["2024-01-01 08:00", "2024-01-01 13:00"])
+    clock = FakeClock(datetime(2024, 1, 1, 7, 59, 30))
+    dispatcher, sent = _dispatcher(factory, clock, horizon=timedelta(hours=24))
+
+    assert asyncio.run(dispatcher.step()) == 30
+    assert sent == []
+
+    clock.now = datetime(2024, 1, 1, 8, 0, 0)
+    delay = asyncio.run(dispatcher.step())
+    assert sent == [("2024-01-01 08:00", "Paracetamol"), ("2024-01-01 08:00", "Cough Syrup")]
+    assert delay == 5 * 3600
+
+    clock.now = datetime(2024, 1, 1, 13, 0, 5)
+    asyncio.run(dispatcher.step())
+    clock.now = datetime(2024, 1, 1, 21, 0, 5)
+    asyncio.run(dispatcher.step())
+    assert [s[0] for s in sent[2:]] == ["2024-01-01 13:00", "2024-01-01 21:00"]
+    assert dispatcher.stats()["fired"] == 4
+
+def test_restart_resumes_after_the_high_water_mark():
+    factory = _session_factory()
+    _add_legacy(factory, "Metformin", ["2024-01-01 08:00", "2024-01-01 09:00", "2024-01-01 12:00", "2024-01-01 14:00"])
+    clock = FakeClock(datetime(2024, 1, 1, 8, 0))
+    first, sent = _dispatcher(factory, clock)
+    asyncio.run(first.step())
+    assert sent == [("2024-01-01 08:00", "Metformin")]
+
+    # Down from 08:00 to 13:30: 12:00 fires late, 09:00 is too old to send
+    clock.now = datetime(2024, 1, 1, 13, 30)
+    second, resent = _dispatcher(factory, clock, max_lateness=timedelta(hours=2))
+    asyncio.run(second.step())
+    assert resent == [("2024-01-01 12:00", "Metformin")]
+    assert second.stats()["expired"] == 1
+    assert second.stats()["high_water"] == "2024-01-01 12:00"
+
+def test_bounded_batches_handle_a_burst_in_one_minute():
+    factory = _session_factory()
+    _add_legacy(factory, "Vitamin", ["2024-01-01 08:00"] * 7 + ["2024-01-01 08:01"])
+    clock = FakeClock(datetime(2024, 1, 1, 7, 59))
+    dispatcher, sent = _dispatcher(factory, clock, batch_size=3, persist_every=2)
+    asyncio.run(dispatcher.step())
+
+    clock.now = datetime(2024, 1, 1, 8, 1)
+    for _ in range(5):
+        asyncio.run(dispatcher.step())
+    assert [s[0] for s in sent] == ["2024-01-01 08:00"] * 7 + ["2024-01-01 08:01"]
+    assert dispatcher.stats()["loaded"] == 0
+
+def test_wake_reloads_reminders_saved_after_loading():
+    factory = _session_factory()
+    _add_legacy(factory, "Later", ["2024-01-01 12:00"])
+    clock = FakeClock(datetime(2024, 1, 1, 8, 0))
+    dispatcher, sent = _dispatcher(factory, clock)
+    assert asyncio.run(dispatcher.step()) == 3600
+
+    _add_schedule(factory, "Sooner", ["2024-01-01 08:30"])
+    dispatcher.wake()
+    assert asyncio.run(dispatcher.step()) == 1800
+    clock.now = datetime(2024, 1, 1, 8, 30)
+    asyncio.run(dispatcher.step())
+    assert sent == [("2024-01-01 08:30", "Sooner")]
+
+def test_run_loop_fires_and_stops():
+    factory = _session_factory()
+    now = datetime(2024, 1, 1, 8, 0, 10)
+    _add_legacy(factory, "Now", [now.strftime("%Y-%m-%d %H:%M")])
+    dispatcher, sent = _dispatcher(factory, FakeClock(now))
+
+    async def main():
+        task = asyncio.create_task(dispatcher.run())
+        for _ in range(100):
+            if sent:
+                break
+            await asyncio.sleep(0.01)
+        dispatcher.stop()
+        await asyncio.wait_for(task, timeout=5)
+
+    asyncio.run(main())
+    assert [s[1] for s in sent] == ["Now"]
@@ -0,0 +1,168 @@
+from datetime import datetime
+
+import pytest
+
+from reminder_schedule import (
+    CANCELLED, LEGACY, TAKEN, compress_reminders, decode_cursor, encode_cursor, expand_schedule,
+    iter_occurrences, last_date, parse_rrule,
+)
+from scheduler import generate_reminders
+from testing_helpers import chronic_care
+
+def _expand(fields, cancelled, extras=(), start="2000-01-01 00:00", end="2100-01-01 00:00"):
+    schedule = {**fields, "schedule_id": 1, "extras": list(extras)}
+    overrides = {(1, dt): CANCELLED for dt in cancelled}
+    return [o["datetime"] for o in iter_occurrences(
+        [schedule], overrides, datetime.fromisoformat(start), datetime.fromisoformat(end))]
+
+def test_generated_reminders_compress_to_one_schedule_per_medicine():
+    reminders = generate_reminders(chronic_care(180), "2024-01-01")
+    by_medicine = {}
+    for r in reminders:
+        by_medicine.setdefault(r["medicine"], []).append(r)
+
+    for name, expected in by_medicine.items():
+        fields, cancelled, extras = compress_reminders(expected)
+        assert cancelled == [] and extras == []
+        assert fields["days"] == 180 and fields["rrule"] is None
+        assert fields["end_date"] == "2024-06-28"
+        assert _expand(fields, cancelled) == [r["datetime"] for r in expected]
+
+def test_edited_reminders_round_trip_through_cancelled_overrides():
+    reminders = generate_reminders(chronic_care(5, medicines=1), "2024-01-01")
+    # The user drops one dose and moves another
+    edited = [r for r in reminders if r["datetime"] != "2024-01-02 08:30"]
+    edited[0] = {**edited[0], "datetime": "2024-01-01 10:15"}
+
+    fields, cancelled, extras = compress_reminders(edited)
+    assert fields["times"] == ["08:00", "21:00"]
+    assert cancelled == ["2024-01-01 08:30", "2024-01-02 08:30"]
+    assert extras == ["2024-01-01 10:15"]
+    assert _expand(fields, cancelled, extras) == sorted(r["datetime"] for r in edited)
+
+def test_weekly_reminders_become_an_interval_rrule():
+    reminders = [{"medicine": "Vitamin D", "datetime": f"2024-03-{d:02d} 08:30",
+                  "dosage": "60000 IU", "instruction": "after food"} for d in (1, 8, 15, 29)]
+    fields, cancelled, _ = compress_reminders(reminders)
+    assert fields["rrule"] == "FREQ=DAILY;INTERVAL=7;COUNT=5"
+    assert fields["times"] == ["08:00"] and fields["offset_minutes"] == 30
+    assert cancelled == ["2024-03-22 08:30"]
+    assert _expand(fields, cancelled) == [r["datetime"] for r in reminders]
+
+def test_food_offset_across_midnight_keeps_the_schedule_dates():
+    reminders = [{"medicine": "X", "datetime": f"2024-01-0{d} 00:10", "dosage": "", "instruction": "after food"}
+                 for d in (2, 3, 4)]
+    fields, cancelled, _ = compress_reminders(reminders)
+    assert (fields["start_date"], fields["times"], fields["days"]) == ("2024-01-01", ["23:40"], 3)
+    assert _expand(fields, cancelled) == [r["datetime"] for r in reminders]
+
+def test_irregular_reminders_keep_overrides_proportional_to_the_submission():
+    # A few off-grid doses become extra occurrences of the schedule
+    reminders = [{"medicine": "X", "datetime": dt, "dosage": "", "instruction": ""}
+                 for dt in ("2024-01-01 08:00", "2024-01-02 08:00", "2024-01-03 08:00", "2024-12-31 09:17")]
+    fields, cancelled, extras = compress_reminders(reminders)
+    assert (fields["times"], fields["days"], cancelled, extras) == (["08:00"], 3, [], ["2024-12-31 09:17"])
+    assert _expand(fields, cancelled, extras) == [r["datetime"] for r in reminders]
+
+    # Reminders that fit no schedule are left to be stored as they are
+    scattered = [{"medicine": "X", "datetime": f"2024-01-{1 + i // 3:02d} {8 + i % 12:02d}:{i % 60:02d}",
+                  "dosage": "", "instruction": ""} for i in range(90)]
+    assert compress_reminders(scattered) is None
+
+def test_stored_rows_stay_proportional_to_the_reminders():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    import crud
+    from database import Base
+    from models import ReminderModel, ReminderOverrideModel, ScheduleModel
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    cases = [
+        generate_reminders(chronic_care(30, medicines=1), "2024-01-01")[::3],
+        [{"medicine": "X", "datetime": f"2024-{1 + i // 28:02d}-{1 + i % 28:02d} {i % 24:02d}:{(7 * i) % 60:02d}",
+          "dosage": "", "instruction": ""} for i in range(90)],
+        [{"medicine": "X", "datetime": dt, "dosage": "", "instruction": ""}
+         for dt in ("2024-01-01 08:00", "2024-01-02 08:00", "2024-12-31 09:17")],
+    ]
+    window = (datetime(2000, 1, 1), datetime(2100, 1, 1))
+    for reminders in cases:
+        med = crud.create_medicine(db, {"name": "X"}, {})
+        crud.create_schedule(db, med.id, reminders)
+        schedules = db.query(ScheduleModel).filter(ScheduleModel.medicine_id == med.id).all()
+        overrides = db.query(ReminderOverrideModel).filter(
+            ReminderOverrideModel.schedule_id.in_([s.id for s in schedules])).count()
+        rows = db.query(ReminderModel).filter(ReminderModel.medicine_id == med.id).count()
+        assert overrides <= len(reminders) // 2
+        assert len(schedules) + overrides + rows <= len(reminders)
+
+        stored = [r["datetime"] for r in crud.get_reminders(db, *window, medicine_id=med.id)]
+        stored += [r.datetime for r in db.query(ReminderModel).filter(ReminderModel.medicine_id == med.id)]
+        assert sorted(stored) == sorted(r["datetime"] for r in reminders)
+    db.close()
+
+def test_mixed_dosages_are_saved_as_submitted():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    import crud
+    from database import Base
+    from models import ReminderModel, ScheduleModel
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    # A tapering dose, a changed instruction, and two tablets due at the same minute
+    tapering = [{"medicine": "X", "datetime": f"2024-01-0{d} 08:00", "dosage": f"{40 - 10 * d}mg",
+                 "instruction": "after food"} for d in (1, 2, 3)]
+    instructions = [{**r, "dosage": "10mg", "instruction": "before food" if i else "after food"}
+                    for i, r in enumerate(tapering)]
+    doubled = tapering + [{**tapering[0], "dosage": "5mg"}]
+    window = (datetime(2000, 1, 1), datetime(2100, 1, 1))
+    for reminders in (tapering, instructions, doubled):
+        assert compress_reminders(reminders) is None
+        med = crud.create_medicine(db, {"name": "X"}, {})
+        crud.create_schedule(db, med.id, reminders)
+        assert db.query(ScheduleModel).filter(ScheduleModel.medicine_id == med.id).count() == 0
+
+        stored = [(r["datetime"], r["dosage"], r["instruction"])
+                  for r in crud.get_reminders(db, *window, medicine_id=med.id)]
+        stored += [(r.datetime, r.dosage_str, r.instruction)
+                   for r in db.query(ReminderModel).filter(ReminderModel.medicine_id == med.id)]
+        assert sorted(stored) == sorted((r["datetime"], r["dosage"], r["instruction"]) for r in reminders)
+    db.close()
+
+def test_window_expansion_starts_at_the_window():
+    schedule = {"schedule_id": 1, "start_date": "2020-01-06", "times": ["08:00", "21:00"],
+                "offset_minutes": -30, "days": None, "rrule": "FREQ=WEEKLY"}
+    window = list(expand_schedule(schedule, datetime(2024, 1, 1), datetime(2024, 1, 15)))
+    assert [o["datetime"] for _, o in window] == [
+        "2024-01-01 07:30", "2024-01-01 20:30", "2024-01-08 07:30", "2024-01-08 20:30",
+    ]
+
+def test_overrides_set_status_and_hide_cancelled():
+    schedule = {"schedule_id": 3, "start_date": "2024-01-01", "times": ["08:00"],
+                "offset_minutes": 0, "days": 3, "rrule": None}
+    overrides = {(3, "2024-01-01 08:00"): TAKEN, (3, "2024-01-02 08:00"): CANCELLED}
+    window = (datetime(2024, 1, 1), datetime(2024, 2, 1))
+    assert [(o["datetime"], o["status"]) for o in iter_occurrences([schedule], overrides, *window)] == [
+        ("2024-01-01 08:00", "taken"), ("2024-01-03 08:00", "pending"),
+    ]
+    assert len(list(iter_occurrences([schedule], overrides, *window, include_cancelled=True))) == 3
+
+def test_parse_rrule_subset():
+    assert parse_rrule("RRULE:FREQ=WEEKLY;INTERVAL=2;COUNT=3") == {"step": 14, "count": 3, "until": None}
+    assert last_date("2024-01-01", None, "FREQ=DAILY;INTERVAL=3;UNTIL=20240110") == "2024-01-10"
+    assert last_date("2024-01-01", None, "FREQ=DAILY") is None
+    for rule in ("FREQ=MONTHLY", "FREQ=DAILY;BYDAY=MO", "FREQ=DAILY;INTERVAL=0", "FREQ"):
+        with pytest.raises(ValueError):
+            parse_rrule(rule)
+
+def test_cursor_round_trip():
+    key = ("2024-01-01 08:30", LEGACY, 42)
+    assert decode_cursor(encode_cursor(key)) == key
+    for cursor in ("nonsense", encode_cursor(("tomorrow", 0, 1))):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from result_cache import ParseResultCache
+
+RESULT = {"medicines": [{"name": "Paracetamol"}], "raw_text": "Paracetamol 500mg", "reminders": [], "refill_info": []}
+
+def test_key_ignores_whitespace_but_not_version_or_date():
+    cache = ParseResultCache()
+    key = cache.key("Paracetamol 500mg\n\n  1-0-1  ", 3, "2024-05-01")
+    assert key == cache.key("  Paracetamol 500mg\n1-0-1", 3, "2024-05-01")
+    assert key != cache.key("Paracetamol 500mg\n1-0-1", 4, "2024-05-01")
+    assert key != cache.key("Paracetamol 500mg\n1-0-1", 3, "2024-05-02")
+
+def test_entries_expire_at_the_day_boundary():
+    now = [datetime(2024, 5, 1, 23, 59)]
+    cache = ParseResultCache(clock=lambda: now[0])
+    key = cache.key("Paracetamol 500mg", 0, "2024-05-01")
+    cache.put(key, RESULT, "2024-05-01")
+
+    assert cache.get(key) == RESULT
+    now[0] = datetime(2024, 5, 2, 0, 0)
+    assert cache.get(key) is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 1, 1)
+    assert stats["hit_ratio"] == 0.5
+    assert stats["entries"] == 0
+
+def test_lru_eviction_and_sqlite_persistence(tmp_path):
+    clock = lambda: datetime(2024, 5, 1, 9, 0)
+    db_path = str(tmp_path / "parse_cache.db")
+    cache = ParseResultCache(max_bytes=600, db_path=db_path, max_disk_entries=2, clock=clock)
+
+    keys = [cache.key(f"text {i}", 0, "2024-05-01") for i in range(3)]
+    for key in keys:
+        cache.put(key, RESULT, "2024-05-01")
+    stats = cache.stats()
+    assert stats["bytes"] <= 600
+    assert stats["evictions"] >= 1
+    assert stats["disk_entries"] == 2
+
+    # A fresh process reads the surviving entries back from disk
+    reopened = ParseResultCache(db_path=db_path, clock=clock)
+    assert reopened.get(keys[2]) == RESULT
+    assert reopened.get(keys[0]) is None
@@ -1,5 +1,6 @@
 import json
-from scheduler import generate_reminders
+from itertools import islice
+from scheduler import generate_reminders, iter_reminders
 
 def run_tests():
     # Mock input data (similar to what ocr_engine returns)
@@ -69,5 +70,33 @@ def run_tests():
         else:
              print(f"FAILED: Amoxicillin time incorrect. Got {amox_reminders[0]['datetime']}")
 
+def test_iter_reminders_is_chronological_merge_of_legacy_output():
+    from testing_helpers import chronic_care, legacy_generate_reminders
+
+    for days in (1, 30, 365):
+        data = chronic_care(days)
+        expected = sorted(legacy_generate_reminders(data, "2024-02-27"), key=lambda r: r["datetime"])
+        assert generate_reminders(data, "2024-02-27") == expected
+        assert list(islice(iter_reminders(data, "2024-02-27"), 5)) == expected[:5]
+
+def test_schedule_templates_are_reused_and_output_is_unchanged():
+    import json
+    from testing_helpers import chronic_care
+    from scheduler import SCHEDULE_TEMPLATES
+
+    data = chronic_care(30)
+    data["medicines"].append({"name": "Odd", "timing": ["bedtime"], "food_instruction": ["before food"],
+                              "duration": ["until finished"]})
+    data["medicines"].append({"name": "No timing"})
+    data["medicines"].append({"name": "Null fields", "timing": None, "dosage": ["1-0-1"], "duration": None,
+                              "food_instruction": None})
+    for start in ("2024-02-27", "0999-06-01"):
+        assert json.dumps(generate_reminders(data, start)) == json.dumps(list(iter_reminders(data, start)))
+
+    # Medicines 0 and 6 share a shape, and a second prescription reuses every template
+    hits = SCHEDULE_TEMPLATES.hits
+    generate_reminders(data, "2024-03-01")
+    assert SCHEDULE_TEMPLATES.hits == hits + len(data["medicines"])
+
 if __name__ == "__main__":
     run_tests()
@@ -0,0 +1,209 @@
+"""
+Synthetic prescriptions (scans, parsed medicines and medicine catalogs), scoring
+helpers and reference implementations shared by the tests and the benchmark scripts.
+"""
+
+import random
+import re
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+from ai_engine.text_processor import extract_entities
+from scheduler import TIME_MAPPING, parse_duration
+
+MEDICINE_LINES = [
+    "Paracetamol 500mg 1-0-1 for 5 days",
+    "Amoxicillin 250mg BD after food",
+    "Pantoprazole 40mg OD before breakfast",
+    "Cetirizine 10mg at night for 1 week",
+    "Metformin 500mg 1-0-1 after food",
+    "Azithromycin 500mg OD for 3 days",
+]
+EXPECTED = {line.split()[0] for line in MEDICINE_LINES}
+
+# Text of the plain (letterhead-free) scans
+LINES = [
+    "Dr. Smith Clinic", "Rx",
+    "Paracetamol 500mg 1-0-1 for 5 days",
+    "Amoxicillin 250mg BD after food",
+    "Pantoprazole 40mg OD before breakfast",
+    "Cetirizine 10mg at night for 1 week",
+    "Vitamin D3 60000 IU once a week",
+]
+
+def letterhead_page(seed: int):
+    """
+    Renders an A4 prescription at 300 DPI: a letterhead (logo, clinic name, doctor
+    details, optionally a rule under it), the medicine lines, a stamp and a signature.
+
+    Returns:
+        Tuple[np.ndarray, List[Tuple[str, Tuple[int, int, int, int]]]]: The grayscale page
+        and each rendered line with its (x, y, width, height) box.
+    """
+    rng = np.random.default_rng(seed)
+    page = np.full((3508, 2480), 255, dtype=np.uint8)
+    lines = []
+
+    def text(line, x, y, size=1.2, thickness=2):
+        cv2.putText(page, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, size, 0, thickness, cv2.LINE_AA)
+        (w, h), baseline = cv2.getTextSize(line, cv2.FONT_HERSHEY_SIMPLEX, size, thickness)
+        lines.append((line, (x, y - h, w, h + baseline)))
+
+    # Letterhead
+    cv2.circle(page, (300, 260), int(rng.integers(110, 170)), 0, -1)
+    cv2.putText(page, "CITY CARE CLINIC", (520, 270), cv2.FONT_HERSHEY_SIMPLEX, 4, 0, 10)
+    text("Dr. A. Smith, MBBS MD  Reg No 12345", 520, 380)
+    text("12 Park Street, Ph 98765 43210", 520, 440)
+    if seed % 2 == 0:
+        cv2.line(page, (100, 500), (2380, 500), 0, 6)
+
+    # Prescription body, with the frequency sometimes in a separate column
+    y = 650 + int(rng.integers(0, 200))
+    text("Rx", 150, y)
+    for line in rng.permutation(MEDICINE_LINES):
+        y += 110
+        name, rest = line.split(" ", 1)
+        if rng.random() < 0.5:
+            text(line, 150, y)
+        else:
+            text(name, 150, y)
+            text(rest, 1000, y)
+
+    # Stamp and signature
+    cx, cy = int(rng.integers(1500, 2100)), int(rng.integers(2700, 3100))
+    cv2.circle(page, (cx, cy), 230, 0, 14)
+    cv2.circle(page, (cx, cy), 170, 0, 6)
+    pts = np.stack([np.linspace(1500, 2200, 40), 3300 + 60 * np.sin(np.linspace(0, 12, 40))], axis=1)
+    cv2.polylines(page, [pts.astype(np.int32)], False, 0, 5)
+    return page, lines
+
+def oracle_text(lines, boxes, offset=8) -> str:
+    """
+    Stands in for OCR when Tesseract is not installed: returns the rendered lines that
+    lie inside one of the OCR'd boxes.
+    """
+    found = []
+    for line, (x, y, w, h) in lines:
+        for bx, by, bw, bh in boxes:
+            if bx - offset <= x and x + w <= bx + bw + offset and by - offset <= y and y + h <= by + bh + offset:
+                found.append(line)
+                break
+    return "\n".join(found)
+
+def recall(text: str) -> float:
+    names = {med["name"] for med in extract_entities(text)["medicines"]}
+    return len(names & EXPECTED) / len(EXPECTED)
+
+def a4_scan(dpi: float, seed: int = 3, angle: float = 0.0) -> np.ndarray:
+    """
+    Renders a grayscale A4 prescription scan at the given DPI with noise and uneven
+    lighting, the page skewed by `angle` degrees.
+    """
+    rng = np.random.default_rng(seed)
+    scale = dpi / 300
+    page = np.full((int(3508 * scale), int(2480 * scale)), 255, dtype=np.uint8)
+    y = int(180 * scale)
+    for i in range(45):
+        cv2.putText(page, LINES[i % len(LINES)], (int(150 * scale), y), cv2.FONT_HERSHEY_SIMPLEX,
+                    1.2 * scale, 0, max(1, int(2 * scale)), cv2.LINE_AA)
+        y += int(72 * scale)
+    if angle:
+        (h, w) = page.shape
+        M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+        page = cv2.warpAffine(page, M, (w, h), flags=cv2.INTER_LINEAR, borderValue=255)
+    page = page.astype(np.int16) + rng.normal(0, 8, page.shape).astype(np.int16)
+    page -= np.linspace(0, 50, page.shape[1], dtype=np.int16)[None, :]
+    return np.clip(page, 0, 255).astype(np.uint8)
+
+SYLLABLES = [
+    "ra", "mo", "xi", "cil", "lin", "pan", "to", "pra", "zole", "met", "for", "min",
+    "ator", "va", "sta", "tin", "dol", "cef", "ix", "ime", "lo", "sar", "tan", "az",
+    "thro", "my", "cin", "pred", "ni", "sone", "gaba", "pen"
+]
+
+def synthetic_catalog(size: int, seed: int = 42):
+    """A sorted catalog of `size` made-up medicine names, some with a strength."""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < size:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 5))).capitalize()
+        if rng.random() < 0.3:
+            name += f" {rng.choice([5, 10, 20, 40, 250, 500, 650])}"
+        names.add(name)
+    return sorted(names)
+
+def typo(word: str, rng: random.Random) -> str:
+    """`word` with one character replaced by a random letter."""
+    chars = list(word)
+    i = rng.randrange(len(chars))
+    chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars)
+
+def legacy_generate_reminders(medicine_data, start_date_str):
+    """
+    The original implementation: a strptime per reminder and one list grouped by
+    medicine. Kept as the baseline (its output, sorted by time, is the expected output).
+    """
+    start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
+    reminders = []
+    for med in medicine_data.get("medicines", []):
+        name = med.get("name", "Unknown Medicine")
+        timings = med.get("timing", [])
+        duration_days = parse_duration(med.get("duration", []))
+        food_instr = ", ".join(med.get("food_instruction", []))
+        dosage = ", ".join(med.get("dosage", []))
+        if not timings:
+            for d in med.get("dosage", []):
+                if re.match(r'1-0-1', d):
+                    timings = ["morning", "night"]
+                elif re.match(r'1-0-0', d):
+                    timings = ["morning"]
+                elif re.match(r'0-0-1', d):
+                    timings = ["night"]
+                elif re.match(r'0-1-0', d):
+                    timings = ["afternoon"]
+                elif re.match(r'BD', d, re.IGNORECASE):
+                    timings = ["morning", "night"]
+                elif re.match(r'TID', d, re.IGNORECASE):
+                    timings = ["morning", "afternoon", "night"]
+                elif re.match(r'OD', d, re.IGNORECASE):
+                    timings = ["morning"]
+        adjustment_minutes = 0
+        if "before" in food_instr.lower():
+            adjustment_minutes = -30
+        elif "after" in food_instr.lower():
+            adjustment_minutes = 30
+        unique_timings = set()
+        for t in timings:
+            for key, val in TIME_MAPPING.items():
+                if key in t.lower():
+                    unique_timings.add(val)
+        for day_offset in range(duration_days):
+            current_date = start_date + timedelta(days=day_offset)
+            for time_str in sorted(unique_timings):
+                base_dt = datetime.strptime(f"{current_date} {time_str}", "%Y-%m-%d %H:%M")
+                final_dt = base_dt + timedelta(minutes=adjustment_minutes)
+                reminders.append({
+                    "medicine": name,
+                    "datetime": final_dt.strftime("%Y-%m-%d %H:%M"),
+                    "dosage": dosage,
+                    "instruction": food_instr
+                })
+    return reminders
+
+def chronic_care(days: int, medicines: int = 8):
+    """A prescription of `medicines` medicines, all taken for `days` days."""
+    patterns = [
+        (["morning", "night"], ["after food"], ["500mg"]),
+        ([], [], ["TID"]),
+        (["morning"], ["before breakfast"], ["40mg"]),
+        (["night"], [], ["10mg"]),
+        ([], ["after food"], ["1-0-1"]),
+        (["afternoon"], [], ["OD"]),
+    ]
+    meds = []
+    for i in range(medicines):
+        timing, food, dosage = patterns[i % len(patterns)]
+        meds.append({"name": f"Medicine {i}", "dosage": dosage, "timing": timing,
+                     "duration": [f"{days} days"], "food_instruction": food})
+    return {"medicines": meds}
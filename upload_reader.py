@@ -0,0 +1,80 @@
+from fastapi import Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+class UploadTooLarge(ValueError):
+    """Raised when an uploaded file exceeds the configured size limit."""
+
+async def read_multipart_file(request: Request, field: str = "file",
+                              max_bytes: int = 20 * 1024 * 1024) -> bytearray:
+    """
+    Streams a multipart/form-data request body and collects one file field in memory.
+
+    Chunks are fed to the multipart parser as they arrive and the selected part is
+    appended to a single bytearray, so nothing is spooled to a temporary file (unlike
+    `UploadFile`, which spills uploads over 1MB to disk). Other fields are skipped.
+
+    Args:
+        request (Request): The incoming request.
+        field (str): Form field name holding the file.
+        max_bytes (int): Largest accepted file size.
+
+    Returns:
+        bytearray: The raw file contents.
+
+    Raises:
+        UploadTooLarge: If the file is larger than `max_bytes`.
+        ValueError: If the body is not multipart/form-data or the field is missing.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise ValueError("Expected a multipart/form-data body")
+
+    target = field.encode("utf-8")
+    data = bytearray()
+    state = {"header_name": b"", "header_value": b"", "disposition": b"", "collecting": False, "found": False}
+
+    def on_header_field(chunk: bytes, start: int, end: int) -> None:
+        state["header_name"] += chunk[start:end]
+
+    def on_header_value(chunk: bytes, start: int, end: int) -> None:
+        state["header_value"] += chunk[start:end]
+
+    def on_header_end() -> None:
+        if state["header_name"].lower() == b"content-disposition":
+            state["disposition"] = state["header_value"]
+        state["header_name"] = b""
+        state["header_value"] = b""
+
+    def on_headers_finished() -> None:
+        _, options = parse_options_header(state["disposition"])
+        state["collecting"] = options.get(b"name") == target and not state["found"]
+        state["disposition"] = b""
+
+    def on_part_data(chunk: bytes, start: int, end: int) -> None:
+        if not state["collecting"]:
+            return
+        if len(data) + (end - start) > max_bytes:
+            raise UploadTooLarge(f"File exceeds {max_bytes} bytes")
+        data.extend(chunk[start:end])
+
+    def on_part_end() -> None:
+        if state["collecting"]:
+            state["found"] = True
+            state["collecting"] = False
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    async for chunk in request.stream():
+        parser.write(chunk)
+    parser.finalize()
+
+    if not state["found"]:
+        raise ValueError(f'Missing file field "{field}"')
+    return data